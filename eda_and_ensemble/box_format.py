@@ -0,0 +1,91 @@
+import time
+import argparse
+import numpy as np
+
+
+def xywh_to_xyxy(boxes):
+    """(N, 4) [x_min, y_min, width, height] 박스 배열을 [x_min, y_min, x_max, y_max]로 한 번에 변환"""
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    return np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1)
+
+def xyxy_to_xywh(boxes):
+    """(N, 4) [x_min, y_min, x_max, y_max] 박스 배열을 [x_min, y_min, width, height]로 한 번에 변환"""
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    return np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1)
+
+def cxcywh_to_xyxy(boxes):
+    """(N, 4) [x_center, y_center, width, height] 박스 배열을 [x_min, y_min, x_max, y_max]로 한 번에 변환"""
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    return np.concatenate([boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2], axis=1)
+
+def format_rows(labels, scores, boxes, precision=None):
+    """
+    예측마다 "클래스 신뢰도 x_min y_min x_max y_max" 문자열을 생성
+
+    precision을 지정하면 행 전체를 하나의 % 서식 문자열로 변환하여 원소마다 서식을 적용하는 np.char.mod보다 빠르다.
+
+    :param labels: (N,) 클래스 배열
+    :param scores: (N,) 신뢰도 배열
+    :param boxes: (N, 4) 박스 배열
+    :param precision: 소수점 자릿수, None이면 float32 값을 손실 없이 복원할 수 있는 최단 표현 사용
+    :return: 길이 N의 문자열 리스트
+    """
+    labels = np.asarray(labels).reshape(-1)
+    values = np.concatenate([np.asarray(scores, dtype=np.float32).reshape(-1, 1),
+                             np.asarray(boxes, dtype=np.float32).reshape(-1, 4)], axis=1)
+    if precision is None:
+        table = np.concatenate([labels.astype(str)[:, None], values.astype(str)], axis=1)
+        return [' '.join(row) for row in table.tolist()]
+
+    row_format = '%d ' + ' '.join([f'%.{precision}f'] * 5)
+    return [row_format % row for row in zip(labels.tolist(), *values.astype(np.float64).T.tolist())]
+
+def format_prediction_strings(labels, scores, boxes, offsets, precision=None):
+    """
+    이미지별 PredictionString 리스트를 한 번에 생성
+
+    :param offsets: i번째 이미지의 예측이 offsets[i]:offsets[i + 1] 구간에 있는 배열
+    :param precision: 소수점 자릿수 (format_rows 참고)
+    :return: 이미지 순서대로 정렬된 PredictionString 리스트
+    """
+    rows = format_rows(labels, scores, boxes, precision)
+    offsets = np.asarray(offsets).tolist()
+    return [' '.join(rows[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+
+def benchmark(num_detections=300000, precisions=(None, 4, 2)):
+    """기존 방식(np.char.mod)과 비교한 PredictionString 생성 시간과 정밀도별 문자열 크기"""
+    rng = np.random.default_rng(42)
+    labels = rng.integers(0, 10, num_detections)
+    scores = rng.random(num_detections).astype(np.float32)
+    boxes = rng.uniform(0, 1024, (num_detections, 4)).astype(np.float32)
+    offsets = np.arange(0, num_detections + 1, 100)
+
+    for precision in precisions:
+        start = time.perf_counter()
+        strings = format_prediction_strings(labels, scores, boxes, offsets, precision)
+        elapsed = time.perf_counter() - start
+        size = sum(len(s) for s in strings) / 2**20
+        line = f"precision={precision}: {elapsed:.2f}s, {size:.1f} MB"
+
+        if precision is not None:
+            # 기존 방식: 원소마다 np.char.mod로 서식 적용
+            start = time.perf_counter()
+            values = np.char.mod(f'%.{precision}f', np.concatenate([scores[:, None], boxes], axis=1))
+            table = np.concatenate([labels.astype(str)[:, None], values], axis=1)
+            rows = [' '.join(r) for r in table.tolist()]
+            baseline = [' '.join(rows[s:e]) for s, e in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+            assert baseline == strings
+            line += f" (np.char.mod: {time.perf_counter() - start:.2f}s)"
+        print(line)
+
+    # 16자리 고정 소수점 서식과의 크기 비교
+    sample = format_rows(labels[:1000], scores[:1000], boxes[:1000], 16)
+    print(f"precision=16: {sum(len(s) for s in sample) / 1000:.0f} chars/box, "
+          f"precision=4: {sum(len(s) for s in format_rows(labels[:1000], scores[:1000], boxes[:1000], 4)) / 1000:.0f} chars/box")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark PredictionString serialization')
+    parser.add_argument('--num_detections', type=int, default=300000, help='Number of synthetic boxes (default: 300000)')
+    args = parser.parse_args()
+
+    benchmark(args.num_detections)
@@ -0,0 +1,69 @@
+import os
+import json
+import hashlib
+
+def file_digest(path, chunk_size=1 << 20):
+    """파일 내용의 SHA-256 해시"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprint(*parts):
+    """
+    입력 해시와 설정값을 묶은 빌드 키 생성
+
+    :param parts: JSON으로 직렬화할 수 있는 값들 (예: file_digest 결과, fold 수, 시드)
+    :return: SHA-256 해시 문자열
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+def write_if_changed(path, content):
+    """
+    내용이 기존 파일과 다를 때만 파일을 기록 (임시 파일에 쓴 뒤 교체)
+
+    :param path: 저장할 파일 경로
+    :param content: 저장할 문자열 또는 bytes
+    :return: 파일을 새로 기록했으면 True
+    """
+    data = content.encode() if isinstance(content, str) else content
+    if os.path.isfile(path) and os.path.getsize(path) == len(data):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+class BuildCache:
+    """
+    빌드 결과마다 마지막으로 사용한 입력 키를 기록하는 manifest
+
+    입력 키가 같고 출력 파일이 모두 남아 있으면 해당 결과를 다시 만들지 않는다.
+    """
+
+    def __init__(self, manifest_file):
+        self.manifest_file = manifest_file
+        self.entries = {}
+        if os.path.exists(manifest_file):
+            with open(manifest_file, 'r') as f:
+                self.entries = json.load(f)
+
+    def is_fresh(self, name, key, outputs=()):
+        """
+        :param name: 빌드 결과 이름 (예: fold1)
+        :param key: fingerprint()로 만든 입력 키
+        :param outputs: 존재해야 하는 출력 파일 경로들
+        :return: 다시 만들 필요가 없으면 True
+        """
+        return self.entries.get(name) == key and all(os.path.exists(output) for output in outputs)
+
+    def update(self, name, key):
+        """빌드 결과의 입력 키를 기록하고 manifest를 바로 저장 (중단되어도 완료된 결과는 유지)"""
+        self.entries[name] = key
+        os.makedirs(os.path.dirname(self.manifest_file) or '.', exist_ok=True)
+        write_if_changed(self.manifest_file, json.dumps(self.entries, indent=2, sort_keys=True))
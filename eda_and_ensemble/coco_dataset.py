@@ -0,0 +1,251 @@
+import numpy as np
+
+from coco_io import load_coco, save_coco
+
+# 배열로 보관하는 annotation 필드 (나머지 키는 ann_extra에 보관)
+ANNOTATION_FIELDS = ('id', 'image_id', 'category_id', 'bbox', 'area', 'iscrowd')
+
+
+class CocoDataset:
+    """
+    COCO annotation을 필드별 NumPy 배열(struct-of-arrays)로 보관하는 데이터셋
+
+    annotation은 이미지 순서대로 묶여 있으며 i번째 이미지의 annotation은 offsets[i]:offsets[i + 1] 구간에 저장된다.
+    annotation마다 딕셔너리를 두지 않으므로 박스당 약 50 bytes만 사용하고, 분할/병합/필터링/통계를 배열 연산으로 처리한다.
+    이미지와 카테고리 레코드는 수가 적으므로 원래 딕셔너리 그대로 보관한다.
+    annotation의 ANNOTATION_FIELDS 외의 키(예: segmentation)는 annotation별 딕셔너리 리스트(ann_extra)에 보관하며,
+    그런 키가 하나도 없으면 ann_extra는 None이다.
+    """
+    __slots__ = ('images', 'image_ids', 'categories', 'offsets', 'ann_ids', 'category_ids', 'bboxes', 'areas',
+                 'iscrowd', 'extra', 'ann_extra')
+
+    def __init__(self, images, image_ids, offsets, ann_ids, category_ids, bboxes, areas, iscrowd, categories,
+                 extra=None, ann_extra=None):
+        self.images = list(images)
+        self.image_ids = np.asarray(image_ids, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.ann_ids = np.asarray(ann_ids, dtype=np.int64)
+        self.category_ids = np.asarray(category_ids, dtype=np.int32)
+        self.bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        self.areas = np.asarray(areas, dtype=np.float64)
+        self.iscrowd = np.asarray(iscrowd, dtype=np.uint8)
+        self.categories = list(categories)
+        # info, licenses 등 나머지 최상위 키
+        self.extra = dict(extra or {})
+        # annotation별 나머지 키 (segmentation 등)
+        self.ann_extra = None if ann_extra is None else list(ann_extra)
+
+        if not (len(self.images) == len(self.image_ids) == len(self.offsets) - 1):
+            raise ValueError("images, image_ids and offsets must describe the same number of images")
+        if not (len(self.ann_ids) == len(self.category_ids) == len(self.bboxes) == len(self.areas) ==
+                len(self.iscrowd) == self.offsets[-1]):
+            raise ValueError("annotation arrays must have offsets[-1] rows")
+        if self.ann_extra is not None and len(self.ann_extra) != self.offsets[-1]:
+            raise ValueError("ann_extra must have one entry per annotation")
+
+    def __len__(self):
+        return len(self.images)
+
+    @property
+    def num_annotations(self):
+        return int(self.offsets[-1])
+
+    def counts(self):
+        """이미지별 annotation 개수"""
+        return np.diff(self.offsets)
+
+    def image_rows(self):
+        """각 annotation이 속한 이미지의 행 번호"""
+        return np.repeat(np.arange(len(self.images)), self.counts())
+
+    def slice(self, row):
+        """
+        행 번호로 한 이미지의 annotation을 조회
+
+        :param row: 이미지 행 번호
+        :return: (category_ids, bboxes) 배열 뷰 (bbox는 COCO xywh)
+        """
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.category_ids[start:end], self.bboxes[start:end]
+
+    def _take(self, images, image_ids, counts, ann_index):
+        # 이미지 레코드와 annotation 인덱스로 같은 카테고리/최상위 키를 가진 새 데이터셋 생성
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        ann_extra = None if self.ann_extra is None else [self.ann_extra[i] for i in np.asarray(ann_index).tolist()]
+        return CocoDataset(images, image_ids, offsets, self.ann_ids[ann_index], self.category_ids[ann_index],
+                           self.bboxes[ann_index], self.areas[ann_index], self.iscrowd[ann_index],
+                           self.categories, self.extra, ann_extra)
+
+    def subset(self, image_idx):
+        """
+        이미지 행 번호 목록에 해당하는 이미지와 annotation만 담은 데이터셋을 생성
+
+        :param image_idx: 포함할 이미지 행 번호 배열 (이 순서대로 이미지를 배치)
+        :return: CocoDataset
+        """
+        image_idx = np.asarray(image_idx, dtype=np.int64).reshape(-1)
+        counts = self.counts()[image_idx]
+        # 선택한 이미지의 annotation 구간을 이어 붙인 인덱스
+        starts = np.repeat(self.offsets[image_idx] - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+        ann_index = starts + np.arange(int(counts.sum()))
+        return self._take([self.images[i] for i in image_idx.tolist()], self.image_ids[image_idx], counts, ann_index)
+
+    def filter(self, mask):
+        """
+        annotation 단위의 boolean 마스크로 새 데이터셋을 생성 (이미지 목록은 유지)
+
+        :param mask: 길이가 num_annotations인 boolean 배열
+        :return: 마스크가 True인 annotation만 남긴 CocoDataset
+        """
+        mask = np.asarray(mask, dtype=bool)
+        counts = np.bincount(self.image_rows()[mask], minlength=len(self.images))
+        return self._take(self.images, self.image_ids, counts, np.flatnonzero(mask))
+
+    def renumber(self, image_start=0, ann_start=0):
+        """
+        이미지 id와 annotation id를 현재 순서대로 연속된 번호로 다시 매긴 데이터셋을 생성
+
+        :param image_start: 첫 이미지의 새 id
+        :param ann_start: 첫 annotation의 새 id
+        :return: CocoDataset
+        """
+        image_ids = image_start + np.arange(len(self.images), dtype=np.int64)
+        dataset = self._take(self.images, image_ids, self.counts(), np.arange(self.num_annotations))
+        dataset.ann_ids = ann_start + np.arange(self.num_annotations, dtype=np.int64)
+        return dataset
+
+    def remap_categories(self, categories):
+        """
+        카테고리를 이름 기준으로 다른 카테고리 목록의 id에 맞춘 데이터셋을 생성
+
+        :param categories: 기준 COCO 카테고리 리스트
+        :return: category_id를 기준 id로 바꾼 CocoDataset (id와 이름이 모두 같으면 자기 자신)
+        :raises ValueError: 기준 목록에 없는 이름의 카테고리가 있는 경우
+        """
+        if [(c['id'], c['name']) for c in self.categories] == [(c['id'], c['name']) for c in categories]:
+            return self
+
+        target_ids = {c['name']: c['id'] for c in categories}
+        missing = [c['name'] for c in self.categories if c['name'] not in target_ids]
+        if missing:
+            raise ValueError(f"Categories not found in the reference categories: {missing}")
+
+        # 기존 category_id -> 기준 id 조회 테이블
+        source_ids = np.array([c['id'] for c in self.categories], dtype=np.int64)
+        lookup = np.full(int(source_ids.max()) + 1, -1, dtype=np.int64)
+        lookup[source_ids] = [target_ids[c['name']] for c in self.categories]
+        category_ids = lookup[self.category_ids]
+        if np.any(category_ids < 0):
+            raise ValueError("Annotations refer to category ids missing from the dataset categories")
+
+        dataset = self._take(self.images, self.image_ids, self.counts(), np.arange(self.num_annotations))
+        dataset.category_ids = category_ids.astype(np.int32)
+        dataset.categories = list(categories)
+        return dataset
+
+    @classmethod
+    def concat(cls, datasets):
+        """여러 데이터셋을 이어 붙인 데이터셋을 생성 (카테고리와 최상위 키는 첫 데이터셋 기준, id는 그대로 유지)"""
+        datasets = list(datasets)
+        counts = np.concatenate([dataset.counts() for dataset in datasets])
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # 나머지 키가 있는 데이터셋이 하나라도 있으면 없는 쪽은 빈 딕셔너리로 채움
+        ann_extra = None
+        if any(dataset.ann_extra is not None for dataset in datasets):
+            ann_extra = [extra for dataset in datasets
+                         for extra in (dataset.ann_extra or [{}] * dataset.num_annotations)]
+        return cls([img for dataset in datasets for img in dataset.images],
+                   np.concatenate([dataset.image_ids for dataset in datasets]), offsets,
+                   np.concatenate([dataset.ann_ids for dataset in datasets]),
+                   np.concatenate([dataset.category_ids for dataset in datasets]),
+                   np.concatenate([dataset.bboxes for dataset in datasets]),
+                   np.concatenate([dataset.areas for dataset in datasets]),
+                   np.concatenate([dataset.iscrowd for dataset in datasets]),
+                   datasets[0].categories, datasets[0].extra, ann_extra)
+
+    def class_counts(self):
+        """
+        클래스별 annotation 개수
+
+        :return: {category_id: 개수} 딕셔너리 (annotation이 있는 클래스만, category_id 오름차순)
+        """
+        classes, counts = np.unique(self.category_ids, return_counts=True)
+        return dict(zip(classes.tolist(), counts.tolist()))
+
+    def label_matrix(self):
+        """
+        이미지별 멀티라벨 이진 행렬 (MultiLabelBinarizer().fit_transform과 같은 결과)
+
+        :return: ((이미지 수, 클래스 수) int 행렬, 열에 해당하는 category_id 배열)
+        """
+        classes = np.unique(self.category_ids)
+        matrix = np.zeros((len(self.images), len(classes)), dtype=np.int64)
+        matrix[self.image_rows(), np.searchsorted(classes, self.category_ids)] = 1
+        return matrix, classes
+
+    @classmethod
+    def from_coco(cls, data):
+        """
+        COCO 형식의 데이터 딕셔너리로부터 데이터셋을 생성
+
+        annotation은 이미지 순서대로 묶고 같은 이미지 안에서는 원래 순서를 유지한다.
+        images에 없는 이미지를 가리키는 annotation은 제외하고, ANNOTATION_FIELDS 외의 키는 ann_extra에 보관한다.
+        """
+        images = data['images']
+        annotations = data.get('annotations', [])
+        row_of_id = {img['id']: i for i, img in enumerate(images)}
+        ann_rows = np.array([row_of_id.get(ann['image_id'], -1) for ann in annotations], dtype=np.int64)
+        order = np.flatnonzero(ann_rows >= 0)
+        order = order[np.argsort(ann_rows[order], kind='stable')]
+        offsets = np.zeros(len(images) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ann_rows[order], minlength=len(images)), out=offsets[1:])
+
+        annotations = [annotations[i] for i in order.tolist()]
+        ann_extra = [{key: value for key, value in ann.items() if key not in ANNOTATION_FIELDS} for ann in annotations]
+        return cls(images, [img['id'] for img in images], offsets,
+                   [ann['id'] for ann in annotations],
+                   [ann['category_id'] for ann in annotations],
+                   [ann['bbox'] for ann in annotations],
+                   [ann.get('area', ann['bbox'][2] * ann['bbox'][3]) for ann in annotations],
+                   [ann.get('iscrowd', 0) for ann in annotations],
+                   data['categories'],
+                   {key: value for key, value in data.items() if key not in ('images', 'annotations', 'categories')},
+                   ann_extra if any(ann_extra) else None)
+
+    @classmethod
+    def load(cls, path):
+        """COCO JSON(.json 또는 .json.gz) 파일을 읽어 데이터셋을 생성"""
+        return cls.from_coco(load_coco(path))
+
+    def iter_images(self):
+        """id를 현재 image_ids 값으로 바꾼 이미지 레코드를 차례로 생성"""
+        for img, image_id in zip(self.images, self.image_ids.tolist()):
+            yield img if img['id'] == image_id else dict(img, id=image_id)
+
+    def iter_annotations(self):
+        """annotation 딕셔너리를 차례로 생성 (전체 리스트를 만들지 않고 저장할 때 사용, 나머지 키는 뒤에 붙임)"""
+        columns = zip(self.image_ids[self.image_rows()].tolist(), self.category_ids.tolist(), self.areas.tolist(),
+                      self.bboxes.tolist(), self.iscrowd.tolist(), self.ann_ids.tolist())
+        ann_extra = self.ann_extra or [{}] * self.num_annotations
+        for (image_id, category_id, area, bbox, iscrowd, ann_id), extra in zip(columns, ann_extra):
+            yield {'image_id': image_id, 'category_id': category_id, 'area': area, 'bbox': bbox,
+                   'iscrowd': iscrowd, 'id': ann_id, **extra}
+
+    def to_coco(self):
+        """COCO 형식의 데이터 딕셔너리로 변환"""
+        return {**self.extra, 'images': list(self.iter_images()), 'annotations': list(self.iter_annotations()),
+                'categories': self.categories}
+
+    def save(self, path, if_changed=False):
+        """
+        COCO JSON 파일로 저장 (annotation 딕셔너리는 기록하면서 하나씩 생성)
+
+        :param path: 저장할 파일 경로 (.gz로 끝나면 gzip으로 압축)
+        :param if_changed: True면 기존 파일과 내용이 같을 때 교체하지 않음
+        :return: 파일을 새로 기록했으면 True
+        """
+        data = {**self.extra, 'images': self.iter_images(), 'annotations': self.iter_annotations(),
+                'categories': self.categories}
+        return save_coco(data, path, if_changed=if_changed)
@@ -0,0 +1,146 @@
+import os
+import gzip
+import time
+import filecmp
+import argparse
+import json
+import numpy as np
+
+# 설치된 JSON 백엔드 중 가장 빠른 것을 사용 (orjson > ujson > json)
+# 백엔드마다 float 표기(1e-4 미만, 1e16 이상, NaN, numpy float32)가 달라 출력 bytes가 다를 수 있으므로,
+# 저장한 JSON을 재사용하는 빌드 캐시 키에는 JSON_BACKEND를 포함한다.
+try:
+    import orjson
+
+    JSON_BACKEND = 'orjson'
+
+    def dumps(data):
+        """압축 형식(공백 없음)의 UTF-8 JSON bytes로 직렬화"""
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+    loads = orjson.loads
+except ImportError:
+    def _to_builtin(value):
+        # orjson의 OPT_SERIALIZE_NUMPY와 같이 numpy 스칼라/배열도 직렬화
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+    try:
+        import ujson
+
+        JSON_BACKEND = 'ujson'
+
+        def dumps(data):
+            """압축 형식(공백 없음)의 UTF-8 JSON bytes로 직렬화"""
+            return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False, default=_to_builtin).encode()
+
+        loads = ujson.loads
+    except ImportError:
+        JSON_BACKEND = 'json'
+
+        def dumps(data):
+            """압축 형식(공백 없음)의 UTF-8 JSON bytes로 직렬화"""
+            return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=_to_builtin).encode()
+
+        loads = json.loads
+
+
+def _is_stream(value):
+    # 리스트, 튜플, 제너레이터 등은 원소 단위로 나누어 직렬화
+    return not isinstance(value, (dict, str, bytes)) and hasattr(value, '__iter__')
+
+def iter_json_chunks(data, chunk_size=10000):
+    """
+    COCO 딕셔너리를 JSON bytes 조각으로 나누어 생성
+
+    최상위 값 중 리스트(또는 제너레이터)는 chunk_size개씩 직렬화하므로 전체 JSON 문자열을 한 번에 만들지 않으며,
+    annotation을 제너레이터로 넘기면 annotation 리스트도 메모리에 올리지 않는다.
+    결과를 이어 붙이면 dumps(data)와 같다.
+
+    :param data: COCO 형식의 데이터 딕셔너리 (값은 리스트 대신 iterable이어도 됨)
+    :param chunk_size: 한 번에 직렬화할 원소 수
+    """
+    yield b'{'
+    for i, (key, value) in enumerate(data.items()):
+        yield (b',' if i else b'') + dumps(key) + b':'
+        if not _is_stream(value):
+            yield dumps(value)
+            continue
+
+        yield b'['
+        chunk, first = [], True
+        for item in value:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                yield (b'' if first else b',') + dumps(chunk)[1:-1]
+                chunk, first = [], False
+        if chunk:
+            yield (b'' if first else b',') + dumps(chunk)[1:-1]
+        yield b']'
+    yield b'}'
+
+def load_coco(path):
+    """
+    COCO JSON 파일 로드 (.gz로 끝나면 gzip 압축 파일로 읽음)
+
+    :param path: JSON 또는 JSON.gz 파일 경로
+    :return: COCO 형식의 데이터 딕셔너리
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        return loads(f.read())
+
+def save_coco(data, path, chunk_size=10000, if_changed=False, compresslevel=6):
+    """
+    COCO 데이터를 JSON 파일로 저장 (.gz로 끝나면 gzip으로 압축)
+
+    임시 파일에 조각 단위로 기록한 뒤 교체하므로 중간에 중단되어도 기존 파일이 깨지지 않는다.
+    gzip 헤더에는 시각을 기록하지 않아 내용이 같으면 항상 같은 파일이 만들어진다.
+
+    :param data: COCO 형식의 데이터 딕셔너리 (iter_json_chunks 참고)
+    :param path: 저장할 파일 경로
+    :param chunk_size: 한 번에 직렬화할 원소 수
+    :param if_changed: True면 기존 파일과 내용이 같을 때 교체하지 않음
+    :param compresslevel: gzip 압축 수준 (1~9)
+    :return: 파일을 새로 기록했으면 True
+    """
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as raw:
+        f = gzip.GzipFile(filename='', mode='wb', fileobj=raw, compresslevel=compresslevel, mtime=0) \
+            if path.endswith('.gz') else raw
+        for chunk in iter_json_chunks(data, chunk_size):
+            f.write(chunk)
+        if f is not raw:
+            f.close()
+
+    if if_changed and os.path.isfile(path) and filecmp.cmp(tmp_path, path, shallow=False):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+def benchmark(input_file, output_file):
+    """JSON 백엔드로 COCO 파일을 읽고 쓰는 시간을 측정 (확장자로 gzip 여부를 선택하므로 변환 도구로도 사용)"""
+    start = time.perf_counter()
+    data = load_coco(input_file)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    save_coco(data, output_file)
+    save_time = time.perf_counter() - start
+
+    print(f"Backend: {JSON_BACKEND}")
+    print(f"Loaded {input_file} ({os.path.getsize(input_file) / 2**20:.1f} MB) in {load_time:.2f}s")
+    print(f"Saved {output_file} ({os.path.getsize(output_file) / 2**20:.1f} MB) in {save_time:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load and save a COCO JSON with the fastest available backend')
+    parser.add_argument('--input', type=str, default='../dataset/json/train.json', help='Input COCO JSON (.json or .json.gz)')
+    parser.add_argument('--output', type=str, default='./output/train.json.gz', help='Output path (.json or .json.gz)')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    benchmark(args.input, args.output)
@@ -0,0 +1,95 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from coco_dataset import CocoDataset
+
+def partition_folds(data, folds):
+    """
+    K-fold 분할 결과로 fold별 (train, validation) CocoDataset을 생성 (split_coco_data와 같은 방식)
+
+    annotation을 이미지별 구간으로 한 번만 묶고 fold마다 구간을 잘라내므로
+    전체 비용이 O(annotation 수 x fold 수)이다.
+
+    :param data: COCO 형식의 데이터 딕셔너리
+    :param folds: (train_idx, val_idx) 이미지 행 번호 배열 튜플의 iterable
+    :return: 각 fold의 (train, validation) CocoDataset 튜플 리스트
+    """
+    dataset = CocoDataset.from_coco(data)
+    # 분할 스크립트가 MultilabelStratifiedKFold에 넘기는 멀티라벨 행렬도 함께 계산
+    dataset.label_matrix()
+    return [(dataset.subset(train_idx), dataset.subset(val_idx)) for train_idx, val_idx in folds]
+
+def _partition_folds_baseline(data, folds):
+    # 기존 방식: annotation마다 fold 이미지 id 배열을 선형 탐색
+    df = pd.DataFrame(data['images'])
+    fold_data = []
+    for train_idx, val_idx in folds:
+        train_df = df.iloc[train_idx]
+        val_df = df.iloc[val_idx]
+        train_annotations = [ann for ann in data['annotations'] if ann['image_id'] in train_df['id'].values]
+        val_annotations = [ann for ann in data['annotations'] if ann['image_id'] in val_df['id'].values]
+        fold_data.append((train_annotations, val_annotations))
+    return fold_data
+
+def make_synthetic_coco(num_images, anns_per_image=5, num_classes=10, seed=42):
+    """벤치마크용 가상 COCO 데이터 생성 (이미지당 평균 anns_per_image개의 annotation)"""
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(anns_per_image, num_images)
+    image_ids = np.repeat(np.arange(num_images), counts)
+    labels = rng.integers(0, num_classes, len(image_ids))
+    boxes = np.round(rng.uniform(0, 512, (len(image_ids), 4)), 1)
+    return {
+        'images': [{'id': i, 'file_name': f'train/{i:06d}.jpg', 'width': 1024, 'height': 1024}
+                   for i in range(num_images)],
+        'annotations': [{'id': i, 'image_id': image_id, 'category_id': label, 'bbox': box,
+                         'area': box[2] * box[3], 'iscrowd': 0}
+                        for i, (image_id, label, box) in enumerate(zip(image_ids.tolist(), labels.tolist(),
+                                                                        boxes.tolist()))],
+        'categories': [{'id': c, 'name': str(c)} for c in range(num_classes)]
+    }
+
+def random_folds(num_images, n_splits=5, seed=42):
+    """벤치마크용 무작위 K-fold 이미지 행 번호 분할"""
+    rng = np.random.default_rng(seed)
+    parts = np.array_split(rng.permutation(num_images), n_splits)
+    return [(np.sort(np.concatenate(parts[:k] + parts[k + 1:])), np.sort(parts[k])) for k in range(n_splits)]
+
+def benchmark(num_images=100000, baseline_images=2000, n_splits=5, anns_per_image=5):
+    """
+    기존 방식과 CocoDataset 방식의 fold 분할 시간을 비교
+
+    기존 방식은 O(annotation 수 x 이미지 수)라 전체 크기로 실행하기 어려우므로
+    baseline_images개의 부분 데이터에서 측정하고 제곱 비율로 환산한다.
+    """
+    data = make_synthetic_coco(num_images, anns_per_image)
+    print(f"Synthetic dataset: {num_images} images, {len(data['annotations'])} annotations, {n_splits} folds")
+
+    start = time.perf_counter()
+    partition_folds(data, random_folds(num_images, n_splits))
+    indexed_time = time.perf_counter() - start
+
+    # 같은 부분 데이터에서 두 방식의 결과가 같은지 확인하며 기존 방식 측정
+    small = make_synthetic_coco(baseline_images, anns_per_image)
+    small_folds = random_folds(baseline_images, n_splits)
+    start = time.perf_counter()
+    baseline = _partition_folds_baseline(small, small_folds)
+    baseline_time = time.perf_counter() - start
+    indexed = partition_folds(small, small_folds)
+    assert all(b == (list(t.iter_annotations()), list(v.iter_annotations())) for b, (t, v) in zip(baseline, indexed))
+
+    estimated = baseline_time * (num_images / baseline_images) ** 2
+    print(f"indexed : {indexed_time:8.2f}s ({num_images} images)")
+    print(f"baseline: {baseline_time:8.2f}s ({baseline_images} images) -> ~{estimated:.0f}s estimated for {num_images} images")
+    print(f"speedup : ~{estimated / indexed_time:.0f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark K-fold annotation partitioning on synthetic COCO data')
+    parser.add_argument('--num_images', type=int, default=100000, help='Number of synthetic images (default: 100000)')
+    parser.add_argument('--baseline_images', type=int, default=2000,
+                        help='Number of images used to time the previous implementation (default: 2000)')
+    parser.add_argument('--n_splits', type=int, default=5, help='Number of folds (default: 5)')
+    args = parser.parse_args()
+
+    benchmark(args.num_images, args.baseline_images, args.n_splits)
@@ -1,7 +1,10 @@
 import streamlit as st
-import pandas as pd
 from PIL import ImageFont, ImageDraw, Image
 import os
+import numpy as np
+
+from image_meta import load_image_meta
+from prediction_store import load_predictions
 
 # 클래스 이름 정의
 CLASS_NAMES = ['General trash', 'Paper', 'Paper pack', 'Metal', 'Glass', 'Plastic', 'Styrofoam', 'Plastic bag', 'Battery', 'Clothing']
@@ -20,14 +23,19 @@ CLASS_COLORS = [
     (128, 128, 0)   # Olive
 ]
 
-# CSV 파일 로드
+# 예측 파일 로드 (CSV 또는 바이너리 저장소)
 @st.cache_data
 def load_csv(file_name):
     csv_path = os.path.join(os.path.dirname(__file__), 'csv', file_name)
-    df = pd.read_csv(csv_path)
-    df['image_id'] = df['image_id'].apply(lambda x: x.split('/')[-1])  # 파일명만 추출
-    df = df.sort_values('image_id')  # 이미지 ID로 정렬
-    return df
+    store = load_predictions(csv_path)
+    # 파일명만으로 조회할 수 있도록 image_id -> 행 번호 인덱스 생성
+    file_index = {image_id.split('/')[-1]: i for i, image_id in enumerate(store.image_ids)}
+    return store, file_index
+
+# 테스트 이미지 정보(id, 크기) 캐시 로드
+@st.cache_resource
+def load_meta(ann_file):
+    return load_image_meta(ann_file) if os.path.exists(ann_file) else None
 
 # 이미지 로드
 @st.cache_data
@@ -76,7 +84,7 @@ def main():
 
     # CSV 파일 목록 가져오기
     csv_folder = os.path.join(os.path.dirname(__file__), 'csv')
-    csv_files = [f for f in os.listdir(csv_folder) if f.endswith('.csv')]
+    csv_files = [f for f in os.listdir(csv_folder) if f.endswith(('.csv', '.npz', '.parquet'))]
 
     if len(csv_files) < 2:
         st.error("Please make sure there are at least two CSV files in the 'csv' folder.")
@@ -86,11 +94,12 @@ def main():
     csv_file1 = st.selectbox("Select first CSV file", csv_files)
     csv_file2 = st.selectbox("Select second CSV file", csv_files, index=1)
 
-    df1 = load_csv(csv_file1)
-    df2 = load_csv(csv_file2)
+    store1, file_index1 = load_csv(csv_file1)
+    store2, file_index2 = load_csv(csv_file2)
 
     # 테스트 이미지 디렉토리 설정
     test_image_dir = "../dataset/test"
+    image_meta = load_meta("../dataset/json/test.json")
 
     if os.path.exists(test_image_dir):
         image_files = sorted([f for f in os.listdir(test_image_dir) if f.endswith(('.jpg', '.png', '.jpeg'))])
@@ -122,42 +131,33 @@ def main():
             image_path = os.path.join(test_image_dir, selected_image)
             image = load_image(image_path)
 
-            st.image(image, caption=f"Original Image (Image {st.session_state.image_index})", use_column_width=True)
-
-            # CSV 파일에서 해당 이미지의 예측 결과 가져오기
-            predictions1 = df1[df1['image_id'] == selected_image]
-            predictions2 = df2[df2['image_id'] == selected_image]
+            caption = f"Original Image (Image {st.session_state.image_index})"
+            if image_meta is not None:
+                # JSON에 기록된 이미지 id와 크기 표시
+                try:
+                    meta_row = image_meta.row(selected_image)
+                    caption += (f" id={image_meta.ids[meta_row]}, "
+                                f"{image_meta.widths[meta_row]}x{image_meta.heights[meta_row]}")
+                except KeyError:
+                    pass
+            st.image(image, caption=caption, use_column_width=True)
 
             # 두 모델의 예측 결과 시각화
-            st.subheader(f"{csv_file1} Predictions")
-            image1 = image.copy()
-            annotation_count1 = 0
-            for _, row in predictions1.iterrows():
-                pred_strings = row['PredictionString'].split()
-                for i in range(0, len(pred_strings), 6):
-                    label = int(pred_strings[i])
-                    score = float(pred_strings[i+1])
-                    if score >= confidence_threshold:  # 임계값 이상의 예측만 표시
-                        annotation_count1 += 1
-                        bbox = list(map(float, pred_strings[i+2:i+6]))
-                        image1 = draw_bbox(image1, bbox, CLASS_NAMES[label], score, CLASS_COLORS[label])
-            st.image(image1, caption=f"{csv_file1} Predictions", use_column_width=True)
-            st.write(f"Number of annotations: {annotation_count1}")
-
-            st.subheader(f"{csv_file2} Predictions")
-            image2 = image.copy()
-            annotation_count2 = 0
-            for _, row in predictions2.iterrows():
-                pred_strings = row['PredictionString'].split()
-                for i in range(0, len(pred_strings), 6):
-                    label = int(pred_strings[i])
-                    score = float(pred_strings[i+1])
-                    if score >= confidence_threshold:  # 임계값 이상의 예측만 표시
-                        annotation_count2 += 1
-                        bbox = list(map(float, pred_strings[i+2:i+6]))
-                        image2 = draw_bbox(image2, bbox, CLASS_NAMES[label], score, CLASS_COLORS[label])
-            st.image(image2, caption=f"{csv_file2} Predictions", use_column_width=True)
-            st.write(f"Number of annotations: {annotation_count2}")
+            for csv_file, store, file_index in [(csv_file1, store1, file_index1), (csv_file2, store2, file_index2)]:
+                st.subheader(f"{csv_file} Predictions")
+                pred_image = image.copy()
+                annotation_count = 0
+
+                # 예측 파일에서 해당 이미지의 예측 결과 가져오기
+                row = file_index.get(selected_image)
+                if row is not None:
+                    labels, scores, boxes = store.slice(row)
+                    keep = scores >= np.float32(confidence_threshold)  # 임계값 이상의 예측만 표시 (점수와 같은 float32로 비교)
+                    for label, score, bbox in zip(labels[keep].tolist(), scores[keep].tolist(), boxes[keep].tolist()):
+                        annotation_count += 1
+                        pred_image = draw_bbox(pred_image, bbox, CLASS_NAMES[label], score, CLASS_COLORS[label])
+                st.image(pred_image, caption=f"{csv_file} Predictions", use_column_width=True)
+                st.write(f"Number of annotations: {annotation_count}")
 
         else:
             st.error("Test image directory not found.")
@@ -1,11 +1,138 @@
-import pandas as pd
 import numpy as np
-from ensemble_boxes import nms, soft_nms, non_maximum_weighted, weighted_boxes_fusion
-from pycocotools.coco import COCO
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
 import os
 import argparse
 
-def main(fusion_method='nms', iou_thr=0.6, weights=None):
+import fusion
+from coco_io import load_coco
+from evaluate import GroundTruth, evaluate_detections, summarize
+from image_meta import load_image_meta
+from prediction_store import PredictionStore, load_predictions, save_predictions
+
+def get_fusion_functions(backend='numpy'):
+    """
+    박스 앙상블 함수 모음을 반환
+
+    :param backend: 'numpy'(fusion.py의 배열 연산 구현) 또는 'ensemble_boxes'(원본 라이브러리)
+    :return: 앙상블 방법 이름 -> 함수 딕셔너리
+    """
+    if backend == 'numpy':
+        module = fusion
+    elif backend == 'ensemble_boxes':
+        import ensemble_boxes as module
+    else:
+        raise ValueError("Invalid fusion backend. Choose from 'numpy' or 'ensemble_boxes'.")
+    return {
+        'nms': module.nms,
+        'soft_nms': module.soft_nms,
+        'nmw': module.non_maximum_weighted,
+        'wbf': module.weighted_boxes_fusion,
+    }
+
+def fuse_image(members, image_size, fusion_method='nms', iou_thr=0.6, weights=None, backend='numpy'):
+    """
+    한 이미지에 대한 여러 모델의 예측을 하나로 합침
+
+    :param members: 모델별 (labels, scores, boxes) 튜플 리스트 (예측이 없는 모델은 None)
+    :param image_size: (width, height) 이미지 크기
+    :param fusion_method: 앙상블 방법 ('nms', 'soft_nms', 'nmw', 'wbf')
+    :param iou_thr: 박스를 같은 객체로 판단할 IoU 임계값
+    :param weights: 모델별 가중치
+    :param backend: 앙상블 구현 ('numpy' 또는 'ensemble_boxes')
+    :return: (labels, scores, boxes) 앙상블 결과, boxes는 픽셀 단위 xyxy
+    """
+    boxes_list = []
+    scores_list = []
+    labels_list = []
+
+    # 박스 좌표 정규화에 사용할 이미지 크기
+    width, height = image_size
+    scale = np.array([width, height, width, height], dtype=np.float64)
+
+    # 각 모델(CSV 파일)의 예측 결과 처리
+    for prediction in members:
+        # 예측이 없는 경우 건너 뛰기
+        if prediction is None or len(prediction[0]) == 0:
+            continue
+        labels, scores, boxes = prediction
+
+        # 박스 좌표를 이미지 크기에 맞게 정규화
+        boxes_list.append(boxes / scale)
+        scores_list.append(scores.astype(np.float64))
+        labels_list.append(labels.astype(np.int64))
+
+    if not len(boxes_list):
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros((0, 4))
+
+    # 박스 좌표 앙상블 수행
+    fusion_functions = get_fusion_functions(backend)
+    if fusion_method not in fusion_functions:
+        raise ValueError("Invalid fusion method. Choose from 'nms', 'soft_nms', 'nmw', or 'wbf'.")
+    boxes, scores, labels = fusion_functions[fusion_method](boxes_list, scores_list, labels_list, iou_thr=iou_thr, weights=weights)
+
+    # 정규화된 좌표를 원래 이미지 크기로 복원
+    return np.asarray(labels, dtype=np.int64), np.asarray(scores), np.asarray(boxes).reshape(-1, 4) * scale
+
+def fuse_shard(shard, fusion_method='nms', iou_thr=0.6, weights=None, backend='numpy'):
+    """
+    이미지 묶음(shard)에 대해 fuse_image를 순서대로 수행 (워커 프로세스에서 실행)
+
+    :param shard: (members, image_size) 튜플 리스트
+    :return: 입력과 같은 순서의 (labels, scores, boxes) 리스트
+    """
+    return [fuse_image(members, image_size, fusion_method, iou_thr, weights, backend) for members, image_size in shard]
+
+def build_payload(stores, image_ids, image_sizes):
+    """
+    이미지별로 각 모델의 예측 배열을 모음
+
+    :return: (members, image_size) 튜플 리스트 (fuse_shard의 입력)
+    """
+    return [([store.get(image_id) for store in stores], image_size)
+            for image_id, image_size in zip(image_ids, image_sizes)]
+
+def ensemble_predictions(stores, image_ids, image_sizes, fusion_method='nms', iou_thr=0.6, weights=None, workers=1,
+                         backend='numpy'):
+    """
+    여러 예측 저장소를 이미지 단위로 앙상블
+
+    workers > 1이면 이미지를 연속된 shard로 나누어 프로세스 풀에서 처리한다.
+    워커에는 DataFrame 대신 이미 파싱된 이미지별 배열만 전달하며,
+    shard 순서대로 결과를 이어 붙이므로 결과는 workers 값과 무관하게 동일하다.
+
+    :param stores: 모델별 PredictionStore 리스트
+    :param image_ids: 앙상블할 이미지 ID 리스트 (결과 순서)
+    :param image_sizes: 이미지별 (width, height) 리스트
+    :param workers: 사용할 프로세스 수
+    :param backend: 앙상블 구현 ('numpy' 또는 'ensemble_boxes')
+    :return: 앙상블 결과 PredictionStore
+    """
+    payload = build_payload(stores, image_ids, image_sizes)
+
+    if workers <= 1:
+        fused = fuse_shard(payload, fusion_method, iou_thr, weights, backend)
+    else:
+        # 프로세스 간 통신 비용을 줄이기 위해 워커당 여러 개의 연속된 shard로 분할
+        num_shards = min(len(payload), workers * 4) or 1
+        bounds = np.linspace(0, len(payload), num_shards + 1).astype(int)
+        shards = [payload[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(fuse_shard, shards, [fusion_method] * len(shards), [iou_thr] * len(shards),
+                                   [weights] * len(shards), [backend] * len(shards))
+            fused = [image_result for shard_result in results for image_result in shard_result]
+
+    return fused_to_store(image_ids, fused)
+
+def fused_to_store(image_ids, fused):
+    """fuse_shard 결과 리스트를 PredictionStore로 변환"""
+    fused_labels, fused_scores, fused_boxes = zip(*fused) if fused else ([], [], [])
+    return PredictionStore.from_lists(image_ids, fused_labels, fused_scores, fused_boxes)
+
+def main(fusion_method='nms', iou_thr=0.6, weights=None, output_file=None, workers=1, backend='numpy', precision=None):
     # ensemble할 csv 파일들
     submission_files = [
         './csv/CO-DINO(SwinL + lsj)36ep.csv',
@@ -13,91 +140,147 @@ def main(fusion_method='nms', iou_thr=0.6, weights=None):
         './csv/codinno milestone 5, 9 12ep.csv'
     ]
 
-    # CSV 파일들을 DataFrame으로 읽어오기
-    submission_df = [pd.read_csv(file) for file in submission_files]
+    # 예측 파일(CSV 또는 바이너리 저장소)들을 한 번씩만 파싱하여 이미지별 인덱스 생성
+    submission_preds = [load_predictions(file) for file in submission_files]
 
-    # 첫 번째 CSV 파일에서 이미지 ID 목록 가져오기
-    image_ids = submission_df[0]['image_id'].tolist()
+    # 첫 번째 파일에서 이미지 ID 목록 가져오기
+    image_ids = submission_preds[0].image_ids
 
-    # 테스트 데이터 JSON 파일 경로 설정
-    annotation = '../dataset/json/test.json'
-    coco = COCO(annotation)
-
-    prediction_strings = []
-    file_names = []
+    # 이미지 크기 정보 (행 순서가 아닌 file_name으로 조회)
+    image_sizes = load_image_meta('../dataset/json/test.json').sizes(image_ids)
 
     # 각 이미지에 대해 앙상블 수행
-    for i, image_id in enumerate(image_ids):
-        prediction_string = ''
-        boxes_list = []
-        scores_list = []
-        labels_list = []
-        image_info = coco.loadImgs(i)[0]
-
-        # 각 모델(CSV 파일)의 예측 결과 처리
-        for df in submission_df:
-            predict_string = df[df['image_id'] == image_id]['PredictionString'].tolist()[0]
-            predict_list = str(predict_string).split()
-
-            # 예측이 없는 경우 건너 뛰기
-            if len(predict_list) == 0 or len(predict_list) == 1:
-                continue
-
-            # 예측 문자열을 numpy 배열로 변환
-            predict_list = np.reshape(predict_list, (-1, 6))
-            box_list = []
-
-            # 박스 좌표를 이미지 크기에 맞게 정규화
-            for box in predict_list[:, 2:6].tolist():
-                image_width = image_info['width']
-                image_height = image_info['height']
-                box[0] = float(box[0]) / image_width
-                box[1] = float(box[1]) / image_height
-                box[2] = float(box[2]) / image_width
-                box[3] = float(box[3]) / image_height
-                box_list.append(box)
-
-            boxes_list.append(box_list)
-            scores_list.append(list(map(float, predict_list[:, 1].tolist())))
-            labels_list.append(list(map(int, predict_list[:, 0].tolist())))
-
-        # 박스 좌표 앙상블 수행
-        if len(boxes_list):
-            if fusion_method == 'nms':
-                boxes, scores, labels = nms(boxes_list, scores_list, labels_list, iou_thr=iou_thr, weights=weights)
-            elif fusion_method == 'soft_nms':
-                boxes, scores, labels = soft_nms(boxes_list, scores_list, labels_list, iou_thr=iou_thr, weights=weights)
-            elif fusion_method == 'nmw':
-                boxes, scores, labels = non_maximum_weighted(boxes_list, scores_list, labels_list, iou_thr=iou_thr, weights=weights)
-            elif fusion_method == 'wbf':
-                boxes, scores, labels = weighted_boxes_fusion(boxes_list, scores_list, labels_list, iou_thr=iou_thr, weights=weights)
+    submission = ensemble_predictions(submission_preds, image_ids, image_sizes,
+                                      fusion_method=fusion_method, iou_thr=iou_thr, weights=weights, workers=workers,
+                                      backend=backend)
+
+    # 앙상블 결과 저장 (.csv 또는 .npz 등 바이너리 형식)
+    if output_file is None:
+        os.makedirs('./output', exist_ok=True)
+        output_file = f'./output/{fusion_method}_ensemble.csv'
+    save_predictions(submission, output_file, precision)
+    print(f"Ensemble result saved to {output_file}")
+
+def expand_sweep_spec(spec, search='grid', num_samples=20, seed=42, num_models=None):
+    """
+    탐색 공간 명세를 앙상블 설정 리스트로 변환
+
+    명세의 각 키(method, iou_thr, weights)는 후보 리스트 또는 {"min": a, "max": b} 범위로 지정한다.
+    grid 탐색은 모든 후보 리스트의 곱을, random 탐색은 후보/범위에서 num_samples개를 무작위로 뽑는다.
+
+    :param spec: 탐색 공간 딕셔너리
+    :param search: 'grid' 또는 'random'
+    :param num_samples: random 탐색 시 설정 수
+    :param seed: random 탐색 시드
+    :param num_models: 가중치 범위에서 뽑을 모델 수
+    :return: {'method', 'iou_thr', 'weights'} 딕셔너리 리스트
+    """
+    defaults = {'method': ['nms'], 'iou_thr': [0.6], 'weights': [None]}
+    space = {key: spec.get(key, value) for key, value in defaults.items()}
+
+    if search == 'grid':
+        for key, values in space.items():
+            if not isinstance(values, list):
+                raise ValueError(f"Grid search needs a list of candidates for '{key}'")
+        return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+    if search != 'random':
+        raise ValueError("Invalid search. Choose from 'grid' or 'random'.")
+
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(num_samples):
+        config = {}
+        for key, values in space.items():
+            if isinstance(values, list):
+                config[key] = values[rng.integers(len(values))]
+            elif key == 'weights':
+                config[key] = np.round(rng.uniform(values['min'], values['max'], num_models), 3).tolist()
             else:
-                raise ValueError("Invalid fusion method. Choose from 'nms', 'soft_nms', 'nmw', or 'wbf'.")
+                config[key] = round(float(rng.uniform(values['min'], values['max'])), 3)
+        configs.append(config)
+    return configs
 
-            # 클래스 레이블을 정수로 변환
-            labels = [int(label) for label in labels]
+# 스윕 워커 프로세스가 공유하는 상태 (initializer에서 한 번만 생성)
+_sweep_state = {}
 
-            # 앙상블 결과를 문자열로 변환
-            for box, score, label in zip(boxes, scores, labels):
-                prediction_string += f"{label} {score:.4f} {box[0]*image_info['width']:.2f} {box[1]*image_info['height']:.2f} {box[2]*image_info['width']:.2f} {box[3]*image_info['height']:.2f} "
+def _init_sweep_worker(payload, image_ids, gt_data, backend):
+    _sweep_state.update(payload=payload, image_ids=image_ids, gt=GroundTruth(gt_data), backend=backend)
 
-        prediction_strings.append(prediction_string.strip())
-        file_names.append(image_id)
+def _evaluate_sweep_config(config):
+    fused = fuse_shard(_sweep_state['payload'], config['method'], config['iou_thr'], config['weights'],
+                       _sweep_state['backend'])
+    store = fused_to_store(_sweep_state['image_ids'], fused)
+    ap, category_ids = evaluate_detections(store, _sweep_state['gt'])
+    _, map50, map50_95 = summarize(ap, category_ids, _sweep_state['gt'])
+    return dict(config, mAP50=map50, **{'mAP50:95': map50_95})
 
-    # 앙상블 결과를 DataFrame으로 저장
-    submission = pd.DataFrame()
-    submission['PredictionString'] = prediction_strings
-    submission['image_id'] = file_names
+def sweep(submission_files, ann_file, spec, search='grid', num_samples=20, seed=42, workers=1,
+          backend='numpy', output_file=None):
+    """
+    검증 fold에서 앙상블 설정(method, iou_thr, weights)을 탐색하고 mAP50 기준으로 정렬된 결과표를 생성
 
-    # 결과 저장
-    os.makedirs('./output', exist_ok=True)
-    output_file = f'./output/{fusion_method}_ensemble.csv'
-    submission.to_csv(output_file, index=False, quoting=1, quotechar='"', escapechar='\\')
-    print(f"Ensemble result saved to {output_file}")
+    예측 파일과 정답/이미지 크기 정보는 한 번만 읽고, 각 설정은 프로세스 풀에서 병렬로 평가한다.
 
-if __name__ == "__main__":
+    :param submission_files: 검증 fold 이미지에 대한 모델별 예측 파일 리스트
+    :param ann_file: 검증 fold 정답 COCO JSON 경로 (예: json/splits/val_fold4.json)
+    :param spec: 탐색 공간 딕셔너리 (expand_sweep_spec 참고)
+    :param workers: 동시에 평가할 프로세스 수
+    :param output_file: 결과표 CSV 저장 경로
+    :return: mAP50 내림차순으로 정렬된 결과 DataFrame
+    """
+    # 예측 파일과 정답을 한 번씩만 읽기
+    stores = [load_predictions(file) for file in submission_files]
+    gt_data = load_coco(ann_file)
+
+    image_ids = [img['file_name'] for img in gt_data['images']]
+    image_sizes = [(img['width'], img['height']) for img in gt_data['images']]
+    payload = build_payload(stores, image_ids, image_sizes)
+
+    configs = expand_sweep_spec(spec, search, num_samples, seed, num_models=len(stores))
+    print(f"Evaluating {len(configs)} ensemble configurations on {len(image_ids)} images...")
+
+    init_args = (payload, image_ids, gt_data, backend)
+    if workers <= 1:
+        _init_sweep_worker(*init_args)
+        results = [_evaluate_sweep_config(config) for config in configs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker, initargs=init_args) as executor:
+            results = list(executor.map(_evaluate_sweep_config, configs))
+
+    table = pd.DataFrame(results).sort_values('mAP50', ascending=False, kind='stable').reset_index(drop=True)
+    if output_file is not None:
+        table.to_csv(output_file, index=False)
+        print(f"Sweep results saved to {output_file}")
+    print(table.head(20).to_string())
+    return table
+
+def add_common_arguments(parser, suppress_defaults=False):
+    """
+    앙상블과 sweep에서 공통으로 사용하는 인자 추가
+
+    :param suppress_defaults: True이면 기본값을 기록하지 않음 (sweep 서브파서에서 사용하여,
+                              서브커맨드 앞에 지정한 값이 서브파서의 기본값으로 덮어써지지 않도록 함)
+    """
+    def default(value):
+        return argparse.SUPPRESS if suppress_defaults else value
+
+    # 결과 저장 경로 설정 (.csv가 아니면 바이너리 예측 저장소로 저장)
+    parser.add_argument('--output', type=str, default=default(None),
+                        help='Output path (default: ./output/{method}_ensemble.csv, '
+                             'or ./output/sweep_results.csv for sweep)')
+    # 병렬 처리에 사용할 프로세스 수
+    parser.add_argument('--workers', type=int, default=default(1),
+                        help='Number of worker processes (default: 1)')
+    # 박스 앙상블 구현 선택
+    parser.add_argument('--backend', type=str, default=default('numpy'), choices=['numpy', 'ensemble_boxes'],
+                        help='Box fusion implementation (default: numpy, see fusion.py)')
+
+def build_parser():
+    """앙상블 / sweep 명령줄 인자 파서 생성 (공통 인자는 sweep 앞뒤 어디에 지정해도 됨)"""
     # 명령줄 인자 파서 설정
     parser = argparse.ArgumentParser(description='Ensemble object detection results')
+    add_common_arguments(parser)
     # 앙상블 방법 선택
     parser.add_argument('--method', type=str, default='nms', choices=['nms', 'soft_nms', 'nmw', 'wbf'],
                         help='Fusion method to use (default: nms)')
@@ -107,7 +290,50 @@ if __name__ == "__main__":
     # 각 모델에 대한 가중치 설정
     parser.add_argument('--weights', nargs='+', type=float, default=None,
                         help='Weights for each model (default: None, which means equal weights)')
-    args = parser.parse_args()
+    # CSV에 기록할 소수점 자릿수 (지정하지 않으면 손실 없는 최단 표현)
+    parser.add_argument('--precision', type=int, default=None,
+                        help='Decimal places in the output CSV (default: shortest lossless float32 representation)')
+
+    # 검증 fold에서 앙상블 설정을 탐색하는 sweep 서브커맨드
+    subparsers = parser.add_subparsers(dest='command')
+    sweep_parser = subparsers.add_parser('sweep', help='Search fusion settings on a validation fold')
+    add_common_arguments(sweep_parser, suppress_defaults=True)
+    sweep_parser.add_argument('--submissions', nargs='+', required=True,
+                              help='Prediction files (.csv or binary store) of each model on the validation images')
+    sweep_parser.add_argument('--ann_file', type=str, default='../dataset/json/splits/val_fold4.json',
+                              help='Ground truth COCO JSON of the validation fold')
+    sweep_parser.add_argument('--spec', type=str, default=None,
+                              help='Search space as a JSON file or string, e.g. '
+                                   '\'{"method": ["nms", "wbf"], "iou_thr": [0.5, 0.6], "weights": [null, [2, 1, 1]]}\'; '
+                                   'random search also accepts {"min": a, "max": b} ranges')
+    sweep_parser.add_argument('--search', type=str, default='grid', choices=['grid', 'random'],
+                              help='Search strategy (default: grid)')
+    sweep_parser.add_argument('--num_samples', type=int, default=20,
+                              help='Number of configurations for random search (default: 20)')
+    sweep_parser.add_argument('--seed', type=int, default=42,
+                              help='Random search seed (default: 42)')
+    return parser
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    if args.command == 'sweep':
+        # 탐색 공간 읽기 (기본값: 모든 방법 x IoU 임계값 0.5~0.7)
+        if args.spec is None:
+            spec = {'method': ['nms', 'soft_nms', 'nmw', 'wbf'], 'iou_thr': [0.5, 0.55, 0.6, 0.65, 0.7]}
+        elif os.path.exists(args.spec):
+            with open(args.spec, 'r') as f:
+                spec = json.load(f)
+        else:
+            spec = json.loads(args.spec)
 
-    # 앙상블 수행
-    main(fusion_method=args.method, iou_thr=args.iou_thr, weights=args.weights)
\ No newline at end of file
+        output_file = args.output
+        if output_file is None:
+            os.makedirs('./output', exist_ok=True)
+            output_file = './output/sweep_results.csv'
+        sweep(args.submissions, args.ann_file, spec, search=args.search, num_samples=args.num_samples,
+              seed=args.seed, workers=args.workers, backend=args.backend, output_file=output_file)
+    else:
+        # 앙상블 수행
+        main(fusion_method=args.method, iou_thr=args.iou_thr, weights=args.weights, output_file=args.output,
+             workers=args.workers, backend=args.backend, precision=args.precision)
@@ -0,0 +1,271 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+from box_format import xywh_to_xyxy
+from coco_io import load_coco
+from prediction_store import load_predictions
+
+# COCO 평가 기준과 동일한 IoU 임계값(0.50:0.05:0.95)과 recall 구간(0:0.01:1)
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+RECALL_THRESHOLDS = np.linspace(0.0, 1.0, 101)
+
+
+class GroundTruth:
+    """
+    평가에 사용할 정답 박스를 이미지별 평탄화 배열로 보관
+
+    i번째 이미지의 정답은 offsets[i]:offsets[i + 1] 구간에 저장된다.
+    """
+    __slots__ = ('image_ids', 'file_index', 'offsets', 'boxes', 'labels', 'ignore', 'iscrowd', 'zero_id', 'categories')
+
+    def __init__(self, gt_data):
+        # pycocotools와 같이 이미지 id 오름차순으로 정렬
+        images = sorted(gt_data['images'], key=lambda img: img['id'])
+        self.image_ids = np.array([img['id'] for img in images], dtype=np.int64)
+        self.file_index = {img['file_name']: i for i, img in enumerate(images)}
+        self.categories = {cat['id']: cat.get('name', str(cat['id'])) for cat in gt_data['categories']}
+
+        row_of_id = {image_id: i for i, image_id in enumerate(self.image_ids.tolist())}
+        annotations = [ann for ann in gt_data['annotations']
+                       if ann['image_id'] in row_of_id and ann['category_id'] in self.categories]
+        rows = np.array([row_of_id[ann['image_id']] for ann in annotations], dtype=np.int64)
+        order = np.argsort(rows, kind='stable')
+
+        bbox = np.array([ann['bbox'] for ann in annotations], dtype=np.float64).reshape(-1, 4)[order]
+        self.boxes = xywh_to_xyxy(bbox)
+        self.labels = np.array([ann['category_id'] for ann in annotations], dtype=np.int64)[order]
+        self.iscrowd = np.array([bool(ann.get('iscrowd', 0)) for ann in annotations], dtype=bool)[order]
+        self.ignore = np.array([bool(ann.get('ignore', 0)) for ann in annotations], dtype=bool)[order] | self.iscrowd
+        # pycocotools는 id가 0인 정답과의 매칭을 매칭 실패로 처리하므로 같은 결과를 내기 위해 따로 표시
+        self.zero_id = np.array([ann.get('id', -1) == 0 for ann in annotations], dtype=bool)[order]
+
+        self.offsets = np.zeros(len(images) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(images)), out=self.offsets[1:])
+
+    @classmethod
+    def from_json(cls, ann_file):
+        return cls(load_coco(ann_file))
+
+
+def _iou(dt_boxes, gt_boxes, iscrowd):
+    """pycocotools와 같은 방식의 IoU (crowd 정답은 검출 박스 면적으로 나눔)"""
+    dt_area = (dt_boxes[:, 2] - dt_boxes[:, 0]) * (dt_boxes[:, 3] - dt_boxes[:, 1])
+    gt_area = (gt_boxes[:, 2] - gt_boxes[:, 0]) * (gt_boxes[:, 3] - gt_boxes[:, 1])
+    wh = np.maximum(np.minimum(dt_boxes[:, None, 2:], gt_boxes[None, :, 2:]) -
+                    np.maximum(dt_boxes[:, None, :2], gt_boxes[None, :, :2]), 0)
+    inter = wh[..., 0] * wh[..., 1]
+    union = np.where(iscrowd[None, :], dt_area[:, None], dt_area[:, None] + gt_area[None, :] - inter)
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def _match_image(dt_boxes, dt_labels, gt_boxes, gt_labels, gt_ignore, gt_iscrowd, gt_zero_id, iou_thrs):
+    """
+    한 이미지의 검출 결과(점수 내림차순)를 정답과 greedy 매칭
+
+    :return: (matched, ignored, zero_id) 각각 (T, D) boolean 배열
+             matched는 정답과 매칭된 검출, ignored는 무시 대상 정답과 매칭된 검출,
+             zero_id는 id가 0인 정답과 매칭된 검출
+    """
+    num_thrs, num_dts = len(iou_thrs), len(dt_boxes)
+    matched = np.zeros((num_thrs, num_dts), dtype=bool)
+    ignored = np.zeros((num_thrs, num_dts), dtype=bool)
+    zero_id = np.zeros((num_thrs, num_dts), dtype=bool)
+    if num_dts == 0 or len(gt_boxes) == 0:
+        return matched, ignored, zero_id
+
+    # 클래스가 다른 정답과는 매칭되지 않도록 IoU를 -1로 설정
+    ious = _iou(dt_boxes, gt_boxes, gt_iscrowd)
+    ious[dt_labels[:, None] != gt_labels[None, :]] = -1
+
+    # pycocotools와 같이 무시하지 않는 정답을 먼저 검사하도록 정렬
+    gt_order = np.argsort(gt_ignore, kind='stable')
+    ious = ious[:, gt_order]
+    gt_ignore = gt_ignore[gt_order]
+    gt_iscrowd = gt_iscrowd[gt_order]
+    gt_zero_id = gt_zero_id[gt_order]
+    num_gts = len(gt_order)
+
+    # 어떤 임계값에서도 매칭될 수 없는 검출은 건너뜀
+    thresholds = np.minimum(iou_thrs, 1 - 1e-10)
+    candidates = np.flatnonzero(ious.max(axis=1) >= thresholds.min())
+
+    gt_taken = np.zeros((num_thrs, num_gts), dtype=bool)
+    for d in candidates:
+        # (T, G) 매칭 가능 여부: 임계값 이상이고, 아직 매칭되지 않았거나 crowd 정답
+        available = (ious[d][None, :] >= thresholds[:, None]) & (~gt_taken | gt_iscrowd[None, :])
+        for ignore_flag in (False, True):
+            mask = available & (gt_ignore[None, :] == ignore_flag)
+            has_match = mask.any(axis=1)
+            if not has_match.any():
+                continue
+
+            # IoU가 가장 큰 정답을 선택 (동점이면 뒤쪽 정답, pycocotools와 동일)
+            scores = np.where(mask, ious[d][None, :], -np.inf)
+            best = num_gts - 1 - np.argmax(scores[:, ::-1], axis=1)
+
+            rows = np.flatnonzero(has_match & ~matched[:, d])
+            matched[rows, d] = True
+            ignored[rows, d] = ignore_flag
+            zero_id[rows, d] = gt_zero_id[best[rows]]
+            gt_taken[rows, best[rows]] = True
+
+    return matched, ignored, zero_id
+
+
+def match_detections(store, gt, iou_thrs=IOU_THRESHOLDS, max_dets=100):
+    """
+    예측을 정답과 매칭하여 검출 단위의 TP/FP 배열을 계산
+
+    무시 대상 정답과 매칭된 검출은 TP, FP 어디에도 포함되지 않는다.
+
+    :param store: 예측 PredictionStore (image_id가 정답의 file_name과 같아야 함)
+    :param gt: GroundTruth 객체
+    :param iou_thrs: 평가할 IoU 임계값 배열
+    :param max_dets: 이미지/클래스별로 평가에 사용할 최대 검출 수
+    :return: (det_index, labels, scores, tp, fp)
+             det_index는 store 안에서의 예측 위치, tp와 fp는 (T, D) boolean 배열
+    """
+    category_ids = np.array(sorted(gt.categories), dtype=np.int64)
+
+    # 정답 이미지 순서에 맞춰 검출 결과를 정렬 (정답에 없는 이미지는 제외)
+    store_rows = np.array([gt.file_index.get(image_id, -1) for image_id in store.image_ids], dtype=np.int64)
+    det_rows = store_rows[store.image_rows()]
+    valid = (det_rows >= 0) & np.isin(store.labels, category_ids)
+    det_index = np.flatnonzero(valid)
+    det_rows = det_rows[valid]
+    det_scores = store.scores[valid].astype(np.float64)
+    det_labels = store.labels[valid].astype(np.int64)
+    det_boxes = store.boxes[valid].astype(np.float64)
+
+    # 이미지, 클래스별 점수 내림차순 (동점은 입력 순서 유지), 상위 max_dets개만 사용
+    order = np.lexsort((np.arange(len(det_rows)), -det_scores, det_labels, det_rows))
+    group_start = np.r_[True, (det_rows[order][1:] != det_rows[order][:-1]) |
+                        (det_labels[order][1:] != det_labels[order][:-1])] if len(order) else np.zeros(0, dtype=bool)
+    group_index = np.cumsum(group_start) - 1
+    rank = np.arange(len(order)) - np.flatnonzero(group_start)[group_index] if len(order) else np.zeros(0, dtype=np.int64)
+    order = order[rank < max_dets]
+    det_index, det_rows, det_scores, det_labels, det_boxes = \
+        det_index[order], det_rows[order], det_scores[order], det_labels[order], det_boxes[order]
+
+    # 이미지별로 매칭
+    matched = np.zeros((len(iou_thrs), len(det_rows)), dtype=bool)
+    ignored = np.zeros((len(iou_thrs), len(det_rows)), dtype=bool)
+    zero_id = np.zeros((len(iou_thrs), len(det_rows)), dtype=bool)
+    det_offsets = np.searchsorted(det_rows, np.arange(len(gt.image_ids) + 1))
+    for i in range(len(gt.image_ids)):
+        d_start, d_end = det_offsets[i], det_offsets[i + 1]
+        g_start, g_end = gt.offsets[i], gt.offsets[i + 1]
+        if d_start == d_end or g_start == g_end:
+            continue
+        matched[:, d_start:d_end], ignored[:, d_start:d_end], zero_id[:, d_start:d_end] = _match_image(
+            det_boxes[d_start:d_end], det_labels[d_start:d_end],
+            gt.boxes[g_start:g_end], gt.labels[g_start:g_end], gt.ignore[g_start:g_end], gt.iscrowd[g_start:g_end],
+            gt.zero_id[g_start:g_end], iou_thrs)
+
+    # 매칭되지 않은 검출 중 면적이 area=all 범위를 벗어나는 박스(좌표가 뒤집힌 박스 등)는 무시
+    det_area = (det_boxes[:, 2] - det_boxes[:, 0]) * (det_boxes[:, 3] - det_boxes[:, 1])
+    out_of_range = (det_area < 0) | (det_area > 1e10)
+
+    # id가 0인 (무시 대상이 아닌) 정답과의 매칭은 pycocotools와 같이 오검출로 계산
+    tp = matched & ~ignored & ~zero_id
+    fp = (~matched & ~out_of_range[None, :]) | (zero_id & ~ignored)
+    return det_index, det_labels, det_scores, tp, fp
+
+
+def average_precision(tp, fp, num_gt):
+    """
+    점수 내림차순으로 정렬된 TP/FP 배열로 101점 보간 AP 계산
+
+    :param tp: (T, N) boolean 배열
+    :param fp: (T, N) boolean 배열
+    :param num_gt: 무시 대상이 아닌 정답 수
+    :return: IoU 임계값별 AP 배열 (T,)
+    """
+    tp_sum = np.cumsum(tp, axis=1, dtype=np.float64)
+    fp_sum = np.cumsum(fp, axis=1, dtype=np.float64)
+    ap = np.zeros(len(tp))
+    for t in range(len(tp)):
+        recall = tp_sum[t] / num_gt
+        precision = tp_sum[t] / (fp_sum[t] + tp_sum[t] + np.spacing(1))
+
+        # precision을 오른쪽에서부터 단조 감소하도록 보간
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        indices = np.searchsorted(recall, RECALL_THRESHOLDS, side='left')
+        q = np.zeros(len(RECALL_THRESHOLDS))
+        valid_indices = indices < len(precision)
+        q[valid_indices] = precision[indices[valid_indices]]
+        ap[t] = q.mean()
+    return ap
+
+
+def evaluate_detections(store, gt, iou_thrs=IOU_THRESHOLDS, max_dets=100):
+    """
+    COCO 방식(pycocotools COCOeval, bbox, area=all)으로 클래스별 AP 계산
+
+    :param store: 예측 PredictionStore (image_id가 정답의 file_name과 같아야 함)
+    :param gt: GroundTruth 객체
+    :param iou_thrs: 평가할 IoU 임계값 배열
+    :param max_dets: 이미지/클래스별로 평가에 사용할 최대 검출 수
+    :return: 클래스 x IoU 임계값 AP 배열 (정답이 없는 클래스는 -1), 클래스 id 배열
+    """
+    category_ids = np.array(sorted(gt.categories), dtype=np.int64)
+    _, det_labels, det_scores, tp, fp = match_detections(store, gt, iou_thrs, max_dets)
+
+    # 클래스별로 모든 이미지의 검출을 점수 내림차순으로 모아 precision-recall 곡선 계산
+    ap = -np.ones((len(category_ids), len(iou_thrs)))
+    for k, category_id in enumerate(category_ids):
+        num_gt = int(np.sum((gt.labels == category_id) & ~gt.ignore))
+        if num_gt == 0:
+            continue
+
+        in_class = np.flatnonzero(det_labels == category_id)
+        class_order = in_class[np.argsort(-det_scores[in_class], kind='stable')]
+        ap[k] = average_precision(tp[:, class_order], fp[:, class_order], num_gt)
+
+    return ap, category_ids
+
+
+def summarize(ap, category_ids, gt, iou_thrs=IOU_THRESHOLDS):
+    """
+    클래스별 AP 배열을 결과표와 전체 mAP로 정리
+
+    :return: (per_class DataFrame, mAP50, mAP50:95)
+    """
+    t50 = int(np.argmin(np.abs(iou_thrs - 0.5)))
+    has_gt = ap[:, 0] > -1
+    per_class = pd.DataFrame({
+        'category_id': category_ids,
+        'name': [gt.categories[c] for c in category_ids.tolist()],
+        'num_gt': [int(np.sum((gt.labels == c) & ~gt.ignore)) for c in category_ids.tolist()],
+        'AP50': np.where(has_gt, ap[:, t50], np.nan),
+        'AP50:95': np.where(has_gt, ap.mean(axis=1), np.nan),
+    })
+    map50 = float(ap[has_gt, t50].mean()) if has_gt.any() else -1.0
+    map50_95 = float(ap[has_gt].mean()) if has_gt.any() else -1.0
+    return per_class, map50, map50_95
+
+
+def evaluate(pred_file, ann_file):
+    """
+    예측 파일(CSV 또는 바이너리 저장소)을 검증 fold 정답으로 평가
+
+    :param pred_file: 예측 파일 경로
+    :param ann_file: 정답 COCO JSON 경로 (예: json/splits/val_fold4.json)
+    :return: (per_class DataFrame, mAP50, mAP50:95)
+    """
+    gt = GroundTruth.from_json(ann_file)
+    ap, category_ids = evaluate_detections(load_predictions(pred_file), gt)
+    return summarize(ap, category_ids, gt)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate predictions with COCO-style mAP50 / mAP50:95')
+    parser.add_argument('pred_file', type=str, help='Prediction file (.csv or binary store)')
+    parser.add_argument('--ann_file', type=str, default='../dataset/json/splits/val_fold4.json',
+                        help='Ground truth COCO JSON of the validation fold')
+    args = parser.parse_args()
+
+    per_class, map50, map50_95 = evaluate(args.pred_file, args.ann_file)
+    print(per_class.to_string(index=False, float_format=lambda x: f'{x:.4f}'))
+    print(f"mAP50: {map50:.4f}  mAP50:95: {map50_95:.4f}")
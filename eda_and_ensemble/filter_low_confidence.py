@@ -1,55 +1,147 @@
-import pandas as pd
-import numpy as np
 import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+from prediction_store import PredictionStore, load_predictions
+
+def image_rank(store):
+    """각 예측의 이미지 내 점수 순위 (모든 클래스 기준, 0부터 시작, 동점은 입력 순서)"""
+    rows = store.image_rows()
+    order = np.lexsort((-store.scores, rows))
+    rank = np.empty(store.num_detections, dtype=np.int64)
+    rank[order] = np.arange(len(order)) - np.searchsorted(rows[order], rows[order], side='left')
+    return rank
+
+def confidence_mask(store, confidence_threshold, class_thresholds=None, top_k=None):
+    """
+    신뢰도 임계값과 이미지별 상위 K개 조건을 만족하는 예측의 마스크를 계산
+
+    상위 K개는 임계값을 적용하기 전의 이미지별 점수 순위로 정한다. 두 조건이 서로 독립이므로
+    optimize_thresholds.py가 top_k별로 클래스 임계값을 따로 탐색한 결과가 이 필터와 정확히 일치한다.
+
+    :param store: 필터링할 PredictionStore
+    :param confidence_threshold: 기본 신뢰도 임계값
+    :param class_thresholds: {클래스: 임계값} 딕셔너리 (지정한 클래스만 기본값 대신 사용)
+    :param top_k: 이미지별로 남길 최대 예측 수 (None이면 제한 없음)
+    :return: 길이가 num_detections인 boolean 배열
+    """
+    # 클래스별 임계값 조회 테이블 (라벨 값을 인덱스로 사용)
+    num_classes = max([int(store.labels.max()) + 1 if store.num_detections else 0] +
+                      [int(c) + 1 for c in (class_thresholds or {})])
+    # 점수와 같은 float32로 비교해야 CSV의 "0.0100" 같은 점수가 임계값 0.01과 같게 취급됨
+    thresholds = np.full(num_classes, confidence_threshold, dtype=np.float32)
+    for label, threshold in (class_thresholds or {}).items():
+        thresholds[int(label)] = threshold
+    mask = store.scores >= thresholds[store.labels]
+
+    if top_k is not None:
+        # 임계값 적용 전 이미지별 점수 순위가 top_k 미만인 예측만 유지
+        mask &= image_rank(store) < top_k
+    return mask
 
-def filter_low_confidence(input_csv, output_csv, confidence_threshold):
-    # CSV 파일 읽기
-    df = pd.read_csv(input_csv)
-    
-    # 결과를 저장할 리스트
-    filtered_predictions = []
-    
-    # 각 행을 순회하며 처리
-    for _, row in df.iterrows():
-        image_id = row['image_id']
-        predictions = row['PredictionString'].split()
-        
-        # 예측이 없는 경우 빈 문자열 추가
-        if len(predictions) == 0:
-            filtered_predictions.append({'PredictionString': '', 'image_id': image_id})
-            continue
-        
-        # 예측을 6개씩 그룹화 (클래스, 신뢰도, x1, y1, x2, y2)
-        predictions = np.array(predictions).reshape(-1, 6)
-        
-        # confidence threshold보다 크거나 같은 예측만 필터링
-        filtered = predictions[predictions[:, 1].astype(float) >= confidence_threshold]
-        
-        # 필터링된 예측을 문자열로 변환
-        filtered_string = ' '.join(filtered.reshape(-1))
-        
-        # 결과 추가 (PredictionString을 먼저 추가)
-        filtered_predictions.append({'PredictionString': filtered_string, 'image_id': image_id})
-    
-    # 결과를 DataFrame으로 변환
-    result_df = pd.DataFrame(filtered_predictions)
-    
-    # 열 순서를 원본과 동일하게 설정
-    result_df = result_df[['PredictionString', 'image_id']]
-    
-    # 결과를 CSV 파일로 저장
-    result_df.to_csv(output_csv, index=False)
+def iter_prediction_chunks(input_file, chunksize=1000):
+    """
+    예측 파일을 이미지 chunksize개 단위의 PredictionStore로 나누어 읽기
+
+    CSV는 pandas의 chunk 단위로 파싱하고, 바이너리 저장소는 memory-map으로 열어 구간별로 잘라낸다.
+    """
+    if input_file.endswith('.csv'):
+        for chunk in pd.read_csv(input_file, chunksize=chunksize):
+            yield PredictionStore.from_dataframe(chunk)
+    else:
+        store = load_predictions(input_file, mmap=True)
+        for start in range(0, len(store), chunksize):
+            yield store.image_range(start, min(start + chunksize, len(store)))
+
+def filter_low_confidence(input_csv, output_csv, confidence_threshold, class_thresholds=None, top_k=None,
+                          chunksize=1000, precision=None):
+    """
+    낮은 신뢰도의 예측을 제거하고 결과를 저장 (이미지 목록과 순서는 유지)
+
+    입력을 chunk 단위로 읽어 필터링하므로 전체 예측을 메모리에 올리지 않는다.
+    CSV 출력은 chunk마다 이어서 기록하고, 바이너리 출력은 필터링된 결과만 모아 한 번에 저장한다.
+
+    :param input_csv: 입력 예측 파일 (CSV 또는 바이너리 저장소)
+    :param output_csv: 출력 경로 (.csv가 아니면 바이너리 저장소로 저장)
+    :param confidence_threshold: 기본 신뢰도 임계값
+    :param class_thresholds: {클래스: 임계값} 딕셔너리
+    :param top_k: 이미지별로 남길 최대 예측 수
+    :param chunksize: 한 번에 처리할 이미지 수
+    :param precision: CSV 출력의 소수점 자릿수 (None이면 손실 없는 최단 표현)
+    """
+    is_csv = output_csv.endswith('.csv')
+    num_kept = num_total = num_chunks = 0
+    filtered_chunks = []
+    for i, chunk in enumerate(iter_prediction_chunks(input_csv, chunksize)):
+        filtered = chunk.filter(confidence_mask(chunk, confidence_threshold, class_thresholds, top_k))
+        num_total += chunk.num_detections
+        num_kept += filtered.num_detections
+        num_chunks += 1
+
+        if is_csv:
+            # 첫 chunk에서 헤더와 함께 새로 쓰고 이후 chunk는 이어서 기록
+            filtered.to_csv(output_csv, precision, mode='w' if i == 0 else 'a', header=(i == 0))
+        else:
+            filtered_chunks.append(filtered)
+
+    if not is_csv:
+        PredictionStore.concat(filtered_chunks).save(output_csv)
+    elif num_chunks == 0:
+        # 입력에 이미지가 없으면 헤더만 기록
+        PredictionStore.concat([]).to_csv(output_csv)
+    print(f"Kept {num_kept} / {num_total} predictions")
     print(f"Filtered predictions saved to {output_csv}")
 
+def parse_class_thresholds(values):
+    """'클래스=임계값' 형식의 문자열 리스트를 딕셔너리로 변환 (예: ['8=0.1', '9=0.05'])"""
+    class_thresholds = {}
+    for value in values or []:
+        label, threshold = value.split('=')
+        class_thresholds[int(label)] = float(threshold)
+    return class_thresholds
+
 if __name__ == "__main__":
     # 입력 및 출력 CSV 파일 경로 지정
-    confidence_threshold = 0.01
     csv_name = 'NMS Ensemble (codino 12, 36, milestone 59, 1380)'
-    input_csv = f'./csv/{csv_name}.csv'
-    output_csv = f'./csv/{csv_name}_{confidence_threshold}filtered.csv'
-    
+
+    parser = argparse.ArgumentParser(description='Filter low-confidence predictions')
+    parser.add_argument('--input', type=str, default=f'./csv/{csv_name}.csv',
+                        help='Input prediction file (.csv or binary store)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Output path (default: ./csv/{name}_{threshold}filtered.csv)')
+    # 기본 신뢰도 임계값과 클래스별 임계값
+    parser.add_argument('--threshold', type=float, default=0.01,
+                        help='Confidence threshold (default: 0.01)')
+    parser.add_argument('--class_thresholds', nargs='+', type=str, default=None,
+                        help='Per-class thresholds as class=threshold (e.g. 8=0.1 9=0.05)')
+    # 이미지별 최대 예측 수
+    parser.add_argument('--top_k', type=int, default=None,
+                        help='Keep only predictions ranked in the top K of their image (ranked before thresholding)')
+    # optimize_thresholds.py로 찾은 설정 파일 (threshold, class_thresholds, top_k를 대신 사용)
+    parser.add_argument('--thresholds_file', type=str, default=None,
+                        help='JSON written by optimize_thresholds.py')
+    parser.add_argument('--chunksize', type=int, default=1000,
+                        help='Number of images processed per chunk (default: 1000)')
+    parser.add_argument('--precision', type=int, default=None,
+                        help='Decimal places in the output CSV (default: shortest lossless float32 representation)')
+    args = parser.parse_args()
+
+    threshold, class_thresholds, top_k = args.threshold, parse_class_thresholds(args.class_thresholds), args.top_k
+    if args.thresholds_file is not None:
+        with open(args.thresholds_file, 'r') as f:
+            config = json.load(f)
+        threshold = config.get('threshold', threshold)
+        class_thresholds = {int(c): t for c, t in config.get('class_thresholds', {}).items()}
+        top_k = config.get('top_k', top_k)
+
+    output_csv = args.output
+    if output_csv is None:
+        name = os.path.splitext(os.path.basename(args.input))[0]
+        output_csv = f'./csv/{name}_{threshold}filtered.csv'
 
     # 출력 디렉토리가 없으면 생성
-    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
+    os.makedirs(os.path.dirname(output_csv) or '.', exist_ok=True)
 
-    filter_low_confidence(input_csv, output_csv, confidence_threshold)
\ No newline at end of file
+    filter_low_confidence(args.input, output_csv, threshold, class_thresholds, top_k, args.chunksize, args.precision)
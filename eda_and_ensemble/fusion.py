@@ -0,0 +1,341 @@
+"""
+ensemble_boxes의 nms, soft_nms, non_maximum_weighted, weighted_boxes_fusion을 NumPy 배열 연산으로 재구현한 모듈
+
+함수 시그니처와 반환 형식(boxes, scores, labels)은 ensemble_boxes와 동일하게 유지하여
+ensemble.py에서 그대로 교체해 사용할 수 있다. 입력 박스는 [0, 1]로 정규화된 xyxy 좌표를 가정한다.
+결과가 ensemble_boxes와 같은지는 tests/test_fusion.py에서 확인한다.
+
+점수가 같은 박스의 처리 순서:
+- soft_nms, non_maximum_weighted, weighted_boxes_fusion은 ensemble_boxes와 같은 배열에 같은 NumPy 정렬을 사용하므로
+  동점도 같은 순서로 처리한다.
+- nms는 ensemble_boxes가 numba 안에서 정렬하여 동점 순서가 NumPy와 다르므로, 입력 순서(모델 순서, 모델 안에서는
+  박스 순서)가 앞선 박스를 먼저 처리한다. 동점 박스가 서로 겹치면 남는 박스가 ensemble_boxes와 다를 수 있다.
+"""
+
+import numpy as np
+
+
+def box_iou(boxes_a, boxes_b):
+    """
+    두 박스 집합 사이의 IoU 행렬을 한 번에 계산
+
+    :param boxes_a: (N, 4) xyxy 박스 배열
+    :param boxes_b: (M, 4) xyxy 박스 배열
+    :return: (N, M) IoU 행렬
+    """
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+
+    left_top = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    right_bottom = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    wh = np.maximum(right_bottom - left_top, 0)
+    inter = wh[..., 0] * wh[..., 1]
+
+    return inter / (area_a[:, None] + area_b[None, :] - inter)
+
+
+def _check_weights(weights, num_models):
+    if weights is None:
+        return np.ones(num_models)
+    if len(weights) != num_models:
+        print('Warning: incorrect number of weights {}. Must be: {}. Set weights equal to 1.'.format(len(weights), num_models))
+        return np.ones(num_models)
+    return np.array(weights, dtype=np.float64)
+
+
+def _concat_models(boxes_list, scores_list, labels_list):
+    """모델별 예측 리스트를 하나의 배열로 합치고 각 예측의 모델 번호를 함께 반환"""
+    boxes = [np.asarray(b, dtype=np.float64).reshape(-1, 4) for b in boxes_list]
+    scores = [np.asarray(s, dtype=np.float64).reshape(-1) for s in scores_list]
+    labels = [np.asarray(l).reshape(-1) for l in labels_list]
+
+    for t, (b, s, l) in enumerate(zip(boxes, scores, labels)):
+        if not (len(b) == len(s) == len(l)):
+            raise ValueError('Length of boxes, scores and labels of model {} are not equal: {}, {}, {}'.format(t, len(b), len(s), len(l)))
+
+    models = np.repeat(np.arange(len(boxes)), [len(b) for b in boxes])
+    if len(models) == 0:
+        return np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=np.int64), models
+    return np.concatenate(boxes), np.concatenate(scores), np.concatenate(labels).astype(np.int64), models
+
+
+def _fix_boxes(boxes):
+    """좌표 순서를 바로잡고 [0, 1] 범위로 자른 뒤, 면적이 0이 아닌 박스의 마스크를 반환"""
+    boxes = np.clip(boxes, 0, 1)
+    boxes = np.concatenate([np.minimum(boxes[:, :2], boxes[:, 2:]), np.maximum(boxes[:, :2], boxes[:, 2:])], axis=1)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return boxes, area > 0
+
+
+def _prefilter(boxes_list, scores_list, labels_list, weights, skip_box_thr):
+    """
+    ensemble_boxes의 prefilter_boxes와 같은 규칙으로 박스를 거르고 클래스별로 정렬
+
+    :return: 클래스가 처음 등장한 순서대로 (label, boxes, scores, box_weights, models) 튜플 리스트
+             scores는 모델 가중치를 곱한 값이며 클래스 내에서 내림차순 정렬됨
+    """
+    boxes, scores, labels, models = _concat_models(boxes_list, scores_list, labels_list)
+
+    keep = scores >= skip_box_thr
+    boxes, valid = _fix_boxes(boxes[keep])
+    scores, labels, models = scores[keep][valid], labels[keep][valid], models[keep][valid]
+    boxes = boxes[valid]
+
+    box_weights = weights[models]
+    scores = scores * box_weights
+
+    groups = []
+    unique_labels, first_index = np.unique(labels, return_index=True)
+    for label in unique_labels[np.argsort(first_index)]:
+        mask = labels == label
+        order = scores[mask].argsort()[::-1]
+        groups.append((label, boxes[mask][order], scores[mask][order], box_weights[mask][order], models[mask][order]))
+    return groups
+
+
+def _greedy_keep(iou, iou_thr):
+    """
+    점수 내림차순으로 정렬된 박스의 IoU 행렬에서 greedy NMS로 남는 박스 인덱스를 계산
+
+    :param iou: (N, N) IoU 행렬 (행/열 모두 점수 내림차순)
+    :param iou_thr: 이 값보다 IoU가 큰 박스를 제거
+    :return: 남는 박스 인덱스 배열
+    """
+    suppressed = np.zeros(len(iou), dtype=bool)
+    keep = []
+    for i in range(len(iou)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_thr
+    return np.array(keep, dtype=np.int64)
+
+
+def _soft_nms_keep(iou, scores, iou_thr, sigma, thresh, method):
+    """
+    ensemble_boxes의 cpu_soft_nms_float와 같은 순서로 점수를 감쇠시키고 남는 박스 인덱스를 반환
+
+    :param iou: (N, N) IoU 행렬 (입력 순서 기준)
+    :param scores: 입력 순서의 점수
+    :param method: 1 - linear, 2 - gaussian, 3 - 일반 NMS
+    :return: 선택된 순서대로 정렬된 남는 박스 인덱스
+    """
+    n = len(scores)
+    position = np.arange(n)
+    scores = scores.copy()
+
+    for i in range(n):
+        # 남은 박스 중 점수가 가장 높은 박스를 i 위치로 이동
+        if i != n - 1:
+            max_pos = i + 1 + np.argmax(scores[i + 1:])
+            if scores[i] < scores[max_pos]:
+                position[[i, max_pos]] = position[[max_pos, i]]
+                scores[[i, max_pos]] = scores[[max_pos, i]]
+
+        ovr = iou[position[i], position[i + 1:]]
+        if method == 1:
+            weight = np.where(ovr > iou_thr, 1 - ovr, 1)
+        elif method == 2:
+            weight = np.exp(-(ovr * ovr) / sigma)
+        else:
+            weight = np.where(ovr > iou_thr, 0, 1)
+        scores[i + 1:] *= weight
+
+    return position[scores > thresh]
+
+
+def nms_method(boxes, scores, labels, method=3, iou_thr=0.5, sigma=0.5, thresh=0.001, weights=None):
+    """
+    클래스별 NMS / Soft-NMS (ensemble_boxes.nms_method와 동일한 인터페이스)
+
+    :param boxes: 모델별 (N, 4) 박스 리스트
+    :param scores: 모델별 점수 리스트
+    :param labels: 모델별 클래스 리스트
+    :param method: 1 - linear soft-NMS, 2 - gaussian soft-NMS, 3 - 일반 NMS
+    :param iou_thr: 같은 객체로 판단할 IoU 임계값
+    :param sigma: gaussian soft-NMS의 sigma
+    :param thresh: soft-NMS 이후 남길 최소 점수
+    :param weights: 모델별 가중치
+    :return: (boxes, scores, labels)
+    """
+    scores = [np.asarray(s, dtype=np.float64) for s in scores]
+    if weights is not None:
+        if len(boxes) != len(weights):
+            print('Incorrect number of weights: {}. Must be: {}. Skip it'.format(len(weights), len(boxes)))
+        else:
+            weights = np.array(weights, dtype=np.float64)
+            scores = [s * w / weights.sum() for s, w in zip(scores, weights)]
+
+    boxes, scores, labels, _ = _concat_models(boxes, scores, labels)
+    boxes, valid = _fix_boxes(boxes)
+    boxes, scores, labels = boxes[valid], scores[valid], labels[valid]
+
+    final_boxes = [np.zeros((0, 4))]
+    final_scores = [np.zeros(0)]
+    final_labels = [np.zeros(0)]
+    for label in np.unique(labels):
+        mask = labels == label
+        boxes_by_label = boxes[mask]
+        scores_by_label = scores[mask]
+
+        if method != 3:
+            iou = box_iou(boxes_by_label, boxes_by_label)
+            keep = _soft_nms_keep(iou, scores_by_label, iou_thr, sigma, thresh, method)
+        else:
+            # 동점은 입력 순서대로 처리 (ensemble_boxes의 numba 정렬과는 동점 순서가 다를 수 있음)
+            order = np.argsort(-scores_by_label, kind='stable')
+            iou = box_iou(boxes_by_label[order], boxes_by_label[order])
+            keep = order[_greedy_keep(iou, iou_thr)]
+
+        final_boxes.append(boxes_by_label[keep])
+        final_scores.append(scores_by_label[keep])
+        final_labels.append(np.full(len(keep), label, dtype=np.float64))
+
+    return np.concatenate(final_boxes), np.concatenate(final_scores), np.concatenate(final_labels)
+
+
+def nms(boxes, scores, labels, iou_thr=0.5, weights=None):
+    """일반 NMS"""
+    return nms_method(boxes, scores, labels, method=3, iou_thr=iou_thr, weights=weights)
+
+
+def soft_nms(boxes, scores, labels, method=2, iou_thr=0.5, sigma=0.5, thresh=0.001, weights=None):
+    """Soft-NMS (method 1: linear, 2: gaussian)"""
+    return nms_method(boxes, scores, labels, method=method, iou_thr=iou_thr, sigma=sigma, thresh=thresh, weights=weights)
+
+
+def _sort_overall(boxes, scores, labels):
+    if len(scores) == 0:
+        return np.zeros((0, 4)), np.zeros((0,)), np.zeros((0,))
+    boxes, scores, labels = np.concatenate(boxes), np.concatenate(scores), np.concatenate(labels)
+    order = scores.argsort()[::-1]
+    return boxes[order], scores[order], labels[order]
+
+
+def non_maximum_weighted(boxes_list, scores_list, labels_list, weights=None, iou_thr=0.55, skip_box_thr=0.0):
+    """
+    Non-Maximum Weighted (ensemble_boxes.non_maximum_weighted와 동일한 인터페이스)
+
+    클러스터 대표 박스는 greedy NMS에서 남는 박스와 같으므로, 클래스별 IoU 행렬을 한 번 계산한 뒤
+    대표 박스를 구하고 나머지 박스를 자신보다 앞선 대표 박스 중 IoU가 가장 큰 곳에 배정한다.
+
+    :return: (boxes, scores, labels) 점수 내림차순
+    """
+    weights = _check_weights(weights, len(boxes_list))
+    weights = weights / weights.max()
+
+    overall_boxes, overall_scores, overall_labels = [], [], []
+    for label, boxes, scores, _, _ in _prefilter(boxes_list, scores_list, labels_list, weights, skip_box_thr):
+        iou = box_iou(boxes, boxes)
+        mains = _greedy_keep(iou, iou_thr)
+
+        # 각 박스를 자신보다 앞선 대표 박스 중 IoU가 가장 큰 클러스터에 배정
+        main_iou = iou[:, mains]
+        main_iou[np.arange(len(boxes))[:, None] < mains[None, :]] = -1
+        cluster = np.argmax(main_iou, axis=1)
+        cluster[mains] = np.arange(len(mains))
+
+        # 대표 박스와의 IoU * 점수를 가중치로 좌표를 가중 평균
+        box_weight = scores * iou[np.arange(len(boxes)), mains[cluster]]
+        coord_sum = np.zeros((len(mains), 4))
+        np.add.at(coord_sum, cluster, box_weight[:, None] * boxes)
+        weight_sum = np.bincount(cluster, weights=box_weight, minlength=len(mains))
+
+        overall_boxes.append((coord_sum / weight_sum[:, None]).astype(np.float32).astype(np.float64))
+        overall_scores.append(scores[mains].astype(np.float32).astype(np.float64))
+        overall_labels.append(np.full(len(mains), label, dtype=np.float64))
+
+    return _sort_overall(overall_boxes, overall_scores, overall_labels)
+
+
+def weighted_boxes_fusion(boxes_list, scores_list, labels_list, weights=None, iou_thr=0.55, skip_box_thr=0.0,
+                          conf_type='avg', allows_overflow=False):
+    """
+    Weighted Boxes Fusion (ensemble_boxes.weighted_boxes_fusion과 동일한 인터페이스)
+
+    클러스터 박스는 새 박스가 추가될 때마다 바뀌므로 박스를 점수 순으로 한 번 순회하되,
+    각 클러스터의 좌표/점수 합을 누적 배열로 유지하여 현재 클러스터 전체와의 IoU를 한 번에 계산한다.
+
+    :param conf_type: 'avg', 'max', 'box_and_model_avg', 'absent_model_aware_avg'
+    :param allows_overflow: True이면 점수가 1을 넘을 수 있음
+    :return: (boxes, scores, labels) 점수 내림차순
+    """
+    weights = _check_weights(weights, len(boxes_list))
+    if conf_type not in ['avg', 'max', 'box_and_model_avg', 'absent_model_aware_avg']:
+        raise ValueError('Unknown conf_type: {}. Must be "avg", "max", "box_and_model_avg" or "absent_model_aware_avg"'.format(conf_type))
+
+    overall_boxes, overall_scores, overall_labels = [], [], []
+    for label, boxes, scores, box_weights, models in _prefilter(boxes_list, scores_list, labels_list, weights, skip_box_thr):
+        n = len(boxes)
+        fused = np.empty((n, 4))
+        fused_area = np.empty(n)
+        coord_sum = np.empty((n, 4), dtype=np.float32)
+        conf_sum = np.empty(n)
+        conf_max = np.empty(n)
+        cluster = np.empty(n, dtype=np.int64)
+        num_clusters = 0
+
+        for j in range(n):
+            box = boxes[j]
+            best = -1
+            if num_clusters:
+                # 현재 모든 클러스터 박스와의 IoU를 한 번에 계산
+                current = fused[:num_clusters]
+                wh = np.maximum(np.minimum(current[:, 2:], box[2:]) - np.maximum(current[:, :2], box[:2]), 0)
+                inter = wh[:, 0] * wh[:, 1]
+                area = (box[2] - box[0]) * (box[3] - box[1])
+                ious = inter / (fused_area[:num_clusters] + area - inter)
+                best = int(np.argmax(ious))
+                if ious[best] <= iou_thr:
+                    best = -1
+
+            if best == -1:
+                best = num_clusters
+                num_clusters += 1
+                fused[best] = box
+                coord_sum[best] = scores[j] * box
+                conf_sum[best] = scores[j]
+                conf_max[best] = scores[j]
+            else:
+                # ensemble_boxes와 같이 float32로 누적한 좌표를 점수 합으로 나눠 클러스터 박스를 갱신
+                coord_sum[best] += scores[j] * box
+                conf_sum[best] += scores[j]
+                conf_max[best] = max(conf_max[best], scores[j])
+                fused[best] = (coord_sum[best] / conf_sum[best]).astype(np.float32)
+            fused_area[best] = (fused[best, 2] - fused[best, 0]) * (fused[best, 3] - fused[best, 1])
+            cluster[j] = best
+
+        count = np.bincount(cluster, minlength=num_clusters)
+        weight_sum = np.bincount(cluster, weights=box_weights, minlength=num_clusters)
+        if conf_type == 'max':
+            conf = conf_max[:num_clusters]
+        else:
+            conf = conf_sum[:num_clusters] / count
+
+        # 박스가 여러 개인 클러스터는 ensemble_boxes와 같이 float32로 저장됨
+        merged = count > 1
+        conf = np.where(merged, conf.astype(np.float32), conf)
+        weight_sum = np.where(merged, weight_sum.astype(np.float32), weight_sum)
+
+        # 모델 수와 클러스터 크기에 따라 점수 보정
+        if conf_type == 'box_and_model_avg':
+            conf = conf * count / weight_sum
+            pairs = np.unique(cluster * len(weights) + models)
+            model_weight_sum = np.bincount(pairs // len(weights), weights=weights[pairs % len(weights)], minlength=num_clusters)
+            conf = conf * model_weight_sum / weights.sum()
+        elif conf_type == 'absent_model_aware_avg':
+            pairs = np.unique(cluster * len(weights) + models)
+            present_weight_sum = np.bincount(pairs // len(weights), weights=weights[pairs % len(weights)], minlength=num_clusters)
+            conf = conf * count / (weight_sum + weights.sum() - present_weight_sum)
+        elif conf_type == 'max':
+            conf = conf / weights.max()
+        elif not allows_overflow:
+            conf = conf * np.minimum(len(weights), count) / weights.sum()
+        else:
+            conf = conf * count / weights.sum()
+
+        overall_boxes.append(fused[:num_clusters])
+        overall_scores.append(conf)
+        overall_labels.append(np.full(num_clusters, label, dtype=np.float64))
+
+    return _sort_overall(overall_boxes, overall_scores, overall_labels)
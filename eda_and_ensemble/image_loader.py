@@ -0,0 +1,106 @@
+import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# prefetch에서 입력이 끝났음을 나타내는 값
+_END = object()
+
+
+def load_image(path):
+    """
+    이미지를 BGR NumPy 배열로 읽기 (Ultralytics, MMDetection이 파일 경로를 받았을 때와 같은 형식)
+
+    :param path: 이미지 파일 경로
+    :return: (H, W, 3) uint8 배열
+    """
+    import cv2
+
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise FileNotFoundError(f"Could not read image: {path}")
+    return image
+
+def prefetch(items, load_fn=load_image, workers=4, max_prefetch=16):
+    """
+    스레드 풀에서 다음 항목들을 미리 읽으면서 입력 순서대로 결과를 생성
+
+    OpenCV의 디코딩/리사이즈는 GIL을 해제하므로 모델이 현재 이미지를 추론하는 동안 다음 이미지를 준비할 수 있다.
+    동시에 준비하는 항목은 max_prefetch개로 제한되어 메모리 사용량이 이미지 수와 무관하게 일정하다.
+
+    :param items: 읽을 항목(예: 이미지 경로)의 iterable
+    :param load_fn: 항목 하나를 읽는 함수 (기본값: load_image)
+    :param workers: 읽기 스레드 수 (0이면 현재 스레드에서 순서대로 읽음)
+    :param max_prefetch: 미리 준비해 둘 최대 항목 수
+    :return: (항목, load_fn 결과) 튜플을 생성하는 generator (load_fn의 예외는 해당 항목 차례에 발생)
+    """
+    if workers <= 0:
+        for item in items:
+            yield item, load_fn(item)
+        return
+
+    items = iter(items)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+
+    def submit_next():
+        item = next(items, _END)
+        if item is not _END:
+            pending.append((item, executor.submit(load_fn, item)))
+
+    try:
+        for _ in range(max(1, max_prefetch)):
+            submit_next()
+        while pending:
+            item, future = pending.popleft()
+            result = future.result()
+            # 하나를 꺼낼 때마다 다음 항목 하나를 예약하여 준비 중인 항목 수를 유지
+            submit_next()
+            yield item, result
+    finally:
+        # 중간에 멈추면 아직 시작하지 않은 작업은 취소
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def prefetch_batches(items, load_fn=load_image, batch_size=8, workers=4, max_prefetch=None):
+    """
+    prefetch 결과를 batch_size개씩 묶어 생성
+
+    :param max_prefetch: 미리 준비해 둘 최대 항목 수 (기본값: 2 x batch_size, 다음 배치 전체를 미리 준비)
+    :return: (항목 리스트, 결과 리스트) 튜플을 생성하는 generator
+    """
+    if max_prefetch is None:
+        max_prefetch = 2 * batch_size
+    batch_items, batch_results = [], []
+    for item, result in prefetch(items, load_fn, workers, max_prefetch):
+        batch_items.append(item)
+        batch_results.append(result)
+        if len(batch_items) == batch_size:
+            yield batch_items, batch_results
+            batch_items, batch_results = [], []
+    if batch_items:
+        yield batch_items, batch_results
+
+def benchmark(image_folder, workers=4, step_time=0.0):
+    """
+    이미지 디코딩 시간을 동기 방식과 prefetch 방식으로 비교
+
+    :param step_time: 이미지마다 모델 추론을 흉내 내는 대기 시간(초)
+    """
+    paths = [os.path.join(image_folder, f) for f in sorted(os.listdir(image_folder)) if f.endswith(('.jpg', '.png'))]
+    for name, num_workers in (('sync', 0), ('prefetch', workers)):
+        start = time.perf_counter()
+        for _ in prefetch(paths, load_image, num_workers):
+            time.sleep(step_time)
+        elapsed = time.perf_counter() - start
+        print(f"{name:8s}: {elapsed:.2f}s for {len(paths)} images ({elapsed / max(1, len(paths)) * 1000:.1f} ms/image)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare synchronous and prefetched image decoding')
+    parser.add_argument('--image_folder', type=str, default='../dataset/test', help='Image folder')
+    parser.add_argument('--workers', type=int, default=4, help='Decode threads (default: 4)')
+    parser.add_argument('--step_time', type=float, default=0.0,
+                        help='Simulated model time per image in seconds (default: 0.0)')
+    args = parser.parse_args()
+
+    benchmark(args.image_folder, args.workers, args.step_time)
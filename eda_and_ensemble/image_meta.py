@@ -0,0 +1,110 @@
+import os
+import numpy as np
+
+from coco_io import load_coco
+
+
+class ImageMeta:
+    """
+    COCO JSON의 이미지 정보(id, file_name, width, height)만 배열로 보관하는 조회용 캐시
+
+    file_name(예: test/0000.jpg) 또는 이미지 id로 행 번호를 찾는다. 디렉토리 없는 파일명(0000.jpg)은
+    JSON 안에서 그 파일명이 하나뿐일 때만 찾는다.
+    """
+    __slots__ = ('ids', 'file_names', 'widths', 'heights', '_file_index', '_name_index', '_id_index')
+
+    def __init__(self, ids, file_names, widths, heights):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.file_names = [str(name) for name in file_names]
+        self.widths = np.asarray(widths, dtype=np.int32)
+        self.heights = np.asarray(heights, dtype=np.int32)
+        self._file_index = {name: i for i, name in enumerate(self.file_names)}
+        # 디렉토리 없는 파일명 -> 행 번호 (여러 이미지가 같은 파일명을 쓰면 None으로 표시)
+        self._name_index = {}
+        for i, name in enumerate(self.file_names):
+            base = os.path.basename(name)
+            self._name_index[base] = None if base in self._name_index else i
+        self._id_index = {image_id: i for i, image_id in enumerate(self.ids.tolist())}
+
+    def __len__(self):
+        return len(self.file_names)
+
+    @classmethod
+    def from_coco(cls, coco_data):
+        images = coco_data['images']
+        return cls([img['id'] for img in images], [img['file_name'] for img in images],
+                   [img['width'] for img in images], [img['height'] for img in images])
+
+    def row(self, file_name):
+        """
+        file_name 또는 파일명으로 행 번호를 조회
+
+        디렉토리가 붙은 경로는 file_name과 정확히 일치해야 한다 (train/0000.jpg로 test/0000.jpg를 찾지 않음).
+
+        :param file_name: 이미지 경로 (예: test/0000.jpg 또는 0000.jpg)
+        :return: 행 번호, 없거나 파일명이 여러 이미지와 겹치면 KeyError
+        """
+        row = self._file_index.get(file_name)
+        if row is not None:
+            return row
+        if os.path.dirname(file_name) == '' and file_name in self._name_index:
+            row = self._name_index[file_name]
+            if row is None:
+                raise KeyError(f"Image name '{file_name}' matches several images in image metadata")
+            return row
+        raise KeyError(f"Image '{file_name}' not found in image metadata")
+
+    def row_of_id(self, image_id):
+        """이미지 id로 행 번호를 조회"""
+        return self._id_index[image_id]
+
+    def size(self, file_name):
+        """이미지의 (width, height)"""
+        row = self.row(file_name)
+        return int(self.widths[row]), int(self.heights[row])
+
+    def sizes(self, file_names):
+        """
+        여러 이미지의 (width, height)를 한 번에 조회
+
+        :param file_names: 이미지 경로 리스트 (예측 파일의 image_id)
+        :return: (width, height) 튜플 리스트
+        """
+        rows = np.array([self.row(name) for name in file_names], dtype=np.int64)
+        return list(zip(self.widths[rows].tolist(), self.heights[rows].tolist()))
+
+    def save(self, cache_file, source_stat=None):
+        np.savez(cache_file, ids=self.ids, file_names=np.array(self.file_names), widths=self.widths,
+                 heights=self.heights, source_stat=np.asarray(source_stat if source_stat is not None else [], dtype=np.int64))
+
+
+def _source_stat(ann_file):
+    # JSON이 바뀌었는지 확인하기 위한 (수정 시각, 파일 크기)
+    stat = os.stat(ann_file)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def load_image_meta(ann_file, cache_file=None):
+    """
+    COCO JSON의 이미지 정보를 캐시에서 읽고, 캐시가 없거나 JSON이 바뀌었으면 새로 생성
+
+    :param ann_file: COCO JSON 경로 (예: ../dataset/json/test.json)
+    :param cache_file: 캐시 경로 (기본값: JSON과 같은 위치의 <이름>.meta.npz)
+    :return: ImageMeta
+    """
+    if cache_file is None:
+        cache_file = os.path.splitext(ann_file)[0] + '.meta.npz'
+    source_stat = _source_stat(ann_file)
+
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as data:
+            if data['source_stat'].tolist() == source_stat:
+                return ImageMeta(data['ids'], data['file_names'].tolist(), data['widths'], data['heights'])
+
+    meta = ImageMeta.from_coco(load_coco(ann_file))
+    try:
+        meta.save(cache_file, source_stat)
+    except OSError:
+        # 읽기 전용 위치라면 캐시 없이 사용
+        pass
+    return meta
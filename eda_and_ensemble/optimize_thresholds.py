@@ -0,0 +1,177 @@
+import os
+import json
+import argparse
+import numpy as np
+
+from evaluate import RECALL_THRESHOLDS, GroundTruth, match_detections, evaluate_detections, summarize
+from filter_low_confidence import confidence_mask, image_rank
+from prediction_store import load_predictions
+
+def prefix_average_precision(tp, fp, num_gt):
+    """
+    점수 내림차순 TP/FP 배열에서 앞쪽 n개(n = 0..N)만 남겼을 때의 AP를 한 번에 계산
+
+    FP를 추가해도 보간 precision은 변하지 않으므로 AP는 k번째 TP까지 남겼을 때의 값(ap_by_tp[k])으로 정해지고,
+    앞쪽 n개의 AP는 ap_by_tp[tp 누적합[n - 1]]로 조회된다.
+
+    :param tp: (N,) boolean 배열
+    :param fp: (N,) boolean 배열
+    :param num_gt: 무시 대상이 아닌 정답 수
+    :return: 길이 N + 1의 AP 배열
+    """
+    tp_sum = np.cumsum(tp, dtype=np.int64)
+    fp_sum = np.cumsum(fp, dtype=np.int64)
+    tp_positions = np.flatnonzero(tp)
+    num_tp = len(tp_positions)
+
+    # TP 위치에서의 precision과 recall (recall 구간의 시작은 항상 TP 위치)
+    precision = tp_sum[tp_positions] / (tp_sum[tp_positions] + fp_sum[tp_positions] + np.spacing(1))
+    recall = np.arange(1, num_tp + 1) / num_gt
+
+    # curve[j, k]: 앞쪽 k개의 TP만 남겼을 때 j번째 recall 구간의 보간 precision
+    curve = np.zeros((len(RECALL_THRESHOLDS), num_tp + 1))
+    starts = np.searchsorted(recall, RECALL_THRESHOLDS, side='left')
+    for j, start in enumerate(starts.tolist()):
+        if start < num_tp:
+            curve[j, start + 1:] = np.maximum.accumulate(precision[start:])
+    ap_by_tp = curve.mean(axis=0)
+
+    return np.concatenate([[0.0], ap_by_tp[tp_sum]])
+
+def select_class_thresholds(store, gt, matches, top_k=None, objective='map', tolerance=0.0):
+    """
+    이미지별 최대 예측 수(top_k)가 주어졌을 때 클래스별 임계값을 선택
+
+    클래스마다 점수 내림차순 TP/FP 배열을 한 번만 만들고, 후보 임계값(해당 클래스의 점수 값)마다
+    prefix AP와 남는 예측 수를 조회하여 선택한다.
+
+    :param matches: match_detections(store, gt, [0.5]) 결과
+    :param objective: 'map'이면 AP50이 최대인 임계값 중 가장 높은 값,
+                      'size'이면 AP50 감소가 tolerance 이하인 임계값 중 가장 높은 값
+    :return: {클래스: (임계값, AP50, 남는 예측 수)} 딕셔너리
+    """
+    det_index, det_labels, det_scores, tp, fp = matches
+    keep = np.ones(store.num_detections, dtype=bool) if top_k is None else image_rank(store) < top_k
+    kept_eval = keep[det_index]
+
+    selected = {}
+    for category_id in sorted(gt.categories):
+        num_gt = int(np.sum((gt.labels == category_id) & ~gt.ignore))
+        # 남는 예측 수는 평가 대상이 아닌 이미지/예측까지 포함한 전체 기준
+        all_scores = np.sort(store.scores[keep & (store.labels == category_id)])[::-1].astype(np.float64)
+        if num_gt == 0 or len(all_scores) == 0:
+            continue
+
+        in_class = np.flatnonzero((det_labels == category_id) & kept_eval)
+        class_order = in_class[np.argsort(-det_scores[in_class], kind='stable')]
+        scores = det_scores[class_order]
+        ap_by_prefix = prefix_average_precision(tp[0, class_order], fp[0, class_order], num_gt)
+
+        # 후보 임계값: 클래스 점수 값들 (임계값 이상인 예측을 남김)
+        candidates = np.unique(all_scores)[::-1]
+        ap = ap_by_prefix[np.searchsorted(-scores, -candidates, side='right')]
+        sizes = np.searchsorted(-all_scores, -candidates, side='right')
+
+        if objective == 'map':
+            choice = np.flatnonzero(ap >= ap.max() - 1e-12)[0]
+        elif objective == 'size':
+            choice = np.flatnonzero(ap >= ap.max() - tolerance)[0]
+        else:
+            raise ValueError("Invalid objective. Choose from 'map' or 'size'.")
+        selected[category_id] = (float(candidates[choice]), float(ap[choice]), int(sizes[choice]))
+    return selected
+
+def estimate_filter(store, gt, selected, top_k=None, base_threshold=0.0):
+    """
+    선택한 클래스별 임계값과 top_k로 필터링했을 때의 mAP50과 남는 예측 수
+
+    정답이 있지만 예측이 없는 클래스는 summarize와 같이 AP 0으로 평균에 포함하고,
+    남는 예측 수는 confidence_mask를 그대로 적용하여 정답이 없는 클래스의 예측까지 센다.
+
+    :param selected: select_class_thresholds 결과
+    :return: (mAP50, 남는 예측 수)
+    """
+    num_classes = sum(1 for c in gt.categories if np.any((gt.labels == c) & ~gt.ignore))
+    map50 = sum(ap for _, ap, _ in selected.values()) / num_classes if num_classes else -1.0
+    class_thresholds = {c: threshold for c, (threshold, _, _) in selected.items()}
+    size = int(confidence_mask(store, base_threshold, class_thresholds, top_k).sum())
+    return float(map50), size
+
+def optimize_thresholds(pred_file, ann_file, top_k_candidates=(None,), objective='map', tolerance=0.0,
+                        base_threshold=0.0):
+    """
+    검증 fold에서 클래스별 신뢰도 임계값과 이미지별 최대 예측 수를 탐색
+
+    :param pred_file: 검증 fold 예측 파일 (CSV 또는 바이너리 저장소)
+    :param ann_file: 검증 fold 정답 COCO JSON 경로
+    :param top_k_candidates: 이미지별 최대 예측 수 후보 (None은 제한 없음)
+    :param objective: 'map' (mAP50 최대) 또는 'size' (허용 감소폭 안에서 예측 수 최소)
+    :param tolerance: objective='size'일 때 허용하는 클래스별/전체 AP50 감소폭
+    :param base_threshold: 정답이 없는 클래스에 적용할 임계값
+    :return: (설정 딕셔너리, 클래스별 결과 DataFrame)
+    """
+    store = load_predictions(pred_file)
+    gt = GroundTruth.from_json(ann_file)
+
+    # IoU 0.5에서의 매칭은 한 번만 계산하고 모든 후보에서 재사용
+    matches = match_detections(store, gt, iou_thrs=np.array([0.5]))
+
+    results = []
+    for top_k in top_k_candidates:
+        selected = select_class_thresholds(store, gt, matches, top_k, objective, tolerance)
+        map50, size = estimate_filter(store, gt, selected, top_k, base_threshold)
+        results.append((top_k, selected, map50, size))
+        print(f"top_k={top_k}: estimated mAP50 {map50:.4f}, {size} predictions")
+
+    # mAP50이 가장 높은 설정 (objective='size'이면 허용 감소폭 안에서 예측 수가 가장 적은 설정)
+    best_map = max(map50 for _, _, map50, _ in results)
+    margin = 1e-12 if objective == 'map' else tolerance
+    top_k, selected, _, _ = min((r for r in results if r[2] >= best_map - margin), key=lambda r: r[3])
+
+    config = {
+        'threshold': base_threshold,
+        'top_k': top_k,
+        'class_thresholds': {str(c): threshold for c, (threshold, _, _) in selected.items()},
+    }
+
+    # 실제 필터를 적용하여 전체 IoU 임계값에서 다시 평가
+    class_thresholds = {int(c): t for c, t in config['class_thresholds'].items()}
+    filtered = store.filter(confidence_mask(store, base_threshold, class_thresholds, top_k))
+    before = summarize(*evaluate_detections(store, gt), gt)
+    after = summarize(*evaluate_detections(filtered, gt), gt)
+
+    per_class = after[0][['category_id', 'name', 'num_gt']].copy()
+    per_class['threshold'] = [class_thresholds.get(c, base_threshold) for c in per_class['category_id'].tolist()]
+    per_class['AP50_before'] = before[0]['AP50']
+    per_class['AP50_after'] = after[0]['AP50']
+    category_ids = per_class['category_id'].to_numpy()
+    per_class['kept'] = np.bincount(filtered.labels.astype(np.int64), minlength=category_ids.max() + 1)[category_ids]
+
+    print(per_class.to_string(index=False, float_format=lambda x: f'{x:.4f}'))
+    print(f"mAP50: {before[1]:.4f} -> {after[1]:.4f}  mAP50:95: {before[2]:.4f} -> {after[2]:.4f}")
+    print(f"Predictions: {store.num_detections} -> {filtered.num_detections}")
+    return config, per_class
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Search per-class confidence thresholds on a validation fold')
+    parser.add_argument('pred_file', type=str, help='Validation prediction file (.csv or binary store)')
+    parser.add_argument('--ann_file', type=str, default='../dataset/json/splits/val_fold4.json',
+                        help='Ground truth COCO JSON of the validation fold')
+    # 이미지별 최대 예측 수 후보 (0은 제한 없음)
+    parser.add_argument('--top_k', nargs='+', type=int, default=[0],
+                        help='Per-image cap candidates, 0 for no cap (default: 0)')
+    parser.add_argument('--objective', type=str, default='map', choices=['map', 'size'],
+                        help='map: best mAP50 with fewest predictions, size: fewest predictions within tolerance')
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='Allowed AP50 drop for the size objective (default: 0.0)')
+    parser.add_argument('--output', type=str, default='./output/class_thresholds.json',
+                        help='Output JSON for filter_low_confidence.py --thresholds_file')
+    args = parser.parse_args()
+
+    config, _ = optimize_thresholds(args.pred_file, args.ann_file, [k or None for k in args.top_k],
+                                    args.objective, args.tolerance)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(config, f, indent=2)
+    print(f"Thresholds saved to {args.output}")
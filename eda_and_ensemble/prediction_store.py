@@ -0,0 +1,276 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from box_format import format_prediction_strings
+
+# 저장 시 사용하는 배열 이름과 자료형
+STORE_FIELDS = {
+    'offsets': np.int64,
+    'labels': np.int16,
+    'scores': np.float32,
+    'boxes': np.float32,
+}
+
+
+class PredictionStore:
+    """
+    여러 이미지의 detection 결과를 평탄화된 타입 배열로 보관하는 컬럼형 저장소
+
+    i번째 이미지의 예측은 offsets[i]:offsets[i + 1] 구간에 저장되며,
+    labels(int16), scores(float32), boxes(float32, xyxy) 배열을 공유한다.
+    """
+
+    def __init__(self, image_ids, offsets, labels, scores, boxes):
+        self.image_ids = list(image_ids)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.labels = np.asarray(labels, dtype=np.int16)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self._index = None
+
+        if len(self.offsets) != len(self.image_ids) + 1:
+            raise ValueError("offsets length must be number of images + 1")
+        if not (len(self.labels) == len(self.scores) == len(self.boxes) == self.offsets[-1]):
+            raise ValueError("labels, scores and boxes must have offsets[-1] rows")
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    @property
+    def num_detections(self):
+        return int(self.offsets[-1])
+
+    @property
+    def index(self):
+        """image_id -> 행 번호 딕셔너리 (처음 사용할 때 한 번만 생성)"""
+        if self._index is None:
+            self._index = {image_id: i for i, image_id in enumerate(self.image_ids)}
+        return self._index
+
+    def counts(self):
+        """이미지별 예측 개수"""
+        return np.diff(self.offsets)
+
+    def image_rows(self):
+        """각 예측이 속한 이미지의 행 번호"""
+        return np.repeat(np.arange(len(self.image_ids)), self.counts())
+
+    def slice(self, row):
+        """
+        행 번호로 한 이미지의 예측을 조회
+
+        :param row: 이미지 행 번호
+        :return: (labels, scores, boxes) 배열 뷰
+        """
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.labels[start:end], self.scores[start:end], self.boxes[start:end]
+
+    def get(self, image_id):
+        """
+        image_id로 한 이미지의 예측을 조회
+
+        :param image_id: 조회할 이미지 ID (예: test/0000.jpg)
+        :return: (labels, scores, boxes) 배열 뷰, 이미지가 없으면 None
+        """
+        row = self.index.get(image_id)
+        if row is None:
+            return None
+        return self.slice(row)
+
+    def filter(self, mask):
+        """
+        예측 단위의 boolean 마스크로 새 저장소를 생성 (이미지 목록은 유지)
+
+        :param mask: 길이가 num_detections인 boolean 배열
+        :return: 마스크가 True인 예측만 남긴 PredictionStore
+        """
+        mask = np.asarray(mask, dtype=bool)
+        counts = np.bincount(self.image_rows()[mask], minlength=len(self.image_ids))
+        offsets = np.zeros(len(self.image_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return PredictionStore(self.image_ids, offsets, self.labels[mask], self.scores[mask], self.boxes[mask])
+
+    def image_range(self, start, end):
+        """
+        연속한 이미지 구간 [start, end)의 예측만 담은 저장소를 생성 (배열은 복사하지 않고 뷰로 공유)
+
+        :param start: 시작 행 번호
+        :param end: 끝 행 번호 (포함하지 않음)
+        :return: PredictionStore
+        """
+        d_start, d_end = self.offsets[start], self.offsets[end]
+        return PredictionStore(self.image_ids[start:end], self.offsets[start:end + 1] - d_start,
+                               self.labels[d_start:d_end], self.scores[d_start:d_end], self.boxes[d_start:d_end])
+
+    @classmethod
+    def concat(cls, stores):
+        """여러 저장소를 이미지 순서대로 이어 붙인 저장소를 생성"""
+        stores = list(stores)
+        counts = np.concatenate([store.counts() for store in stores]) if stores else np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls([image_id for store in stores for image_id in store.image_ids], offsets,
+                   np.concatenate([store.labels for store in stores]) if stores else np.zeros(0),
+                   np.concatenate([store.scores for store in stores]) if stores else np.zeros(0),
+                   np.concatenate([store.boxes for store in stores]) if stores else np.zeros((0, 4)))
+
+    @classmethod
+    def from_lists(cls, image_ids, labels_list, scores_list, boxes_list):
+        """
+        이미지별 예측 배열 리스트로부터 저장소를 생성
+
+        :param image_ids: 이미지 ID 리스트
+        :param labels_list: 이미지별 클래스 배열 리스트
+        :param scores_list: 이미지별 신뢰도 배열 리스트
+        :param boxes_list: 이미지별 (N, 4) xyxy 박스 배열 리스트
+        :return: PredictionStore
+        """
+        counts = [len(labels) for labels in labels_list]
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        labels = np.concatenate([np.asarray(x, dtype=np.int16).reshape(-1) for x in labels_list]) if counts else np.zeros(0)
+        scores = np.concatenate([np.asarray(x, dtype=np.float32).reshape(-1) for x in scores_list]) if counts else np.zeros(0)
+        boxes = np.concatenate([np.asarray(x, dtype=np.float32).reshape(-1, 4) for x in boxes_list]) if counts else np.zeros((0, 4))
+        return cls(image_ids, offsets, labels, scores, boxes)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        PredictionString, image_id 열을 가진 DataFrame을 파싱
+
+        문자열을 행마다 float()로 변환하지 않고, 전체를 이어 붙인 뒤 한 번에 숫자 배열로 변환한다.
+        """
+        pred_strings = [s if isinstance(s, str) else '' for s in df['PredictionString']]
+
+        # 행별 토큰 수 (클래스, 신뢰도, x1, y1, x2, y2 → 6개 단위)
+        token_counts = np.array([len(s.split()) for s in pred_strings], dtype=np.int64)
+        if np.any(token_counts % 6):
+            bad_row = int(np.flatnonzero(token_counts % 6)[0])
+            raise ValueError(f"PredictionString of row {bad_row} is not a multiple of 6 values")
+
+        offsets = np.zeros(len(pred_strings) + 1, dtype=np.int64)
+        np.cumsum(token_counts // 6, out=offsets[1:])
+
+        values = np.fromstring(' '.join(pred_strings), sep=' ').reshape(-1, 6)
+        return cls(df['image_id'].tolist(), offsets, values[:, 0], values[:, 1], values[:, 2:6])
+
+    @classmethod
+    def from_csv(cls, csv_file):
+        """대회 제출 형식의 CSV 파일을 읽어 저장소를 생성"""
+        return cls.from_dataframe(pd.read_csv(csv_file))
+
+    def to_prediction_strings(self, precision=None):
+        """
+        이미지별 PredictionString 리스트로 변환
+
+        :param precision: 소수점 자릿수, None이면 float32 값을 손실 없이 복원할 수 있는 최단 표현 사용
+        :return: 이미지 순서대로 정렬된 PredictionString 리스트
+        """
+        return format_prediction_strings(self.labels, self.scores, self.boxes, self.offsets, precision)
+
+    def to_dataframe(self, precision=None):
+        return pd.DataFrame({
+            'PredictionString': self.to_prediction_strings(precision),
+            'image_id': self.image_ids,
+        })
+
+    def to_csv(self, csv_file, precision=None, mode='w', header=True):
+        """대회 제출 형식(PredictionString, image_id)의 CSV 파일로 저장 (mode='a'이면 기존 파일에 이어서 기록)"""
+        self.to_dataframe(precision).to_csv(csv_file, index=False, mode=mode, header=header)
+
+    def save(self, path):
+        """
+        저장소를 바이너리 형식으로 저장
+
+        - .npz: 압축하지 않은 단일 NumPy 아카이브
+        - .parquet: 예측 단위 테이블 (pyarrow 필요)
+        - 그 외: 디렉토리에 필드별 .npy 파일로 저장하여 memory-map으로 읽을 수 있게 함
+
+        :param path: 저장할 파일 또는 디렉토리 경로
+        """
+        arrays = {name: getattr(self, name).astype(dtype) for name, dtype in STORE_FIELDS.items()}
+
+        if path.endswith('.npz'):
+            np.savez(path, image_ids=np.array(self.image_ids), **arrays)
+        elif path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.table({
+                'image_row': self.image_rows().astype(np.int32),
+                'label': arrays['labels'],
+                'score': arrays['scores'],
+                'x1': arrays['boxes'][:, 0],
+                'y1': arrays['boxes'][:, 1],
+                'x2': arrays['boxes'][:, 2],
+                'y2': arrays['boxes'][:, 3],
+            })
+            # 예측이 없는 이미지도 보존하기 위해 이미지 목록은 메타데이터로 저장
+            table = table.replace_schema_metadata({'image_ids': json.dumps(self.image_ids)})
+            pq.write_table(table, path)
+        else:
+            os.makedirs(path, exist_ok=True)
+            for name, array in arrays.items():
+                np.save(os.path.join(path, f'{name}.npy'), array)
+            with open(os.path.join(path, 'image_ids.json'), 'w') as f:
+                json.dump(self.image_ids, f)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """
+        save()로 저장한 저장소를 읽기
+
+        :param path: .npz, .parquet 파일 또는 .npy 디렉토리 경로
+        :param mmap: 디렉토리 형식일 때 배열을 memory-map으로 열지 여부
+        :return: PredictionStore
+        """
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                return cls(data['image_ids'].tolist(), *(data[name] for name in STORE_FIELDS))
+
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(path)
+            image_ids = json.loads(table.schema.metadata[b'image_ids'])
+            image_rows = table.column('image_row').to_numpy()
+            offsets = np.zeros(len(image_ids) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(image_rows, minlength=len(image_ids)), out=offsets[1:])
+            boxes = np.stack([table.column(c).to_numpy() for c in ('x1', 'y1', 'x2', 'y2')], axis=1)
+            return cls(image_ids, offsets, table.column('label').to_numpy(), table.column('score').to_numpy(), boxes)
+
+        mmap_mode = 'r' if mmap else None
+        arrays = [np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in STORE_FIELDS]
+        with open(os.path.join(path, 'image_ids.json'), 'r') as f:
+            image_ids = json.load(f)
+        return cls(image_ids, *arrays)
+
+
+def load_predictions(path, mmap=False):
+    """
+    CSV 또는 바이너리 저장소 경로를 받아 PredictionStore로 읽기
+
+    :param path: .csv 파일 또는 save()로 저장한 경로
+    :param mmap: 디렉토리 형식일 때 memory-map 사용 여부
+    :return: PredictionStore
+    """
+    if path.endswith('.csv'):
+        return PredictionStore.from_csv(path)
+    return PredictionStore.load(path, mmap=mmap)
+
+
+def save_predictions(store, path, precision=None):
+    """
+    확장자에 따라 CSV 또는 바이너리 형식으로 PredictionStore를 저장
+
+    :param store: 저장할 PredictionStore
+    :param path: .csv 파일 또는 바이너리 저장 경로
+    :param precision: CSV 저장 시 소수점 자릿수 (None이면 손실 없는 형식)
+    """
+    if path.endswith('.csv'):
+        store.to_csv(path, precision)
+    else:
+        store.save(path)
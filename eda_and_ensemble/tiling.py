@@ -0,0 +1,179 @@
+import numpy as np
+
+from ensemble import fuse_image
+
+
+def tile_windows(width, height, tile_size=512, overlap=0.2):
+    """
+    이미지를 덮는 겹치는 타일 영역 계산 (타일 간격을 균등하게 하여 첫 타일과 마지막 타일이 이미지 끝에 맞도록 함)
+
+    :param width: 이미지 너비
+    :param height: 이미지 높이
+    :param tile_size: 타일 한 변의 크기 (이미지가 더 작으면 이미지 크기)
+    :param overlap: 이웃한 타일이 겹치는 비율 (0 이상 1 미만)
+    :return: (N, 4) int64 xyxy 타일 영역 배열 (행 우선 순서)
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError("overlap must be in [0, 1)")
+
+    def starts(length):
+        if length <= tile_size:
+            return np.zeros(1, dtype=np.int64)
+        # 겹침 비율을 만족하는 최소 타일 수로 나누고 남는 겹침은 균등하게 분배
+        num_tiles = int(np.ceil((length - tile_size) / max(1, tile_size * (1 - overlap)))) + 1
+        return np.round(np.linspace(0, length - tile_size, num_tiles)).astype(np.int64)
+
+    x0, y0 = np.meshgrid(starts(width), starts(height))
+    x0, y0 = x0.ravel(), y0.ravel()
+    return np.stack([x0, y0, np.minimum(x0 + tile_size, width), np.minimum(y0 + tile_size, height)], axis=1)
+
+def crop_tiles(image, windows):
+    """(H, W, C) 이미지에서 타일 영역을 잘라낸 배열 리스트"""
+    return [np.ascontiguousarray(image[y0:y1, x0:x1]) for x0, y0, x1, y1 in windows.tolist()]
+
+def seam_mask(boxes, windows, width, height, margin=2):
+    """
+    타일 내부 경계(이미지 경계가 아닌 쪽)에 걸치지 않은 박스의 마스크
+
+    내부 경계에 걸친 박스는 타일에 잘린 물체의 일부이므로 join_cut_boxes에서 이웃 타일의 조각과 합친다.
+
+    :param boxes: (N, 4) 타일 기준 xyxy 박스 배열
+    :param windows: (N, 4) 박스별 타일 영역 배열
+    :param margin: 경계에 닿았다고 판단할 픽셀 거리
+    :return: (N,) boolean 배열 (True: 잘리지 않은 박스)
+    """
+    tile_w = windows[:, 2] - windows[:, 0]
+    tile_h = windows[:, 3] - windows[:, 1]
+    cut = ((windows[:, 0] > 0) & (boxes[:, 0] <= margin)) | \
+          ((windows[:, 1] > 0) & (boxes[:, 1] <= margin)) | \
+          ((windows[:, 2] < width) & (boxes[:, 2] >= tile_w - margin)) | \
+          ((windows[:, 3] < height) & (boxes[:, 3] >= tile_h - margin))
+    return ~cut
+
+def _intersection(boxes1, boxes2):
+    """(N, 4), (M, 4) xyxy 박스 사이의 교집합 면적 (N, M)"""
+    wh = np.maximum(np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:]) -
+                    np.maximum(boxes1[:, None, :2], boxes2[None, :, :2]), 0)
+    return wh[..., 0] * wh[..., 1]
+
+def join_cut_boxes(labels, scores, boxes, tile_ids, whole, cover_thr=0.5):
+    """
+    타일 경계에 잘린 박스 조각을 이웃 타일의 조각과 합쳐 물체 전체의 박스로 복원
+
+    이웃한 타일은 서로 겹치므로 같은 물체의 조각은 겹침 영역에서 서로 교차한다. 서로 다른 타일에서 나온
+    같은 클래스의 교차하는 조각을 연결 요소로 묶어 외접 박스(점수는 최댓값)로 합치고,
+    다른 타일에서 잘리지 않은 같은 클래스의 박스가 이미 덮고 있는 결과는 중복이므로 제외한다.
+
+    :param labels: (N,) 전체 이미지 좌표 예측의 클래스 배열
+    :param scores: (N,) 신뢰도 배열
+    :param boxes: (N, 4) 전체 이미지 기준 xyxy 박스 배열
+    :param tile_ids: (N,) 박스가 나온 타일 번호
+    :param whole: (N,) seam_mask 결과 (True: 잘리지 않은 박스)
+    :param cover_thr: 합친 박스 면적 중 잘리지 않은 박스에 덮인 비율이 이 값 이상이면 제외
+    :return: 잘리지 않은 박스와 합친 박스를 모은 (labels, scores, boxes)
+    """
+    cut = np.flatnonzero(~whole)
+    if len(cut) == 0:
+        return labels, scores, boxes
+
+    # 같은 클래스, 서로 다른 타일, 교차하는 조각끼리 연결하고 연결 요소마다 가장 작은 번호로 라벨링
+    cut_labels, cut_boxes, cut_tiles = labels[cut], boxes[cut], tile_ids[cut]
+    linked = (_intersection(cut_boxes, cut_boxes) > 0) & (cut_labels[:, None] == cut_labels[None, :]) & \
+             (cut_tiles[:, None] != cut_tiles[None, :])
+    np.fill_diagonal(linked, True)
+    component = np.arange(len(cut))
+    while True:
+        merged = np.where(linked, component[None, :], len(cut)).min(axis=1)
+        if np.array_equal(merged, component):
+            break
+        component = merged[merged]
+
+    # 연결 요소별 외접 박스와 최고 점수
+    groups, inverse = np.unique(component, return_inverse=True)
+    top_left = np.full((len(groups), 2), np.inf, dtype=boxes.dtype)
+    bottom_right = np.full((len(groups), 2), -np.inf, dtype=boxes.dtype)
+    np.minimum.at(top_left, inverse, cut_boxes[:, :2])
+    np.maximum.at(bottom_right, inverse, cut_boxes[:, 2:])
+    joined_boxes = np.concatenate([top_left, bottom_right], axis=1)
+    joined_scores = np.full(len(groups), -np.inf, dtype=scores.dtype)
+    np.maximum.at(joined_scores, inverse, scores[cut])
+    joined_labels = cut_labels[groups]
+
+    # 잘리지 않은 같은 클래스 박스에 대부분 덮인 조각은 이미 다른 타일에서 온전히 검출된 물체
+    whole_index = np.flatnonzero(whole)
+    area = np.prod(joined_boxes[:, 2:] - joined_boxes[:, :2], axis=1)
+    covered = _intersection(joined_boxes, boxes[whole_index]) * \
+        (joined_labels[:, None] == labels[whole_index][None, :])
+    keep = covered.max(axis=1, initial=0) < cover_thr * area
+
+    return (np.concatenate([labels[whole_index], joined_labels[keep]]),
+            np.concatenate([scores[whole_index], joined_scores[keep]]),
+            np.concatenate([boxes[whole_index], joined_boxes[keep]]))
+
+def merge_tiles(outputs, windows, width, height, method='nms', iou_thr=0.5, margin=2):
+    """
+    타일별 예측을 전체 이미지 좌표로 옮기고, 잘린 조각을 합친 뒤 경계에서 중복된 박스를 병합
+
+    모든 타일의 박스를 한 모델의 예측처럼 모아 병합하므로 WBF에서도 타일 수에 따라 점수가 낮아지지 않는다.
+
+    :param outputs: 타일별 (labels, scores, 타일 기준 xyxy 박스) 리스트
+    :param windows: (N, 4) 타일 영역 배열
+    :param method: 병합 방식 ('nms', 'soft_nms', 'nmw', 'wbf')
+    :return: (labels, scores, boxes) 병합 결과
+    """
+    counts = [len(labels) for labels, _, _ in outputs]
+    if not sum(counts):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), np.zeros((0, 4), dtype=np.float32)
+
+    labels = np.concatenate([labels for labels, _, _ in outputs]).astype(np.int64)
+    scores = np.concatenate([scores for _, scores, _ in outputs]).astype(np.float32)
+    boxes = np.concatenate([np.reshape(boxes, (-1, 4)) for _, _, boxes in outputs]).astype(np.float32)
+    tile_ids = np.repeat(np.arange(len(windows)), counts)
+    box_windows = windows[tile_ids]
+
+    whole = seam_mask(boxes, box_windows, width, height, margin)
+    boxes = boxes + box_windows[:, [0, 1, 0, 1]]
+    labels, scores, boxes = join_cut_boxes(labels, scores, boxes, tile_ids, whole)
+    labels, scores, boxes = fuse_image([(labels, scores, boxes)], (width, height), method, iou_thr)
+    return labels, scores.astype(np.float32), boxes.astype(np.float32)
+
+def tiled_predict(images, predict_fn, tile_size=512, overlap=0.2, batch_size=16, full_image=True, method='nms',
+                  iou_thr=0.5, margin=2):
+    """
+    이미지들을 겹치는 타일로 나누어 추론한 뒤 이미지별로 병합
+
+    모든 이미지의 타일(과 전체 이미지)을 batch_size개씩 묶어 predict_fn에 넘기므로, 입력 크기를 키우지 않고도
+    작은 물체를 모델 입력 크기에 가깝게 확대해서 볼 수 있다.
+
+    :param images: (H, W, C) 이미지 배열 리스트
+    :param predict_fn: 이미지 배열 리스트를 받아 이미지별 (labels, scores, xyxy 박스) 리스트를 반환하는 함수
+    :param tile_size: 타일 한 변의 크기
+    :param overlap: 이웃한 타일이 겹치는 비율
+    :param batch_size: 한 번에 추론할 타일 수
+    :param full_image: 전체 이미지 예측도 함께 병합할지 여부 (타일보다 큰 물체의 조각은 합쳐지지만, 전체 이미지로 보면 더 정확함)
+    :param method: 병합 방식 ('nms', 'soft_nms', 'nmw', 'wbf')
+    :param iou_thr: 병합 IoU 임계값
+    :param margin: 타일 내부 경계에 닿았다고 판단할 픽셀 거리
+    :return: 이미지별 (labels, scores, boxes) 리스트
+    """
+    windows_list, crops = [], []
+    for image in images:
+        height, width = image.shape[:2]
+        windows = tile_windows(width, height, tile_size, overlap)
+        if full_image and len(windows) > 1:
+            # 전체 이미지는 모든 변이 이미지 경계이므로 잘린 박스로 취급되지 않음
+            windows = np.concatenate([windows, [[0, 0, width, height]]])
+        windows_list.append(windows)
+        crops.extend(crop_tiles(image, windows))
+
+    outputs = []
+    for start in range(0, len(crops), batch_size):
+        outputs.extend(predict_fn(crops[start:start + batch_size]))
+
+    results, start = [], 0
+    for image, windows in zip(images, windows_list):
+        height, width = image.shape[:2]
+        results.append(merge_tiles(outputs[start:start + len(windows)], windows, width, height, method, iou_thr,
+                                   margin))
+        start += len(windows)
+    return results
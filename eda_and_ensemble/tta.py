@@ -0,0 +1,142 @@
+import time
+import itertools
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+from ensemble import ensemble_predictions
+from evaluate import evaluate_detections, summarize
+
+# scale: 입력 크기 배율, hflip/vflip: 좌우/상하 반전 여부
+View = namedtuple('View', ['scale', 'hflip', 'vflip'])
+
+
+def parse_view(spec):
+    """
+    '배율[:반전]' 형식의 문자열을 View로 변환 (예: '1.0', '1.25:h', '0.83:hv')
+
+    :param spec: 배율과 반전(h: 좌우, v: 상하) 문자열
+    :return: View
+    """
+    scale, _, flips = spec.partition(':')
+    if set(flips) - {'h', 'v'}:
+        raise ValueError(f"Invalid flips in view '{spec}'. Use h and/or v, e.g. 1.0:h")
+    return View(float(scale), 'h' in flips, 'v' in flips)
+
+def view_name(view):
+    """parse_view의 역변환 (예: View(1.25, True, False) -> '1.25:h')"""
+    flips = ('h' if view.hflip else '') + ('v' if view.vflip else '')
+    return f"{view.scale:g}" + (f":{flips}" if flips else '')
+
+def group_by_scale(views):
+    """
+    같은 배율의 view를 묶음 (같은 입력 크기의 view는 한 번의 forward pass로 처리)
+
+    :return: [(배율, 해당 배율의 view 리스트)] (처음 등장한 순서)
+    """
+    groups = {}
+    for view in views:
+        groups.setdefault(view.scale, []).append(view)
+    return list(groups.items())
+
+def flip_image(image, view):
+    """(H, W, C) 이미지에 view의 반전을 적용 (배율은 모델별 입력 크기로 적용)"""
+    if view.hflip:
+        image = image[:, ::-1]
+    if view.vflip:
+        image = image[::-1]
+    return np.ascontiguousarray(image)
+
+def unflip_boxes(boxes, view, width, height):
+    """
+    반전된 이미지에서 예측한 (N, 4) xyxy 박스를 원본 이미지 좌표로 한 번에 복원
+
+    :param boxes: 반전된 이미지 기준 xyxy 박스 배열 (원본과 같은 크기의 픽셀 좌표)
+    :param width: 원본 이미지 너비 (여러 이미지의 박스를 한 번에 복원할 때는 박스별 (N,) 배열)
+    :param height: 원본 이미지 높이 (width와 같은 형식)
+    """
+    boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+    width, height = np.reshape(width, (-1, 1)), np.reshape(height, (-1, 1))
+    if view.hflip:
+        boxes[:, [0, 2]] = width - boxes[:, [2, 0]]
+    if view.vflip:
+        boxes[:, [1, 3]] = height - boxes[:, [3, 1]]
+    return boxes
+
+def merge_views(stores, image_sizes, method='wbf', iou_thr=0.55, weights=None, workers=1):
+    """
+    view별 예측 저장소를 이미지 단위로 병합 (view를 앙상블의 모델처럼 취급)
+
+    :param stores: view별 PredictionStore 리스트 (이미지 순서가 같아야 함)
+    :param image_sizes: 이미지별 (width, height) 리스트
+    :param method: 'nms', 'soft_nms', 'nmw', 'wbf'
+    :param iou_thr: 박스를 같은 객체로 판단할 IoU 임계값
+    :param weights: view별 가중치
+    :return: 병합된 PredictionStore (view가 하나면 그대로 반환)
+    """
+    if len(stores) == 1:
+        return stores[0]
+    return ensemble_predictions(stores, stores[0].image_ids, image_sizes, fusion_method=method, iou_thr=iou_thr,
+                                weights=weights, workers=workers)
+
+def tta_report(view_stores, view_times, gt, image_sizes, method='wbf', iou_thr=0.55, base_view='1', max_views=None,
+               workers=1):
+    """
+    view 조합별 mAP와 이미지당 지연 시간을 비교하는 cost/benefit 리포트
+
+    각 view의 예측과 이미지당 추론 시간은 미리 측정해 두고, 조합마다 병합과 평가만 다시 수행한다.
+    조합의 비용은 view별 추론 시간의 합과 병합 시간으로 추정한다
+    (같은 배율의 view를 한 번의 forward pass로 묶으면 실제 시간은 이보다 짧을 수 있다).
+
+    :param view_stores: {view 이름: PredictionStore} (검증 fold 예측)
+    :param view_times: {view 이름: 이미지당 추론 시간(ms)}
+    :param gt: GroundTruth 객체
+    :param image_sizes: 이미지별 (width, height) 리스트 (view_stores의 이미지 순서)
+    :param base_view: 비교 기준 (TTA 없음) view 이름, 모든 조합에 포함
+    :param max_views: 조합에 포함할 최대 view 수 (None이면 제한 없음)
+    :return: 이미지당 비용 오름차순으로 정렬된 DataFrame
+    """
+    names = list(view_stores)
+    if base_view not in view_stores:
+        raise ValueError(f"Base view '{base_view}' is not among the measured views: {names}")
+    others = [name for name in names if name != base_view]
+    max_views = len(names) if max_views is None else max_views
+
+    rows = []
+    for k in range(0, min(len(others), max_views - 1) + 1):
+        for combo in itertools.combinations(others, k):
+            members = [base_view, *combo]
+            start = time.perf_counter()
+            merged = merge_views([view_stores[name] for name in members], image_sizes, method, iou_thr,
+                                 workers=workers)
+            merge_ms = (time.perf_counter() - start) * 1000 / max(1, len(merged))
+            _, map50, map50_95 = summarize(*evaluate_detections(merged, gt), gt)
+            rows.append({
+                'views': ' '.join(members),
+                'num_views': len(members),
+                'ms_per_image': sum(view_times[name] for name in members) + merge_ms,
+                'merge_ms': merge_ms,
+                'mAP50': map50,
+                'mAP50:95': map50_95,
+            })
+
+    table = pd.DataFrame(rows)
+    base = table.iloc[0]
+    table['extra_ms'] = table['ms_per_image'] - base['ms_per_image']
+    table['mAP50_gain'] = table['mAP50'] - base['mAP50']
+    table['mAP50:95_gain'] = table['mAP50:95'] - base['mAP50:95']
+    # 추가 지연 1ms당 mAP50 향상 (기준 view는 0)
+    table['mAP50_gain_per_ms'] = np.where(table['extra_ms'] > 0,
+                                          table['mAP50_gain'] / table['extra_ms'].where(table['extra_ms'] > 0, 1), 0.0)
+    return table.sort_values('ms_per_image').reset_index(drop=True)
+
+def best_within_budget(table, max_ms):
+    """
+    tta_report 결과에서 이미지당 지연 시간이 max_ms 이하인 조합 중 mAP50이 가장 높은 조합
+
+    :return: 해당 행 (Series), 조건을 만족하는 조합이 없으면 None
+    """
+    within = table[table['ms_per_image'] <= max_ms]
+    if within.empty:
+        return None
+    return within.loc[within['mAP50'].idxmax()]
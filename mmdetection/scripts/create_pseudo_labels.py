@@ -1,50 +1,41 @@
-import pandas as pd
-import json
-from tqdm import tqdm
+import os
+import sys
+import numpy as np
 
-def create_pseudo_labels(csv_file, confidence_threshold=0.7):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'eda_and_ensemble'))
+from box_format import xyxy_to_xywh
+from coco_dataset import CocoDataset
+from filter_low_confidence import confidence_mask
+from image_meta import load_image_meta
+from prediction_store import load_predictions
+
+def create_pseudo_labels(csv_file, confidence_threshold=0.7, ann_file='../../dataset/json/test.json'):
     """
-    CSV 파일에서 예측 결과를 읽어 의사 레이블(pseudo-labels)을 생성
+    예측 파일(CSV 또는 바이너리 저장소)에서 결과를 읽어 의사 레이블(pseudo-labels)을 생성
     
-    :param csv_file: 예측 결과가 저장된 CSV 파일 경로
+    :param csv_file: 예측 결과가 저장된 CSV 파일 또는 바이너리 저장소 경로
     :param confidence_threshold: 의사 레이블로 채택할 최소 신뢰도 임계값
-    :return: COCO 형식의 의사 레이블 데이터
+    :param ann_file: 이미지 id와 크기를 가져올 테스트 COCO JSON 경로
+    :return: 의사 레이블 CocoDataset
     """
-    df = pd.read_csv(csv_file)
-    
-    pseudo_annotations = []
-    images = []
-    image_id_map = {}
-    
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="Processing predictions"):
-        image_id = row['image_id']
-        file_name = f"test/{image_id.split('/')[-1]}"
+    store = load_predictions(csv_file)
+    image_meta = load_image_meta(ann_file)
 
-        # 이미지 정보 추가
-        if file_name not in image_id_map:
-            image_id_map[file_name] = len(image_id_map)
-            images.append({
-                'id': image_id_map[file_name],
-                'file_name': file_name,
-                'height': 1024,
-                'width': 1024
-            })
-        
-        # 예측 결과 처리
-        predictions = row['PredictionString'].split()
-        for i in range(0, len(predictions), 6):
-            label, conf, x1, y1, x2, y2 = predictions[i:i+6]
-            conf = float(conf)
-            if conf >= confidence_threshold:
-                x1, y1, x2, y2 = map(float, [x1, y1, x2, y2])
-                pseudo_annotations.append({
-                    'image_id': image_id_map[file_name],
-                    'category_id': int(label),
-                    'bbox': [x1, y1, x2-x1, y2-y1],
-                    'area': (x2-x1) * (y2-y1),
-                    'iscrowd': 0,
-                    'id': len(pseudo_annotations)
-                })
+    # 이미지 정보 (id와 크기는 테스트 JSON에서 file_name으로 조회)
+    meta_rows = np.array([image_meta.row(image_id) for image_id in store.image_ids], dtype=np.int64)
+    images = [{
+        'id': int(image_meta.ids[row]),
+        'file_name': image_meta.file_names[row],
+        'height': int(image_meta.heights[row]),
+        'width': int(image_meta.widths[row])
+    } for row in meta_rows.tolist()]
+
+    # 신뢰도 임계값 이상인 예측만 선택 (filter_low_confidence와 같이 float32로 비교)
+    pseudo = store.filter(confidence_mask(store, confidence_threshold))
+
+    # xyxy 박스를 COCO 형식(xywh)으로 변환
+    xywh = xyxy_to_xywh(pseudo.boxes.astype(np.float64))
+    num_annotations = pseudo.num_detections
     
     # 카테고리 정보 정의
     categories = [
@@ -54,24 +45,18 @@ def create_pseudo_labels(csv_file, confidence_threshold=0.7):
         ])
     ]
     
-    # COCO 형식의 데이터 구조 생성
-    pseudo_coco = {
-        'images': images,
-        'annotations': pseudo_annotations,
-        'categories': categories
-    }
-    
-    return pseudo_coco
+    # 이미지별로 묶인 예측 배열을 그대로 annotation 배열로 사용
+    return CocoDataset(images, image_meta.ids[meta_rows], pseudo.offsets, np.arange(num_annotations),
+                       pseudo.labels, xywh, xywh[:, 2] * xywh[:, 3], np.zeros(num_annotations), categories)
 
 def save_pseudo_labels(pseudo_coco, output_file):
     """
-    생성된 의사 레이블을 JSON 파일로 저장
+    생성된 의사 레이블을 JSON 파일로 저장 (.gz로 끝나면 gzip으로 압축)
     
-    :param pseudo_coco: COCO 형식의 의사 레이블 데이터
+    :param pseudo_coco: 의사 레이블 CocoDataset
     :param output_file: 저장할 JSON 파일 경로
     """
-    with open(output_file, 'w') as f:
-        json.dump(pseudo_coco, f)
+    pseudo_coco.save(output_file)
 
 if __name__ == "__main__":
     # 입력 CSV 파일 경로와 출력 JSON 파일 경로 설정
@@ -1,68 +1,314 @@
 import os
-import pandas as pd
-from mmdet.apis import init_detector, inference_detector
+import copy
+import time
+import argparse
+import numpy as np
+import torch
+from mmcv.transforms import Compose
+from mmengine.dataset import pseudo_collate
+from mmdet.apis import init_detector
+from mmdet.utils import get_test_pipeline_cfg
 from tqdm import tqdm
 
 import sys
 sys.path.append('..')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'eda_and_ensemble'))
+from image_loader import load_image, prefetch_batches
+from prediction_store import PredictionStore, save_predictions
+from tiling import tiled_predict
+from tta import parse_view, view_name, group_by_scale, flip_image, unflip_boxes, merge_views
 
-def main():
-    # 설정 파일 및 체크포인트 파일 경로
-    config_name = 'deformable-detr-refine-twostage_r50_16xb2-50e_coco_trash'
-    config_file = f'../custom_configs/{config_name}.py'  # 모델 설정 파일 경로
+def load_model(config_file, checkpoint_file, device=None):
+    """
+    모델 초기화 (device를 지정하지 않으면 GPU가 있을 때 cuda:0, 없으면 CPU 사용)
+
+    :param config_file: 모델 설정 파일 경로
+    :param checkpoint_file: 체크포인트 파일 경로
+    :param device: 'cuda:0', 'cpu' 등
+    :return: (모델, 테스트 파이프라인)
+    """
+    if device is None:
+        device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
+    model = init_detector(config_file, checkpoint_file, device=device)
+
+    # inference_detector와 같은 테스트 파이프라인 (이미지 로드, 리사이즈, 정규화 전 패킹)
+    test_pipeline = Compose(get_test_pipeline_cfg(model.cfg.copy()))
+    return model, test_pipeline
+
+def results_to_store(image_ids, results):
+    """
+    배치의 DetDataSample 리스트를 PredictionStore로 변환
+
+    배치 전체의 예측 텐서를 이어 붙여 장치에서 한 번만 NumPy 배열로 옮긴다.
+
+    :param image_ids: 배치 이미지 ID 리스트 (예: test/0000.jpg)
+    :param results: model.test_step 결과 리스트
+    :return: PredictionStore
+    """
+    instances = [result.pred_instances for result in results]
+    counts = [len(instance) for instance in instances]
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    labels = torch.cat([instance.labels for instance in instances]).cpu().numpy()
+    scores = torch.cat([instance.scores for instance in instances]).cpu().numpy()
+    bboxes = torch.cat([instance.bboxes.reshape(-1, 4) for instance in instances]).cpu().numpy()
+    return PredictionStore(image_ids, offsets, labels, scores, bboxes)
+
+def run_inference(model, test_pipeline, image_paths, image_ids, batch_size=8, workers=4, progress=True):
+    """
+    이미지를 batch_size개씩 묶어 추론
+
+    inference_detector는 이미지 리스트를 받아도 한 장씩 test_step을 호출하므로,
+    같은 파이프라인으로 전처리한 이미지를 묶어 한 번의 test_step으로 추론한다.
+    배치 안의 이미지는 같은 크기로 패딩되므로 batch_size=1과 점수가 미세하게 다를 수 있다.
+    이미지 디코딩과 리사이즈(테스트 파이프라인)는 workers개의 스레드에서 다음 배치를 미리 처리한다.
+
+    :param model: init_detector로 생성한 모델
+    :param test_pipeline: 테스트 파이프라인
+    :param image_paths: 이미지 파일 경로 리스트
+    :param image_ids: 결과에 기록할 이미지 ID 리스트
+    :param batch_size: 한 번에 추론할 이미지 수
+    :param workers: 테스트 파이프라인을 미리 실행할 스레드 수 (0이면 추론 직전에 순서대로 실행)
+    :param progress: 진행 상황 출력 여부
+    :return: 모든 이미지의 예측을 담은 PredictionStore
+    """
+    def load(item):
+        # 이미지 로드부터 리사이즈, 패킹까지 테스트 파이프라인 실행
+        i, path = item
+        return test_pipeline(dict(img_path=path, img_id=i))
+
+    stores = []
+    with tqdm(total=len(image_paths), desc="Processing images", disable=not progress) as pbar:
+        for batch_items, batch_data in prefetch_batches(list(enumerate(image_paths)), load, batch_size, workers):
+            with torch.no_grad():
+                results = model.test_step(pseudo_collate(batch_data))
+            stores.append(results_to_store([image_ids[i] for i, _ in batch_items], results))
+            pbar.update(len(batch_items))
+    return PredictionStore.concat(stores)
+
+def scale_size(size, scale):
+    """Resize/Pad 설정의 (w, h) 크기에 TTA 배율을 적용"""
+    return tuple(int(round(s * scale)) for s in size)
+
+def build_view_pipelines(model, scales):
+    """
+    배율별 테스트 파이프라인 생성
+
+    설정 파일의 테스트 파이프라인에서 Resize의 scale과 Pad의 size에 배율을 곱하고,
+    반전은 미리 읽은 이미지에 적용하므로 이미지 로드를 배열 입력(LoadImageFromNDArray)으로 바꾼다.
+
+    :param model: init_detector로 생성한 모델
+    :param scales: 배율 리스트
+    :return: {배율: 테스트 파이프라인}
+    """
+    pipelines = {}
+    for scale in scales:
+        # 설정 객체의 얕은 복사는 파이프라인을 공유하므로 배율마다 깊은 복사본을 수정
+        pipeline_cfg = copy.deepcopy(get_test_pipeline_cfg(model.cfg))
+        pipeline_cfg[0].type = 'mmdet.LoadImageFromNDArray'
+        for transform in pipeline_cfg:
+            if transform.type.endswith('Resize') and 'scale' in transform:
+                transform.scale = scale_size(transform.scale, scale)
+            elif transform.type.endswith('Pad') and transform.get('size') is not None:
+                transform.size = scale_size(transform.size, scale)
+        pipelines[scale] = Compose(pipeline_cfg)
+    return pipelines
+
+def run_tta(model, image_paths, image_ids, views, batch_size=2, workers=4, method='wbf', iou_thr=0.55, progress=True):
+    """
+    배율/반전 view로 TTA 추론을 수행하고 이미지별로 병합
 
-    model_epoch = 50
+    이미지를 한 번만 디코딩한 뒤 view마다 반전과 배율별 테스트 파이프라인을 적용하고,
+    같은 배율의 view는 배치 이미지 전체와 함께 한 번의 test_step으로 추론한다.
+    박스는 원본 이미지 크기로 복원되어 나오므로 반전만 되돌린 뒤 method로 병합한다.
+
+    :param views: View 리스트 (예: [parse_view('1'), parse_view('1:h'), parse_view('1.25')])
+    :param batch_size: 한 번에 읽을 이미지 수 (test_step 크기는 batch_size x 같은 배율의 view 수)
+    :param workers: 이미지 디코딩과 테스트 파이프라인을 미리 실행할 스레드 수
+    :param method: view 병합 방식 ('nms', 'soft_nms', 'nmw', 'wbf')
+    :param iou_thr: 병합 IoU 임계값
+    :return: (병합된 PredictionStore, 단계별 누적 시간(초) dict)
+    """
+    pipelines = build_view_pipelines(model, {view.scale for view in views})
+    timing = {('preprocess', view): 0.0 for view in views}
+    timing.update({('forward', view): 0.0 for view in views})
+    timing['merge'] = 0.0
+
+    def load(item):
+        # 이미지를 한 번 디코딩하고 view마다 반전과 테스트 파이프라인 적용 (스레드에서 실행)
+        i, path = item
+        image = load_image(path)
+        inputs, elapsed = {}, {}
+        for view in views:
+            start = time.perf_counter()
+            inputs[view] = pipelines[view.scale](dict(img=flip_image(image, view), img_id=i))
+            elapsed[view] = time.perf_counter() - start
+        return image.shape[:2], inputs, elapsed
+
+    stores = []
+    with tqdm(total=len(image_paths), desc="Processing images (TTA)", disable=not progress) as pbar:
+        for batch_items, batch_data in prefetch_batches(list(enumerate(image_paths)), load, batch_size, workers):
+            batch_ids = [image_ids[i] for i, _ in batch_items]
+            heights, widths = np.array([shape for shape, _, _ in batch_data]).T
+            for _, _, elapsed in batch_data:
+                for view in views:
+                    timing[('preprocess', view)] += elapsed[view]
+
+            view_stores = {}
+            for _, group in group_by_scale(views):
+                start = time.perf_counter()
+                with torch.no_grad():
+                    results = model.test_step(pseudo_collate([inputs[view] for view in group
+                                                              for _, inputs, _ in batch_data]))
+                for k, view in enumerate(group):
+                    store = results_to_store(batch_ids, results[k * len(batch_ids):(k + 1) * len(batch_ids)])
+                    rows = store.image_rows()
+                    view_stores[view] = PredictionStore(batch_ids, store.offsets, store.labels, store.scores,
+                                                        unflip_boxes(store.boxes, view, widths[rows], heights[rows]))
+                # 같은 배율의 view는 입력 크기가 같으므로 forward 시간을 균등하게 나눔
+                elapsed = time.perf_counter() - start
+                for view in group:
+                    timing[('forward', view)] += elapsed / len(group)
+
+            start = time.perf_counter()
+            stores.append(merge_views([view_stores[view] for view in views], list(zip(widths, heights)), method,
+                                      iou_thr))
+            timing['merge'] += time.perf_counter() - start
+            pbar.update(len(batch_items))
+    return PredictionStore.concat(stores), timing
+
+def print_timing(timing, views, num_images):
+    """run_tta의 view별 전처리/forward 시간과 병합 시간을 이미지당 ms로 출력"""
+    num_images = max(1, num_images)
+    total = 0.0
+    print(f"{'view':>8s} {'preprocess':>12s} {'forward':>12s}")
+    for view in views:
+        preprocess = timing[('preprocess', view)] * 1000 / num_images
+        forward = timing[('forward', view)] * 1000 / num_images
+        total += preprocess + forward
+        print(f"{view_name(view):>8s} {preprocess:9.1f} ms {forward:9.1f} ms")
+    merge = timing['merge'] * 1000 / num_images
+    print(f"merge: {merge:.1f} ms, total: {total + merge:.1f} ms per image "
+          f"(preprocessing runs in loader threads alongside the forward pass)")
+
+def run_tiled(model, image_paths, image_ids, tile_size=640, overlap=0.2, batch_size=8, workers=4, method='nms',
+              iou_thr=0.5, full_image=True, progress=True):
+    """
+    이미지를 겹치는 타일로 나누어 추론하고 경계의 중복 박스를 병합 (sliced inference)
+
+    타일은 config의 테스트 파이프라인으로 리사이즈되므로 작은 물체가 확대되어 입력되고,
+    전체 이미지를 큰 img_scale로 추론할 때와 달리 메모리 사용량은 batch_size개 타일의 forward pass로 제한된다.
+
+    :param tile_size: 타일 한 변의 크기 (원본 픽셀)
+    :param overlap: 이웃한 타일이 겹치는 비율
+    :param batch_size: 한 번에 추론할 타일 수 (이미지도 batch_size개씩 묶어 디코딩)
+    :param workers: 이미지를 미리 디코딩할 스레드 수
+    :param method: 타일 병합 방식 ('nms', 'soft_nms', 'nmw', 'wbf')
+    :param iou_thr: 병합 IoU 임계값
+    :param full_image: 전체 이미지 예측도 함께 병합할지 여부 (False이면 잘린 물체를 타일 조각으로만 복원)
+    :return: 병합된 PredictionStore
+    """
+    test_pipeline = build_view_pipelines(model, [1.0])[1.0]
+
+    def predict(crops):
+        data = [test_pipeline(dict(img=crop, img_id=k)) for k, crop in enumerate(crops)]
+        with torch.no_grad():
+            results = model.test_step(pseudo_collate(data))
+        # 박스는 타일 크기 기준으로 복원되어 나옴
+        store = results_to_store(list(range(len(crops))), results)
+        return [store.slice(row) for row in range(len(crops))]
+
+    labels_list, scores_list, boxes_list = [], [], []
+    with tqdm(total=len(image_paths), desc="Processing images (tiled)", disable=not progress) as pbar:
+        # batch_size개 이미지의 타일을 한꺼번에 넘겨 이미지 경계와 상관없이 타일을 batch_size개씩 채워서 추론
+        for _, images in prefetch_batches(image_paths, load_image, batch_size, workers):
+            for labels, scores, boxes in tiled_predict(images, predict, tile_size, overlap, batch_size, full_image,
+                                                       method, iou_thr):
+                labels_list.append(labels)
+                scores_list.append(scores)
+                boxes_list.append(boxes)
+            pbar.update(len(images))
+    return PredictionStore.from_lists(image_ids, labels_list, scores_list, boxes_list)
+
+def main(config_name, model_epoch, image_folder='../../dataset/test', output=None, batch_size=8, device=None,
+         save_csv=True, workers=4, precision=None, views=None, merge=None, merge_iou=None, tile_size=None,
+         tile_overlap=0.2, full_image=True):
+    config_file = f'../custom_configs/{config_name}.py'  # 모델 설정 파일 경로
     checkpoint_file = f'../work_dirs/{config_name}/epoch_{model_epoch}.pth'  # 체크포인트 파일 경로
 
-    # 이미지 경로 및 결과 저장 경로 설정
-    image_folder = '../../dataset/test'  # 테스트 이미지 폴더 경로
-    output_csv = f'../output/{config_name}_output_predictions.csv'  # 출력 CSV 파일 경로
+    # 결과 저장 경로 (컬럼형 바이너리 예측 저장소)
+    if output is None:
+        output = f'../output/{config_name}_output_predictions.npz'
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
 
     # 모델 초기화
     print("Initializing model...")
-    model = init_detector(config_file, checkpoint_file, device='cuda:0')  # GPU 사용
-
-    # 결과 저장 리스트
-    results = []
+    model, test_pipeline = load_model(config_file, checkpoint_file, device)
+    print(f"Using device: {next(model.parameters()).device}")
 
     # 이미지 파일 목록 생성 (jpg, png 파일만 선택)
     image_files = [f for f in sorted(os.listdir(image_folder)) if f.endswith(('.jpg', '.png'))]
+    image_paths = [os.path.join(image_folder, image_name) for image_name in image_files]
+    image_ids = [f'test/{image_name}' for image_name in image_files]  # 이미지 ID 형식 지정
 
     # 이미지 추론
     print("Starting inference...")
-    for image_name in tqdm(image_files, desc="Processing images"):
-        img_path = os.path.join(image_folder, image_name)
-        result = inference_detector(model, img_path)  # 모델을 사용하여 이미지에 대한 추론 수행
-
-        # DetDataSample에서 결과 추출
-        prediction_string = []
-        if hasattr(result, 'pred_instances'):
-            det_samples = result.pred_instances  # 예측 결과의 인스턴스들
-            if det_samples is not None:
-                bboxes = det_samples.bboxes  # 바운딩 박스 좌표
-                scores = det_samples.scores  # 예측 신뢰도 점수
-                labels = det_samples.labels  # 예측 클래스 레이블
-
-                # 각 예측에 대한 문자열 생성
-                for j in range(len(bboxes)):
-                    prediction_string.append(
-                        f"{int(labels[j])} {scores[j]:.4f} {bboxes[j][0]:.2f} {bboxes[j][1]:.2f} {bboxes[j][2]:.2f} {bboxes[j][3]:.2f}"
-                    )
-
-        # 결과를 리스트에 추가
-        results.append({
-            'PredictionString': " ".join(prediction_string),  # 모든 예측을 하나의 문자열로 결합
-            'image_id': f'test/{image_name}'  # 이미지 ID 형식 지정
-        })
-
-    # 데이터프레임 생성
-    print("Creating DataFrame...")
-    df = pd.DataFrame(results)
-
-    # CSV 파일로 저장
-    print(f"Saving results to {output_csv}...")
-    df.to_csv(output_csv, index=False)
-    print(f"Inference complete. Results saved to {output_csv}")
+    if tile_size:
+        # 겹치는 타일로 나누어 추론한 뒤 merge 방식(기본값 nms, IoU 0.5)으로 경계의 중복 박스 병합 (큰 img_scale 대신 사용)
+        store = run_tiled(model, image_paths, image_ids, tile_size, tile_overlap, batch_size, workers, merge or 'nms',
+                          0.5 if merge_iou is None else merge_iou, full_image)
+    elif views:
+        # 배율/반전 view별로 추론한 뒤 merge 방식(기본값 wbf, IoU 0.55)으로 병합 (배율마다 따로 추론한 CSV를 앙상블하지 않아도 됨)
+        views = [parse_view(spec) for spec in views]
+        store, timing = run_tta(model, image_paths, image_ids, views, batch_size, workers, merge or 'wbf',
+                                0.55 if merge_iou is None else merge_iou)
+        print_timing(timing, views, len(image_paths))
+    else:
+        store = run_inference(model, test_pipeline, image_paths, image_ids, batch_size, workers)
+
+    # 예측 저장소로 저장하고, 제출용 CSV도 함께 저장
+    print(f"Saving results to {output}...")
+    save_predictions(store, output, precision)
+    if save_csv and not output.endswith('.csv'):
+        save_predictions(store, os.path.splitext(output)[0] + '.csv', precision)
+    print(f"Inference complete. Results saved to {output}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Batched MMDetection inference on the test images')
+    parser.add_argument('--config_name', type=str, default='deformable-detr-refine-twostage_r50_16xb2-50e_coco_trash',
+                        help='Config name under ../custom_configs')
+    parser.add_argument('--epoch', type=int, default=50, help='Checkpoint epoch (default: 50)')
+    parser.add_argument('--image_folder', type=str, default='../../dataset/test', help='Test image folder')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Output path (.npz, .parquet, .npy directory or .csv), '
+                             'default: ../output/{config_name}_output_predictions.npz')
+    parser.add_argument('--batch_size', type=int, default=8, help='Images per forward pass (default: 8)')
+    # 지정하지 않으면 GPU가 있을 때 cuda:0, 없으면 CPU
+    parser.add_argument('--device', type=str, default=None, help='Device, e.g. cuda:0 or cpu (default: auto)')
+    # 다음 배치의 이미지 디코딩/리사이즈를 추론과 동시에 처리할 스레드 수
+    parser.add_argument('--workers', type=int, default=4, help='Image loading threads, 0 to load synchronously (default: 4)')
+    parser.add_argument('--precision', type=int, default=None,
+                        help='Decimal places in the CSV (default: shortest lossless float32 representation)')
+    parser.add_argument('--no_csv', action='store_true', help='Do not write the submission CSV next to the output')
+    # 배율은 설정 파일의 테스트 Resize/Pad 크기에 곱해짐 (예: 1 1:h 0.8 1.2)
+    parser.add_argument('--views', type=str, nargs='+', default=None,
+                        help='TTA views as scale[:flips] with flips h and/or v (default: single view, no TTA)')
+    parser.add_argument('--merge', type=str, default=None, choices=['nms', 'soft_nms', 'nmw', 'wbf'],
+                        help='How to merge the TTA views or tiles (default: wbf for views, nms for tiles)')
+    parser.add_argument('--merge_iou', type=float, default=None,
+                        help='TTA/tile merge IoU threshold (default: 0.55 for views, 0.5 for tiles)')
+    # 작은 물체(배터리 등)를 위해 img_scale을 키우는 대신 겹치는 타일로 추론
+    parser.add_argument('--tile_size', type=int, default=None,
+                        help='Run sliced inference with square tiles of this many pixels (default: off)')
+    parser.add_argument('--tile_overlap', type=float, default=0.2, help='Overlap ratio between tiles (default: 0.2)')
+    parser.add_argument('--no_full_image', action='store_true',
+                        help='Do not add the whole-image prediction (objects cut by tile seams are rebuilt from their pieces)')
+    args = parser.parse_args()
+    if args.tile_size and args.views:
+        parser.error('--tile_size and --views cannot be combined')
+
+    main(args.config_name, args.epoch, args.image_folder, args.output, args.batch_size, args.device,
+         save_csv=not args.no_csv, workers=args.workers, precision=args.precision, views=args.views,
+         merge=args.merge, merge_iou=args.merge_iou, tile_size=args.tile_size, tile_overlap=args.tile_overlap,
+         full_image=not args.no_full_image)
@@ -1,48 +1,105 @@
-import json
+import os
+import sys
+import argparse
+import numpy as np
 
-def merge_coco_jsons(json_file1, json_file2, output_file):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'eda_and_ensemble'))
+from build_cache import BuildCache, file_digest, fingerprint
+from coco_dataset import CocoDataset
+from coco_io import JSON_BACKEND
+
+def dedupe_images(datasets, keep='first'):
+    """
+    여러 데이터셋에 같은 file_name의 이미지가 있으면 하나만 남김 (해당 이미지의 annotation도 함께 제거)
+
+    :param datasets: CocoDataset 리스트 (병합 순서)
+    :param keep: 'first'면 앞쪽 데이터셋, 'last'면 뒤쪽 데이터셋의 이미지를 유지 (예: 최신 pseudo-label 라운드)
+    :return: (중복을 제거한 CocoDataset 리스트, 제거한 이미지 수)
+    """
+    if keep not in ('first', 'last'):
+        raise ValueError("Invalid keep. Choose from 'first' or 'last'.")
+
+    seen = set()
+    deduped = [None] * len(datasets)
+    num_removed = 0
+    # keep='last'이면 데이터셋과 이미지를 뒤에서부터 확인 (같은 데이터셋 안의 중복도 뒤쪽을 유지)
+    for i in (range(len(datasets)) if keep == 'first' else reversed(range(len(datasets)))):
+        file_names = [img['file_name'] for img in datasets[i].images]
+        rows = []
+        for row in (range(len(file_names)) if keep == 'first' else reversed(range(len(file_names)))):
+            if file_names[row] not in seen:
+                seen.add(file_names[row])
+                rows.append(row)
+        num_removed += len(file_names) - len(rows)
+        deduped[i] = datasets[i] if len(rows) == len(file_names) else datasets[i].subset(np.sort(rows))
+    return deduped, num_removed
+
+def merge_datasets(datasets, dedupe=None):
+    """
+    여러 CocoDataset을 하나로 병합
+
+    첫 번째 데이터셋의 id는 유지하고, 이후 데이터셋의 이미지/annotation id는 앞선 결과의 최대 id 다음 번호부터
+    배열 연산으로 다시 매긴다. 카테고리는 첫 번째 데이터셋 기준으로 이름이 같은지 확인하고 id를 맞춘다.
+
+    :param datasets: CocoDataset 리스트 (첫 번째가 기본 데이터셋)
+    :param dedupe: None이면 그대로 병합, 'first'/'last'면 같은 file_name의 이미지는 하나만 유지
+    :return: 병합된 CocoDataset
     """
-    두 개의 COCO 형식 JSON 파일을 병합
-    
-    :param json_file1: 첫 번째 JSON 파일 경로 (기본 데이터셋)
-    :param json_file2: 두 번째 JSON 파일 경로 (추가할 데이터셋)
+    categories = datasets[0].categories
+    datasets = [dataset.remap_categories(categories) for dataset in datasets]
+    if dedupe is not None:
+        datasets, num_removed = dedupe_images(datasets, dedupe)
+        print(f"Removed {num_removed} duplicate images")
+
+    merged = [datasets[0]]
+    next_image_id = int(datasets[0].image_ids.max(initial=-1)) + 1
+    next_ann_id = int(datasets[0].ann_ids.max(initial=-1)) + 1
+    for dataset in datasets[1:]:
+        merged.append(dataset.renumber(image_start=next_image_id, ann_start=next_ann_id))
+        next_image_id += len(dataset)
+        next_ann_id += dataset.num_annotations
+    return CocoDataset.concat(merged)
+
+def merge_coco_jsons(json_files, output_file, dedupe=None):
+    """
+    여러 개의 COCO 형식 JSON 파일을 병합
+
+    :param json_files: JSON 파일 경로 리스트 (첫 번째가 기본 데이터셋, 이후는 추가할 데이터셋)
     :param output_file: 병합된 결과를 저장할 JSON 파일 경로
+    :param dedupe: 같은 file_name의 이미지 처리 방법 (None, 'first', 'last')
+    :return: 병합을 새로 수행했으면 True (입력 JSON 내용이 이전 실행과 같으면 건너뜀)
     """
-    # JSON 파일 로드
-    with open(json_file1, 'r') as f1, open(json_file2, 'r') as f2:
-        data1 = json.load(f1)
-        data2 = json.load(f2)
-
-    # 이미지 병합
-    max_image_id = max(img['id'] for img in data1['images'])
-    image_id_map = {}
-    for img in data2['images']:
-        old_id = img['id']
-        new_id = max_image_id + 1
-        image_id_map[old_id] = new_id  # 이미지 ID 매핑 저장
-        img['id'] = new_id  # 새 이미지 ID 할당
-        data1['images'].append(img)
-        max_image_id = new_id
-
-    # 어노테이션 병합
-    max_ann_id = max(ann['id'] for ann in data1['annotations'])
-    for ann in data2['annotations']:
-        ann['id'] = max_ann_id + 1  # 새 어노테이션 ID 할당
-        ann['image_id'] = image_id_map[ann['image_id']]  # 이미지 ID 업데이트
-        data1['annotations'].append(ann)
-        max_ann_id += 1
-
-    # 카테고리는 동일하다고 가정하므로 병합하지 않음
-
-    # 병합된 데이터를 새 JSON 파일로 저장
-    with open(output_file, 'w') as f:
-        json.dump(data1, f)
-
-# 사용 예시
-train_json = '../../dataset/json/splits/train_fold4.json'  # 기본 학습 데이터셋
-pseudo_json = '../../dataset/json/pseudo_labels.json'  # 의사 레이블 데이터셋
-merged_json = '../../dataset/json/merged_train_pseudo.json'  # 병합된 결과 파일
-
-# JSON 파일 병합 실행
-merge_coco_jsons(train_json, pseudo_json, merged_json)
-print(f"Merged JSON saved to {merged_json}")
\ No newline at end of file
+    cache = BuildCache(os.path.join(os.path.dirname(output_file) or '.', '.build_cache.json'))
+    merge_key = fingerprint(*[file_digest(json_file) for json_file in json_files], dedupe, JSON_BACKEND)
+    if cache.is_fresh(output_file, merge_key, [output_file]):
+        return False
+
+    # JSON 파일 로드 후 병합
+    merged = merge_datasets([CocoDataset.load(json_file) for json_file in json_files], dedupe)
+    print(f"Merged {len(json_files)} files: {len(merged)} images, {merged.num_annotations} annotations")
+
+    # 병합된 데이터를 새 JSON 파일로 저장 (annotation을 하나씩 생성하며 기록, 내용이 바뀐 경우에만)
+    merged.save(output_file, if_changed=True)
+    cache.update(output_file, merge_key)
+    return True
+
+if __name__ == "__main__":
+    # 사용 예시
+    train_json = '../../dataset/json/splits/train_fold4.json'  # 기본 학습 데이터셋
+    pseudo_json = '../../dataset/json/pseudo_labels.json'  # 의사 레이블 데이터셋
+    merged_json = '../../dataset/json/merged_train_pseudo.json'  # 병합된 결과 파일
+
+    parser = argparse.ArgumentParser(description='Merge COCO JSON files into one dataset')
+    parser.add_argument('--inputs', nargs='+', type=str, default=[train_json, pseudo_json],
+                        help='COCO JSON files to merge, the first one keeps its ids')
+    parser.add_argument('--output', type=str, default=merged_json, help='Merged COCO JSON path')
+    # 같은 file_name의 이미지가 여러 파일에 있을 때 유지할 쪽 (예: pseudo-label 라운드를 여러 번 병합할 때 last)
+    parser.add_argument('--dedupe', type=str, default=None, choices=['first', 'last'],
+                        help='Keep one image per file_name (default: keep all)')
+    args = parser.parse_args()
+
+    # JSON 파일 병합 실행
+    if merge_coco_jsons(args.inputs, args.output, args.dedupe):
+        print(f"Merged JSON saved to {args.output}")
+    else:
+        print(f"Merged JSON is up to date: {args.output}")
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 스크립트와 같이 eda_and_ensemble, yolo 모듈을 최상위 모듈로 import
+for directory in ('eda_and_ensemble', 'yolo'):
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', directory))
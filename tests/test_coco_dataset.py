@@ -0,0 +1,41 @@
+from coco_dataset import CocoDataset
+from coco_io import load_coco
+
+
+def make_coco(segmentation=True):
+    images = [{'id': i, 'file_name': f'train/{i:04d}.jpg', 'width': 1024, 'height': 1024} for i in range(4)]
+    annotations = []
+    for i in range(4):
+        for k in range(i + 1):
+            ann = {'image_id': i, 'category_id': k, 'area': 100.0, 'bbox': [10.0 * k, 20.0, 10.0, 10.0],
+                   'iscrowd': 0, 'id': len(annotations)}
+            if segmentation:
+                ann['segmentation'] = [[10.0 * k, 20.0, 10.0 * k + 10.0, 20.0, 10.0 * k + 10.0, 30.0]]
+            annotations.append(ann)
+    return {'info': {'year': 2024}, 'images': images, 'annotations': annotations,
+            'categories': [{'id': c, 'name': str(c)} for c in range(4)]}
+
+
+def test_extra_annotation_keys_round_trip(tmp_path):
+    data = make_coco()
+    dataset = CocoDataset.from_coco(data)
+    assert dataset.to_coco() == data
+
+    path = str(tmp_path / 'train.json')
+    dataset.save(path)
+    assert load_coco(path) == data
+
+
+def test_extra_annotation_keys_follow_subset_and_concat():
+    data = make_coco()
+    dataset = CocoDataset.from_coco(data)
+    subset = dataset.subset([3, 1])
+    expected = [ann for i in (3, 1) for ann in data['annotations'] if ann['image_id'] == i]
+    assert subset.to_coco()['annotations'] == expected
+
+    # 나머지 키가 없는 데이터셋과 합쳐도 각 annotation의 키가 유지됨
+    plain = CocoDataset.from_coco(make_coco(segmentation=False)).renumber(image_start=4, ann_start=10)
+    assert plain.ann_extra is None
+    merged = CocoDataset.concat([subset, plain]).to_coco()['annotations']
+    assert all('segmentation' in ann for ann in merged[:len(expected)])
+    assert not any('segmentation' in ann for ann in merged[len(expected):])
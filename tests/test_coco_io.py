@@ -0,0 +1,17 @@
+import numpy as np
+
+import coco_io
+
+
+def test_dumps_accepts_numpy_values():
+    data = {'id': np.int64(3), 'area': np.float64(12.5), 'bbox': np.array([1.0, 2.0, 3.0, 4.0])}
+    assert coco_io.loads(coco_io.dumps(data)) == {'id': 3, 'area': 12.5, 'bbox': [1.0, 2.0, 3.0, 4.0]}
+
+
+def test_save_coco_if_changed(tmp_path):
+    data = {'images': [{'id': i, 'file_name': f'train/{i:04d}.jpg'} for i in range(5)], 'annotations': []}
+    for name in ('a.json', 'a.json.gz'):
+        path = str(tmp_path / name)
+        assert coco_io.save_coco(data, path, chunk_size=2)
+        assert not coco_io.save_coco(data, path, chunk_size=3, if_changed=True)
+        assert coco_io.load_coco(path) == data
@@ -0,0 +1,20 @@
+import pytest
+
+from ensemble import build_parser
+
+
+def test_common_arguments_before_sweep_are_kept():
+    args = build_parser().parse_args(['--workers', '3', '--backend', 'ensemble_boxes', '--output', 'x.csv',
+                                      'sweep', '--submissions', 'a.csv'])
+    assert (args.command, args.workers, args.backend, args.output) == ('sweep', 3, 'ensemble_boxes', 'x.csv')
+
+
+def test_common_arguments_after_sweep_are_kept():
+    args = build_parser().parse_args(['sweep', '--submissions', 'a.csv', '--workers', '4'])
+    assert (args.workers, args.backend, args.output) == (4, 'numpy', None)
+
+
+@pytest.mark.parametrize('argv', [[], ['sweep', '--submissions', 'a.csv']])
+def test_common_argument_defaults(argv):
+    args = build_parser().parse_args(argv)
+    assert (args.workers, args.backend, args.output) == (1, 'numpy', None)
@@ -0,0 +1,96 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from evaluate import GroundTruth, evaluate_detections, summarize
+from prediction_store import PredictionStore
+
+coco = pytest.importorskip('pycocotools.coco')
+cocoeval = pytest.importorskip('pycocotools.cocoeval')
+
+NUM_CLASSES = 5
+
+
+def make_data(seed):
+    """
+    pycocotools와 비교할 가상 정답/예측 생성
+
+    이미지 id는 정렬되지 않은 순서로 두고, crowd 정답과 소수점 2자리 동점 점수를 포함하며,
+    클래스 3은 정답만 있고 클래스 4는 예측만 있다. 첫 이미지에는 max_dets(100)를 넘는 예측을 넣는다.
+    """
+    rng = np.random.default_rng(seed)
+    image_ids = rng.permutation(np.arange(1, 16)).tolist()
+    images, annotations, detections = [], [], []
+    for n, image_id in enumerate(image_ids):
+        file_name = f'train/{image_id:04d}.jpg'
+        images.append({'id': image_id, 'file_name': file_name, 'width': 1024, 'height': 1024})
+
+        num_gt = int(rng.integers(0, 8))
+        gt_labels = rng.integers(0, 4, num_gt)
+        xy = np.round(rng.uniform(0, 800, (num_gt, 2)), 1)
+        wh = np.round(rng.uniform(10, 200, (num_gt, 2)), 1)
+        crowd = rng.uniform(size=num_gt) < 0.15
+        for label, (x, y), (w, h), iscrowd in zip(gt_labels.tolist(), xy.tolist(), wh.tolist(), crowd.tolist()):
+            annotations.append({'id': len(annotations) + 1, 'image_id': image_id, 'category_id': label,
+                                'bbox': [x, y, w, h], 'area': w * h, 'iscrowd': int(iscrowd)})
+
+        # 정답 근처의 예측(클래스 3 제외)과 무작위 오검출
+        hits = gt_labels != 3
+        near = np.c_[xy, xy + wh][hits] + rng.normal(0, 6, (int(hits.sum()), 4))
+        num_random = 130 if n == 0 else int(rng.integers(0, 10))
+        random_xy = rng.uniform(0, 900, (num_random, 2))
+        boxes = np.concatenate([near, np.c_[random_xy, random_xy + rng.uniform(10, 120, (num_random, 2))]])
+        labels = np.concatenate([gt_labels[hits], rng.choice([0, 1, 2, 4], num_random)])
+        scores = np.round(rng.uniform(0, 1, len(labels)), 2)
+        detections.append((file_name, labels, scores, boxes))
+
+    gt_data = {'images': images, 'annotations': annotations,
+               'categories': [{'id': c, 'name': str(c)} for c in range(NUM_CLASSES)]}
+    store = PredictionStore.from_lists(*(list(column) for column in zip(*detections)))
+    return gt_data, store
+
+
+def cocoeval_precision(gt_data, store):
+    """pycocotools COCOeval(bbox, area=all, maxDets=100)의 보간된 precision 배열"""
+    id_of_file = {img['file_name']: img['id'] for img in gt_data['images']}
+    results = []
+    for row, file_name in enumerate(store.image_ids):
+        labels, scores, boxes = store.slice(row)
+        # 저장소와 같은 float32 좌표를 xywh로 전달 (x + w가 원래 x2와 정확히 같음)
+        boxes = boxes.astype(np.float64)
+        for label, score, (x1, y1, x2, y2) in zip(labels.tolist(), scores.tolist(), boxes.tolist()):
+            results.append({'image_id': id_of_file[file_name], 'category_id': label, 'score': score,
+                            'bbox': [x1, y1, x2 - x1, y2 - y1]})
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        coco_gt = coco.COCO()
+        coco_gt.dataset = gt_data
+        coco_gt.createIndex()
+        coco_eval = cocoeval.COCOeval(coco_gt, coco_gt.loadRes(results), 'bbox')
+        coco_eval.evaluate()
+        coco_eval.accumulate()
+    # (클래스, IoU 임계값, recall) 순서의 연속 배열 (AP를 evaluate.py와 같은 순서로 더하도록)
+    return np.ascontiguousarray(coco_eval.eval['precision'][:, :, :, 0, -1].transpose(2, 0, 1))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_cocoeval(seed):
+    gt_data, store = make_data(seed)
+    gt = GroundTruth(gt_data)
+    ap, category_ids = evaluate_detections(store, gt)
+    per_class, map50, map50_95 = summarize(ap, category_ids, gt)
+
+    precision = cocoeval_precision(gt_data, store)
+    has_gt = precision[:, 0, 0] > -1
+    # 정답만 있는 클래스 3은 AP 0, 예측만 있는 클래스 4는 평가 제외
+    assert has_gt.tolist() == [True, True, True, True, False]
+    assert ap[3].max() == 0 and np.isnan(per_class['AP50'][4])
+
+    np.testing.assert_array_equal(ap, np.where(has_gt[:, None], precision.mean(axis=2), -1))
+    np.testing.assert_allclose(per_class['AP50'][has_gt], precision[has_gt, 0].mean(axis=1), rtol=0, atol=1e-16)
+    np.testing.assert_allclose(per_class['AP50:95'][has_gt], precision[has_gt].mean(axis=(1, 2)), rtol=0,
+                               atol=1e-16)
+    assert map50 == pytest.approx(precision[has_gt, 0].mean(), abs=1e-16)
+    assert map50_95 == pytest.approx(precision[has_gt].mean(), abs=1e-16)
@@ -0,0 +1,22 @@
+import numpy as np
+
+from filter_low_confidence import confidence_mask
+from prediction_store import PredictionStore
+
+
+def make_store(scores, labels=None):
+    scores = np.asarray(scores, dtype=np.float32)
+    labels = np.zeros(len(scores), dtype=np.int64) if labels is None else np.asarray(labels)
+    return PredictionStore(['test/0000.jpg'], [0, len(scores)], labels, scores, np.zeros((len(scores), 4)))
+
+
+def test_score_equal_to_threshold_is_kept():
+    # CSV의 "0.0100", "0.7000"은 float32로 저장되어 파이썬 float보다 약간 작아짐
+    store = make_store([0.01, 0.7, 0.0099])
+    assert confidence_mask(store, 0.01).tolist() == [True, True, False]
+    assert confidence_mask(store, 0.7).tolist() == [False, True, False]
+
+
+def test_class_threshold_equal_to_score_is_kept():
+    store = make_store([0.05, 0.05], labels=[0, 8])
+    assert confidence_mask(store, 0.1, {8: 0.05}).tolist() == [False, True]
@@ -0,0 +1,96 @@
+import contextlib
+import io
+import warnings
+
+import numpy as np
+import pytest
+
+import fusion
+
+ensemble_boxes = pytest.importorskip('ensemble_boxes')
+
+METHODS = [
+    ('nms', fusion.nms, ensemble_boxes.nms, dict(iou_thr=0.5)),
+    ('soft_nms', fusion.soft_nms, ensemble_boxes.soft_nms, dict(iou_thr=0.5, sigma=0.1)),
+    ('nmw', fusion.non_maximum_weighted, ensemble_boxes.non_maximum_weighted, dict(iou_thr=0.55)),
+] + [
+    (f'wbf-{conf_type}', fusion.weighted_boxes_fusion, ensemble_boxes.weighted_boxes_fusion,
+     dict(iou_thr=0.55, conf_type=conf_type))
+    for conf_type in ['avg', 'max', 'box_and_model_avg', 'absent_model_aware_avg']
+]
+
+
+def random_predictions(rng, decimals):
+    """같은 객체에 대해 모델마다 조금씩 다른 박스를 예측한 상황 (decimals가 작을수록 동점이 많음)"""
+    num_models, num_boxes = rng.integers(1, 6), rng.integers(1, 300)
+    base = np.concatenate([rng.uniform(0, 0.9, (num_boxes, 2)), rng.uniform(0.01, 0.2, (num_boxes, 2))], axis=1)
+    base[:, 2:] += base[:, :2]
+    labels = rng.integers(0, 10, num_boxes)
+    boxes_list, scores_list, labels_list = [], [], []
+    for _ in range(num_models):
+        keep = rng.uniform(size=num_boxes) < 0.9
+        boxes_list.append(base[keep] + rng.normal(0, 0.01, (keep.sum(), 4)))
+        scores_list.append(np.round(rng.uniform(0, 1, keep.sum()), decimals))
+        labels_list.append(labels[keep])
+    weights = list(rng.uniform(0.5, 2, num_models)) if rng.uniform() < 0.5 else None
+    return boxes_list, scores_list, labels_list, weights
+
+
+def run_reference(reference, boxes_list, scores_list, labels_list, weights, kwargs):
+    # ensemble_boxes는 입력 리스트를 수정하고 범위를 벗어난 박스마다 경고를 출력함
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        return reference([b.copy() for b in boxes_list], [s.copy() for s in scores_list],
+                         [l.copy() for l in labels_list], weights=weights, **kwargs)
+
+
+def assert_same(expected, actual, atol=1e-5):
+    # 출력 순서는 점수 동점에서 달라질 수 있으므로 (label, x1, y1, score) 기준으로 정렬 후 비교
+    # 점수가 0인 박스만 모인 NMW/WBF 클러스터는 ensemble_boxes와 같이 좌표가 NaN
+    expected_boxes, expected_scores, expected_labels = expected
+    actual_boxes, actual_scores, actual_labels = actual
+    assert len(actual_scores) == len(expected_scores)
+    e = np.lexsort((expected_scores, expected_boxes[:, 1], expected_boxes[:, 0], expected_labels))
+    a = np.lexsort((actual_scores, actual_boxes[:, 1], actual_boxes[:, 0], actual_labels))
+    np.testing.assert_array_equal(actual_labels[a], expected_labels[e])
+    np.testing.assert_allclose(actual_scores[a], expected_scores[e], atol=atol)
+    np.testing.assert_allclose(actual_boxes[a], expected_boxes[e], atol=atol)
+
+
+@pytest.mark.parametrize('name, ours, reference, kwargs', METHODS, ids=[m[0] for m in METHODS])
+@pytest.mark.parametrize('decimals', [6, 2], ids=['continuous', 'tied'])
+def test_matches_ensemble_boxes(name, ours, reference, kwargs, decimals):
+    if name == 'nms' and decimals == 2:
+        pytest.skip('NMS breaks ties in input order, see test_nms_breaks_ties_in_input_order')
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        boxes_list, scores_list, labels_list, weights = random_predictions(rng, decimals)
+        expected = run_reference(reference, boxes_list, scores_list, labels_list, weights, kwargs)
+        # 점수가 0인 박스만 모인 클러스터의 0 / 0 경고는 ensemble_boxes와 같은 동작이므로 무시
+        with np.errstate(invalid='ignore'):
+            actual = ours(boxes_list, scores_list, labels_list, weights=weights, **kwargs)
+        assert_same(expected, actual)
+
+
+def test_nms_breaks_ties_in_input_order():
+    """
+    동점인 박스는 입력 순서(모델 순서, 모델 안에서는 박스 순서)가 앞선 박스를 먼저 처리
+
+    ensemble_boxes는 numba 안에서 정렬하여 동점 순서가 다르므로, 입력 순서대로 아주 작은 값을 빼서
+    동점을 없앤 입력에 대한 ensemble_boxes 결과와 비교한다.
+    """
+    rng = np.random.default_rng(0)
+    num_differs = 0
+    for _ in range(100):
+        boxes_list, scores_list, labels_list, weights = random_predictions(rng, 2)
+        offsets = np.cumsum([0] + [len(s) for s in scores_list])
+        untied = [s - 1e-9 * (start + np.arange(len(s))) for s, start in zip(scores_list, offsets[:-1])]
+
+        actual = fusion.nms(boxes_list, scores_list, labels_list, weights=weights)
+        assert_same(run_reference(ensemble_boxes.nms, boxes_list, untied, labels_list, weights, {}), actual)
+        try:
+            assert_same(run_reference(ensemble_boxes.nms, boxes_list, scores_list, labels_list, weights, {}), actual)
+        except AssertionError:
+            num_differs += 1
+    # 동점 순서가 실제로 결과에 영향을 주는 입력이 포함되어 있는지 확인
+    assert num_differs > 0
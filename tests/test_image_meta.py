@@ -0,0 +1,29 @@
+import pytest
+
+from image_meta import ImageMeta
+
+
+def make_meta(file_names):
+    return ImageMeta(range(len(file_names)), file_names, [100] * len(file_names), [80] * len(file_names))
+
+
+def test_row_matches_full_path_or_unique_name():
+    meta = make_meta(['test/0000.jpg', 'test/0001.jpg'])
+    assert meta.row('test/0001.jpg') == 1
+    assert meta.row('0001.jpg') == 1
+    assert meta.size('0000.jpg') == (100, 80)
+
+
+def test_row_does_not_match_other_directory():
+    meta = make_meta(['test/0000.jpg'])
+    with pytest.raises(KeyError):
+        meta.row('train/0000.jpg')
+
+
+def test_row_rejects_ambiguous_name():
+    meta = make_meta(['train/0000.jpg', 'test/0000.jpg', 'test/0001.jpg'])
+    assert meta.row('train/0000.jpg') == 0
+    assert meta.row('test/0000.jpg') == 1
+    with pytest.raises(KeyError):
+        meta.row('0000.jpg')
+    assert meta.row('0001.jpg') == 2
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from evaluate import GroundTruth, match_detections, evaluate_detections, summarize
+from filter_low_confidence import confidence_mask
+from optimize_thresholds import select_class_thresholds, estimate_filter
+from prediction_store import PredictionStore
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(0)
+    images, annotations = [], []
+    image_ids, labels_list, scores_list, boxes_list = [], [], [], []
+    for i in range(12):
+        file_name = f'train/{i:04d}.jpg'
+        images.append({'id': i, 'file_name': file_name, 'width': 1024, 'height': 1024})
+        # 클래스 0~2는 예측이 있고, 클래스 3은 정답만 있음
+        gt_labels = rng.integers(0, 4, 6)
+        xy = rng.uniform(0, 800, (6, 2))
+        wh = rng.uniform(20, 200, (6, 2))
+        for label, (x, y), (w, h) in zip(gt_labels.tolist(), xy.tolist(), wh.tolist()):
+            annotations.append({'id': len(annotations) + 1, 'image_id': i, 'category_id': label,
+                                'bbox': [x, y, w, h], 'area': w * h, 'iscrowd': 0})
+
+        # 정답 근처의 예측과 무작위 오검출 (클래스 4는 정답이 없음), 점수는 CSV처럼 소수점 2자리로 동점을 만듦
+        hits = gt_labels < 3
+        boxes = np.concatenate([np.c_[xy, xy + wh][hits] + rng.normal(0, 8, (hits.sum(), 4)),
+                                np.c_[xy[:4], xy[:4] + 50] + rng.uniform(-300, 300, (4, 4)),
+                                rng.uniform(0, 900, (20, 2)) @ np.array([[1, 0, 1, 0], [0, 1, 0, 1]]) +
+                                [0, 0, 60, 60]])
+        labels = np.concatenate([gt_labels[hits], rng.integers(0, 3, 4), rng.choice([0, 1, 2, 4], 20)])
+        scores = np.round(rng.uniform(0, 1, len(labels)), 2)
+        image_ids.append(file_name)
+        labels_list.append(labels)
+        scores_list.append(scores)
+        boxes_list.append(boxes)
+
+    gt = GroundTruth({'images': images, 'annotations': annotations,
+                      'categories': [{'id': c, 'name': str(c)} for c in range(5)]})
+    store = PredictionStore.from_lists(image_ids, labels_list, scores_list, boxes_list)
+    return store, gt
+
+
+@pytest.mark.parametrize('top_k', [None, 3, 8, 15])
+@pytest.mark.parametrize('objective,tolerance', [('map', 0.0), ('size', 0.05)])
+def test_estimate_matches_filtered_evaluation(data, top_k, objective, tolerance):
+    store, gt = data
+    matches = match_detections(store, gt, iou_thrs=np.array([0.5]))
+    selected = select_class_thresholds(store, gt, matches, top_k, objective, tolerance)
+    map50, size = estimate_filter(store, gt, selected, top_k)
+
+    class_thresholds = {c: threshold for c, (threshold, _, _) in selected.items()}
+    filtered = store.filter(confidence_mask(store, 0.0, class_thresholds, top_k))
+    _, expected_map50, _ = summarize(*evaluate_detections(filtered, gt), gt)
+    assert map50 == pytest.approx(expected_map50, abs=1e-12)
+    assert size == filtered.num_detections
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from tiling import tile_windows, tiled_predict
+
+# 클래스별 물체 하나씩 (전체 이미지 기준 xyxy)
+OBJECTS = {
+    1: [100, 300, 900, 400],  # 모든 타일보다 큰 물체 (여러 타일 경계에 잘림)
+    2: [600, 600, 650, 650],  # 타일 안에 온전히 들어가는 작은 물체
+    3: [480, 50, 560, 100],   # 한 타일에서는 잘리고 이웃 타일에서는 온전히 보이는 물체
+}
+
+
+def draw_image(width=1024, height=1024):
+    image = np.zeros((height, width, 1), dtype=np.uint8)
+    for label, (x1, y1, x2, y2) in OBJECTS.items():
+        image[y1:y2, x1:x2] = label
+    return image
+
+
+def predict_fn(crops):
+    """타일에 보이는 클래스별 영역의 외접 박스를 그대로 예측하는 가짜 모델"""
+    outputs = []
+    for crop in crops:
+        labels, boxes = [], []
+        for label in np.unique(crop[crop > 0]).tolist():
+            ys, xs = np.nonzero(crop[..., 0] == label)
+            labels.append(label)
+            boxes.append([xs.min(), ys.min(), xs.max() + 1, ys.max() + 1])
+        outputs.append((np.array(labels), np.full(len(labels), 0.9), np.array(boxes, dtype=np.float32)))
+    return outputs
+
+
+def test_tile_windows_cover_image():
+    windows = tile_windows(1024, 700, tile_size=512, overlap=0.2)
+    assert windows[:, 0].min() == 0 and windows[:, 2].max() == 1024
+    assert windows[:, 1].min() == 0 and windows[:, 3].max() == 700
+    assert np.all(windows[:, 2:] - windows[:, :2] <= 512)
+
+
+@pytest.mark.parametrize('full_image', [True, False])
+def test_cut_objects_are_joined_across_tiles(full_image):
+    [(labels, scores, boxes)] = tiled_predict([draw_image()], predict_fn, tile_size=512, overlap=0.2,
+                                              batch_size=4, full_image=full_image)
+    assert sorted(labels.tolist()) == sorted(OBJECTS)
+    for label, box in zip(labels.tolist(), boxes.tolist()):
+        np.testing.assert_allclose(box, OBJECTS[label])
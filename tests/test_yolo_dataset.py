@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+from yolo_dataset import coco2yolo, link_images
+
+
+def make_split(image_ids):
+    return {'images': [{'id': i, 'file_name': f'train/{i:04d}.jpg', 'width': 100, 'height': 100}
+                       for i in image_ids],
+            'annotations': [{'id': i, 'image_id': i, 'category_id': 0, 'bbox': [10, 10, 20, 20], 'area': 400,
+                             'iscrowd': 0} for i in image_ids],
+            'categories': [{'id': 0, 'name': 'General trash'}]}
+
+
+@pytest.mark.parametrize('mode', ['hardlink', 'symlink', 'copy'])
+def test_rebuild_removes_images_that_left_the_split(tmp_path, mode):
+    src_dir = tmp_path / 'train'
+    src_dir.mkdir()
+    for i in range(6):
+        (src_dir / f'{i:04d}.jpg').write_bytes(b'image')
+
+    # 이미지 2, 3이 train에서 val로 옮겨가는 두 번의 분할
+    for train_ids, val_ids in (([0, 1, 2, 3], [4, 5]), ([0, 1, 4], [2, 3, 5])):
+        for split, image_ids in (('train', train_ids), ('val', val_ids)):
+            data = make_split(image_ids)
+            link_images(data, str(src_dir), str(tmp_path / 'images' / split), mode=mode, progress=False)
+            coco2yolo(data, str(tmp_path / 'labels' / split), progress=False)
+
+        for split, image_ids in (('train', train_ids), ('val', val_ids)):
+            assert sorted(os.listdir(tmp_path / 'images' / split)) == [f'{i:04d}.jpg' for i in image_ids]
+            assert sorted(os.listdir(tmp_path / 'labels' / split)) == [f'{i:04d}.txt' for i in image_ids]
@@ -1,23 +1,20 @@
-import json
+import os
+import sys
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eda_and_ensemble'))
+from coco_dataset import CocoDataset
+
 def load_json(file_path):
-    """JSON 파일을 로드"""
-    with open(file_path, 'r') as f:
-        return json.load(f)
+    """JSON 파일을 annotation 배열 데이터셋으로 로드"""
+    return CocoDataset.load(file_path)
 
 def get_class_distribution(data):
     """데이터셋의 클래스 분포를 계산"""
-    class_counts = {}
-    for ann in data['annotations']:
-        category_id = ann['category_id']
-        if category_id not in class_counts:
-            class_counts[category_id] = 0
-        class_counts[category_id] += 1
-    return class_counts
+    return data.class_counts()
 
 def plot_class_distribution(distributions, title):
     """클래스 분포를 히트맵으로 시각화"""
@@ -1,166 +1,204 @@
-import json
 import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
-import yaml
-import random
-import shutil
-import pandas as pd
 import numpy as np
 from iterstrat.ml_stratifiers import MultilabelStratifiedKFold
-from sklearn.preprocessing import MultiLabelBinarizer
 
-def convert_bbox_coco2yolo(img_width, img_height, bbox):
-    """
-    COCO 형식의 바운딩 박스를 YOLO 형식으로 변환
-    COCO bbox: [x_min, y_min, width, height]
-    YOLO bbox: [x_center, y_center, width, height] (모두 0~1로 정규화)
-    """
-    x_min, y_min, width, height = bbox
-
-    x_center = (x_min + width / 2) / img_width
-    y_center = (y_min + height / 2) / img_height
-    width = width / img_width
-    height = height / img_height
-
-    return [x_center, y_center, width, height]
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eda_and_ensemble'))
+from build_cache import BuildCache, file_digest, fingerprint
+from coco_dataset import CocoDataset
+from coco_io import JSON_BACKEND, load_coco
+from yolo_dataset import LINK_MODES, coco2yolo, link_images, link_split_dirs, write_image_list, write_dataset_yaml
 
-def split_coco_data(json_file, n_splits=5):
+def split_coco_data(json_file, n_splits=5, seed=42):
     """
     COCO 데이터를 MultilabelStratifiedKFold를 사용하여 n_splits개의 폴드로 분할
-    """
-    with open(json_file, 'r') as f:
-        data = json.load(f)
-
-    # 데이터프레임으로 변환
-    df = pd.DataFrame(data['images'])
-
-    # 이미지 id를 기준으로 annotation에서 레이블을 추출
-    image_labels = {image['id']: [] for image in data['images']}
 
-    # 각 이미지에 해당하는 레이블 추가
-    for annotation in data['annotations']:
-        image_id = annotation['image_id']
-        category_id = annotation['category_id']
-        image_labels[image_id].append(category_id)
+    mmdetection/scripts/split_coco_data.py와 같은 방식으로 분할하므로 같은 시드면 두 파이프라인의 fold가 일치한다.
 
-    # 각 이미지의 멀티라벨 리스트를 데이터프레임에 추가
-    df['labels'] = df['id'].map(image_labels)
+    :return: 각 fold의 (train, validation) CocoDataset 튜플 리스트
+    """
+    # JSON 파일 로드 (annotation은 이미지별로 묶인 배열로 보관)
+    dataset = CocoDataset.load(json_file)
 
-    # MultiLabelBinarizer를 사용하여 멀티라벨을 이진 매트릭스로 변환
-    mlb = MultiLabelBinarizer()
-    y = mlb.fit_transform(df['labels'])
+    # 이미지별 멀티라벨 이진 매트릭스 (MultiLabelBinarizer와 같은 결과)
+    y, _ = dataset.label_matrix()
 
     # MultilabelStratifiedKFold 사용
-    mskf = MultilabelStratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
-
-    # 각 fold에 대한 데이터 생성
-    fold_data = []
-    for fold, (train_idx, val_idx) in enumerate(mskf.split(df, y), 1):
-        train_df = df.iloc[train_idx]
-        val_df = df.iloc[val_idx]
-
-        train_annotations = [ann for ann in data['annotations'] if ann['image_id'] in train_df['id'].values]
-        val_annotations = [ann for ann in data['annotations'] if ann['image_id'] in val_df['id'].values]
+    mskf = MultilabelStratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed)
 
-        train_data = {
-            'images': train_df.to_dict(orient='records'),
-            'annotations': train_annotations,
-            'categories': data['categories']
-        }
-        val_data = {
-            'images': val_df.to_dict(orient='records'),
-            'annotations': val_annotations,
-            'categories': data['categories']
-        }
+    # 각 fold의 이미지 행 번호로 annotation 구간을 잘라 fold 데이터 생성
+    return [(dataset.subset(train_idx), dataset.subset(val_idx))
+            for train_idx, val_idx in mskf.split(np.zeros((len(dataset), 1)), y)]
 
-        fold_data.append((train_data, val_data))
+# 파이프라인 단계별 입력 키 기록 (중단 후 다시 실행하거나 입력이 같으면 완료된 단계는 건너뜀)
+BUILD_CACHE = '../dataset/.yolo_build_cache.json'
+# fold 분할 시드
+SPLIT_SEED = 42
 
-    return fold_data
-
-def coco2yolo(coco_data, output_path):
-    """
-    COCO 데이터를 YOLO 형식으로 변환
+def stage_outputs(name, fold_layout='list'):
     """
-    os.makedirs(output_path, exist_ok=True)
-
-    image_id_to_name = {img['id']: img['file_name'] for img in coco_data['images']}
-    category_id_to_index = {cat['id']: idx for idx, cat in enumerate(coco_data['categories'])}
+    단계가 만드는 주요 출력 경로 (하나라도 없으면 완료 기록이 있어도 다시 실행)
 
-    for img in tqdm(coco_data['images'], desc="Converting annotations"):
-        img_id = img['id']
-        img_name = image_id_to_name[img_id]
-        img_width = img['width']
-        img_height = img['height']
-
-        label_name = os.path.splitext(os.path.basename(img_name))[0] + '.txt'
-        label_path = os.path.join(output_path, label_name)
-
-        annotations = [ann for ann in coco_data['annotations'] if ann['image_id'] == img_id]
+    :param name: 단계 이름 ('shared', 'fold{n}', 'test')
+    :param fold_layout: fold 구성 방식 ('list' 또는 'directory')
+    :return: 파일 또는 디렉토리 경로 리스트
+    """
+    if name == 'shared':
+        return ['../dataset/images/train_all', '../dataset/labels/train_all']
+    if name == 'test':
+        return ['../dataset/images/test', '../dataset/labels/test']
+
+    fold = int(name[len('fold'):])
+    outputs = [f'../dataset/json/train_yolo_fold{fold}.json', f'../dataset/json/val_yolo_fold{fold}.json',
+               f'../dataset/yaml/dataset_fold{fold}.yaml']
+    if fold_layout == 'list':
+        # 목록 파일과 목록 파일이 가리키는 split별 디렉토리 링크 (링크가 끊어져도 다시 실행)
+        outputs += [f'../dataset/train_yolo_fold{fold}.txt', f'../dataset/val_yolo_fold{fold}.txt']
+        outputs += [f'../dataset/{kind}/list_{split}_fold{fold}' for kind in ('images', 'labels')
+                    for split in ('train', 'val')]
+    else:
+        outputs += [f'../dataset/{kind}/{split}_yolo_fold{fold}' for kind in ('images', 'labels')
+                    for split in ('train', 'val')]
+    return outputs
+
+def prepare_shared(link_mode, io_workers):
+    """list 구성에서 모든 fold가 공유하는 전체 학습 이미지/라벨 디렉토리 생성"""
+    train_all = load_coco('../dataset/json/train.json')
+    link_images(train_all, '../dataset/train', '../dataset/images/train_all', mode=link_mode,
+                workers=io_workers, progress=False)
+    coco2yolo(train_all, '../dataset/labels/train_all', workers=io_workers, progress=False)
+
+def prepare_fold(fold, train_data, val_data, fold_layout, link_mode, io_workers):
+    """한 fold의 JSON, 이미지 목록(또는 이미지/라벨 디렉토리), 데이터셋 YAML 생성"""
+    # 각 폴드의 train과 validation 데이터를 JSON으로 저장
+    train_data.save(f'../dataset/json/train_yolo_fold{fold}.json', if_changed=True)
+    val_data.save(f'../dataset/json/val_yolo_fold{fold}.json', if_changed=True)
+    # 이미지 배치와 라벨 변환은 COCO 형식의 딕셔너리를 사용
+    train_data, val_data = train_data.to_coco(), val_data.to_coco()
+
+    if fold_layout == 'list':
+        # 공유 디렉토리의 이미지를 split별 디렉토리 링크를 거쳐 가리키는 목록 파일 생성 (라벨 캐시는 split별로 생성됨)
+        train_dir = link_split_dirs('../dataset', 'train_all', f'list_train_fold{fold}')
+        val_dir = link_split_dirs('../dataset', 'train_all', f'list_val_fold{fold}')
+        write_image_list(train_data, f'../dataset/train_yolo_fold{fold}.txt', train_dir)
+        write_image_list(val_data, f'../dataset/val_yolo_fold{fold}.txt', val_dir)
+        train_path, val_path = f'train_yolo_fold{fold}.txt', f'val_yolo_fold{fold}.txt'
+    else:
+        # 이미지 배치 (링크 또는 복사)
+        link_images(train_data, '../dataset/train', f'../dataset/images/train_yolo_fold{fold}', mode=link_mode,
+                    workers=io_workers, progress=False)
+        link_images(val_data, '../dataset/train', f'../dataset/images/val_yolo_fold{fold}', mode=link_mode,
+                    workers=io_workers, progress=False)
+
+        # COCO 형식을 YOLO 형식으로 변환
+        coco2yolo(train_data, f'../dataset/labels/train_yolo_fold{fold}', workers=io_workers, progress=False)
+        coco2yolo(val_data, f'../dataset/labels/val_yolo_fold{fold}', workers=io_workers, progress=False)
+        train_path, val_path = f'images/train_yolo_fold{fold}', f'images/val_yolo_fold{fold}'
 
-        with open(label_path, 'w') as f:
-            for ann in annotations:
-                category_index = category_id_to_index[ann['category_id']]
-                bbox = convert_bbox_coco2yolo(img_width, img_height, ann['bbox'])
-                f.write(f"{category_index} {' '.join([str(x) for x in bbox])}\n")
+    # YOLO 데이터셋 설정 파일 생성
+    write_dataset_yaml(f'../dataset/yaml/dataset_fold{fold}.yaml', train_path, val_path, train_data['categories'])
 
-    print(f"Conversion complete. YOLO format labels saved in {output_path}")
-    return coco_data['categories']
+def prepare_test(link_mode, io_workers):
+    """테스트 데이터의 이미지와 라벨 디렉토리 생성"""
+    test_data = load_coco('../dataset/json/test.json')
+    coco2yolo(test_data, '../dataset/labels/test', workers=io_workers, progress=False)
+    link_images(test_data, '../dataset/test', '../dataset/images/test', mode=link_mode,
+                workers=io_workers, progress=False)
 
-def copy_images(coco_data, src_dir, dst_dir):
+def main(n_splits=5, fold_layout='list', link_mode='hardlink', workers=4, io_workers=8, force=False):
     """
-    이미지를 소스 디렉토리에서 대상 디렉토리로 복사
+    YOLO 학습용 K-fold 데이터셋 생성 파이프라인
+
+    공유 이미지/라벨, fold별 데이터, 테스트 데이터 단계를 프로세스 풀에서 동시에 실행하고
+    각 단계 안의 파일 입출력은 스레드로 처리한다. 완료된 단계는 입력(JSON 상태와 설정)과 함께 기록되어
+    중단 후 다시 실행하면 입력이 바뀌지 않았고 출력이 남아 있는 단계는 건너뛴다.
+    입력(train.json 내용 등)이 바뀐 단계도 JSON, 라벨, 이미지 중 내용이 달라진 파일만 다시 기록한다.
+
+    :param n_splits: fold 수
+    :param fold_layout: 'list' (공유 이미지 + fold별 목록 파일) 또는 'directory' (fold별 디렉토리)
+    :param link_mode: 이미지 배치 방법 (hardlink, symlink, reflink, copy)
+    :param workers: 동시에 실행할 단계(프로세스) 수
+    :param io_workers: 단계마다 파일 입출력에 사용할 스레드 수
+    :param force: 완료 기록을 무시하고 모든 단계를 다시 실행
     """
-    os.makedirs(dst_dir, exist_ok=True)
-    for img in tqdm(coco_data['images'], desc=f"Copying images to {dst_dir}"):
-        file_name = img['file_name']
-        if file_name.startswith('train/') or file_name.startswith('test/'):
-            file_name = os.path.basename(file_name)
-        src_path = os.path.join(src_dir, file_name)
-        dst_path = os.path.join(dst_dir, file_name)
-        if os.path.exists(src_path):
-            shutil.copy(src_path, dst_path)
+    os.makedirs('../dataset/json', exist_ok=True)
+    os.makedirs('../dataset/yaml', exist_ok=True)
+    train_json, test_json = '../dataset/json/train.json', '../dataset/json/test.json'
+
+    # 단계별 입력 키 (JSON 내용 해시와 설정값)
+    cache = BuildCache(BUILD_CACHE)
+    train_digest, test_digest = file_digest(train_json), file_digest(test_json)
+    fingerprints = {}
+    if fold_layout == 'list':
+        fingerprints['shared'] = fingerprint(train_digest, link_mode)
+    for fold in range(1, n_splits + 1):
+        # fold JSON의 bytes는 JSON 백엔드에 따라 달라지므로 키에 포함
+        fingerprints[f'fold{fold}'] = fingerprint(train_digest, n_splits, SPLIT_SEED, fold_layout, link_mode, fold,
+                                                  JSON_BACKEND)
+    fingerprints['test'] = fingerprint(test_digest, link_mode)
+
+    pending = [name for name, key in fingerprints.items()
+               if force or not cache.is_fresh(name, key, stage_outputs(name, fold_layout))]
+    skipped = [name for name in fingerprints if name not in pending]
+    if skipped:
+        print(f"Skipping completed stages: {', '.join(skipped)}")
+
+    # COCO 데이터를 n_splits개의 폴드로 분할 (다시 만들 fold가 있을 때만)
+    fold_data = None
+    if any(name.startswith('fold') for name in pending):
+        fold_data = split_coco_data(train_json, n_splits=n_splits, seed=SPLIT_SEED)
+
+    # (단계 이름, 실행 함수, 인자) 목록 구성
+    stages = []
+    for name in pending:
+        if name == 'shared':
+            stages.append((name, prepare_shared, (link_mode, io_workers)))
+        elif name == 'test':
+            stages.append((name, prepare_test, (link_mode, io_workers)))
         else:
-            print(f"Warning: Source file not found: {src_path}")
-
-# 메인 실행 부분
-# COCO 데이터를 5개의 폴드로 분할
-fold_data = split_coco_data('../dataset/json/train.json', n_splits=5)
-
-# 각 폴드에 대해 처리
-for fold, (train_data, val_data) in enumerate(fold_data, 1):
-    # 각 폴드의 train과 validation 데이터를 JSON으로 저장
-    with open(f'../dataset/json/train_yolo_fold{fold}.json', 'w') as f:
-        json.dump(train_data, f)
-    with open(f'../dataset/json/val_yolo_fold{fold}.json', 'w') as f:
-        json.dump(val_data, f)
-
-    # 이미지 복사
-    copy_images(train_data, '../dataset/train', f'../dataset/images/train_yolo_fold{fold}')
-    copy_images(val_data, '../dataset/train', f'../dataset/images/val_yolo_fold{fold}')
-
-    # COCO 형식을 YOLO 형식으로 변환
-    train_categories = coco2yolo(train_data, f'../dataset/labels/train_yolo_fold{fold}')
-    val_categories = coco2yolo(val_data, f'../dataset/labels/val_yolo_fold{fold}')
-
-    # YOLO 데이터셋 설정 파일 생성
-    dataset_config = {
-        'path': '../../dataset',
-        'train': f'images/train_yolo_fold{fold}',
-        'val': f'images/val_yolo_fold{fold}',
-        'test': 'images/test',
-        'nc': len(train_categories),  # 클래스 수
-        'names': [cat['name'] for cat in train_categories]
-    }
-
-    with open(f'../dataset/yaml/dataset_fold{fold}.yaml', 'w') as f:
-        yaml.dump(dataset_config, f)
-
-    print(f"Dataset configuration for fold {fold} saved as dataset_fold{fold}.yaml")
-
-# 테스트 데이터 처리
-with open('../dataset/json/test.json', 'r') as f:
-    test_data = json.load(f)
-test_categories = coco2yolo(test_data, '../dataset/labels/test')
-copy_images(test_data, '../dataset/test', '../dataset/images/test')
-
-print("All folds processed and saved.")
\ No newline at end of file
+            fold = int(name[len('fold'):])
+            train_data, val_data = fold_data[fold - 1]
+            stages.append((name, prepare_fold, (fold, train_data, val_data, fold_layout, link_mode, io_workers)))
+
+    errors = []
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(func, *args): name for name, func, args in stages}
+        with tqdm(total=len(futures), desc="Preparing YOLO dataset") as pbar:
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                    cache.update(name, fingerprints[name])
+                except Exception as e:
+                    errors.append((name, e))
+                    print(f"Stage {name} failed: {e}")
+                pbar.set_postfix_str(name)
+                pbar.update(1)
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} stage(s) failed, run again to resume: "
+                           f"{', '.join(name for name, _ in errors)}")
+    print("All folds processed and saved.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert COCO annotations to K-fold YOLO datasets')
+    parser.add_argument('--n_splits', type=int, default=5, help='Number of folds (default: 5)')
+    # fold 구성 방식
+    # - 'list': 전체 학습 이미지/라벨을 한 번만 만들고 fold별로 이미지 목록(.txt) 파일만 생성
+    # - 'directory': fold마다 이미지/라벨 디렉토리를 따로 생성
+    parser.add_argument('--layout', type=str, default='list', choices=['list', 'directory'],
+                        help='Fold layout (default: list)')
+    # 이미지 배치 방법, 링크가 불가능하면 복사
+    parser.add_argument('--link_mode', type=str, default='hardlink', choices=list(LINK_MODES),
+                        help='How images are placed (default: hardlink)')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='Number of stages processed concurrently (default: 4)')
+    parser.add_argument('--io_workers', type=int, default=8,
+                        help='Threads per stage for file I/O (default: 8)')
+    parser.add_argument('--force', action='store_true', help='Ignore completed stage records and rebuild everything')
+    args = parser.parse_args()
+
+    main(args.n_splits, args.layout, args.link_mode, args.workers, args.io_workers, args.force)
@@ -1,32 +1,17 @@
-import json
 import os
-from tqdm import tqdm
-import yaml
+import sys
 import random
-import shutil
-import numpy as np
 
-def convert_bbox_coco2yolo(img_width, img_height, bbox):
-    """
-    COCO 형식의 바운딩 박스를 YOLO 형식으로 변환
-    COCO bbox: [x_min, y_min, width, height]
-    YOLO bbox: [x_center, y_center, width, height] (모두 0~1로 정규화)
-    """
-    x_min, y_min, width, height = bbox
-
-    x_center = (x_min + width / 2) / img_width
-    y_center = (y_min + height / 2) / img_height
-    width = width / img_width
-    height = height / img_height
-
-    return [x_center, y_center, width, height]
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eda_and_ensemble'))
+from yolo_dataset import coco2yolo, link_images, write_dataset_yaml
+from build_cache import BuildCache, file_digest, fingerprint
+from coco_io import JSON_BACKEND, load_coco, save_coco
 
 def split_coco_data(json_file, train_ratio=0.8, random_seed=42):
     """
     COCO 데이터를 훈련 세트와 검증 세트로 무작위 분할
     """
-    with open(json_file, 'r') as f:
-        data = json.load(f)
+    data = load_coco(json_file)
 
     random.seed(random_seed)
     
@@ -53,89 +38,51 @@ def split_coco_data(json_file, train_ratio=0.8, random_seed=42):
 
     return train_data, val_data
 
-def coco2yolo(coco_data, output_path):
-    """
-    COCO 데이터를 YOLO 형식으로 변환
-    """
-    os.makedirs(output_path, exist_ok=True)
-
-    # 이미지 ID와 파일 이름, 카테고리 ID와 인덱스 매핑
-    image_id_to_name = {img['id']: img['file_name'] for img in coco_data['images']}
-    category_id_to_index = {cat['id']: idx for idx, cat in enumerate(coco_data['categories'])}
-
-    for img in tqdm(coco_data['images'], desc="Converting annotations"):
-        img_id = img['id']
-        img_name = image_id_to_name[img_id]
-        img_width = img['width']
-        img_height = img['height']
-
-        label_name = os.path.splitext(os.path.basename(img_name))[0] + '.txt'
-        label_path = os.path.join(output_path, label_name)
-
-        annotations = [ann for ann in coco_data['annotations'] if ann['image_id'] == img_id]
-
-        with open(label_path, 'w') as f:
-            for ann in annotations:
-                category_index = category_id_to_index[ann['category_id']]
-                bbox = convert_bbox_coco2yolo(img_width, img_height, ann['bbox'])
-                f.write(f"{category_index} {' '.join([str(x) for x in bbox])}\n")
-
-    print(f"Conversion complete. YOLO format labels saved in {output_path}")
-    return coco_data['categories']
-
-def copy_images(coco_data, src_dir, dst_dir):
-    """
-    이미지를 소스 디렉토리에서 대상 디렉토리로 복사
-    """
-    os.makedirs(dst_dir, exist_ok=True)
-    for img in tqdm(coco_data['images'], desc=f"Copying images to {dst_dir}"):
-        file_name = img['file_name']
-        if file_name.startswith('train/') or file_name.startswith('test/'):
-            file_name = os.path.basename(file_name)
-        src_path = os.path.join(src_dir, file_name)
-        dst_path = os.path.join(dst_dir, file_name)
-        if os.path.exists(src_path):
-            shutil.copy(src_path, dst_path)
-        else:
-            print(f"Warning: Source file not found: {src_path}")
-
 # 메인 실행 부분
-# COCO 데이터를 훈련 세트와 검증 세트로 분할
-train_data, val_data = split_coco_data('../dataset/json/train.json', train_ratio=0.8, random_seed=42)
-
-# 분할된 데이터를 JSON 파일로 저장
-with open('../dataset/json/train_yolo.json', 'w') as f:
-    json.dump(train_data, f)
-with open('../dataset/json/val_yolo.json', 'w') as f:
-    json.dump(val_data, f)
-
-# 이미지 파일 복사
-copy_images(train_data, '../dataset/train', '../dataset/images/train_yolo')
-copy_images(val_data, '../dataset/train', '../dataset/images/val_yolo')
-
-# COCO 형식을 YOLO 형식으로 변환
-train_categories = coco2yolo(train_data, '../dataset/labels/train_yolo')
-val_categories = coco2yolo(val_data, '../dataset/labels/val_yolo')
-
-# YOLO 데이터셋 설정 파일 생성
-dataset_config = {
-    'path': '../../dataset',
-    'train': 'images/train_yolo',
-    'val': 'images/val_yolo',
-    'test': 'images/test',
-    'nc': len(train_categories),  # 클래스 수
-    'names': [cat['name'] for cat in train_categories]
-}
-
-with open('../dataset/yaml/dataset.yaml', 'w') as f:
-    yaml.dump(dataset_config, f)
-
-print("Dataset configuration saved as dataset.yaml")
+# 라벨 파일 기록에 사용할 스레드 수
+num_workers = min(8, os.cpu_count() or 1)
+# 이미지 배치 방법 (hardlink, symlink, reflink, copy), 링크가 불가능하면 복사
+link_mode = 'hardlink'
+
+# 입력(JSON 내용 해시, 분할 비율, 시드, JSON 백엔드)이 같으면 이전 결과를 재사용
+cache = BuildCache('../dataset/.yolo_build_cache.json')
+train_ratio, random_seed = 0.8, 42
+split_key = fingerprint(file_digest('../dataset/json/train.json'), train_ratio, random_seed, link_mode, JSON_BACKEND)
+
+# 결과 파일이 지워졌으면 입력이 같아도 다시 생성
+split_outputs = ['../dataset/json/train_yolo.json', '../dataset/json/val_yolo.json', '../dataset/yaml/dataset.yaml'] + \
+    [f'../dataset/{kind}/{split}_yolo' for kind in ('images', 'labels') for split in ('train', 'val')]
+if cache.is_fresh('random_split', split_key, split_outputs):
+    print("Train/validation split is up to date")
+else:
+    # COCO 데이터를 훈련 세트와 검증 세트로 분할
+    train_data, val_data = split_coco_data('../dataset/json/train.json', train_ratio=train_ratio,
+                                           random_seed=random_seed)
+
+    # 분할된 데이터를 JSON 파일로 저장 (내용이 바뀐 경우에만)
+    save_coco(train_data, '../dataset/json/train_yolo.json', if_changed=True)
+    save_coco(val_data, '../dataset/json/val_yolo.json', if_changed=True)
+
+    # 이미지 파일 배치 (링크 또는 복사)
+    link_images(train_data, '../dataset/train', '../dataset/images/train_yolo', mode=link_mode)
+    link_images(val_data, '../dataset/train', '../dataset/images/val_yolo', mode=link_mode)
+
+    # COCO 형식을 YOLO 형식으로 변환 (바뀐 라벨 파일만 기록)
+    coco2yolo(train_data, '../dataset/labels/train_yolo', workers=num_workers)
+    coco2yolo(val_data, '../dataset/labels/val_yolo', workers=num_workers)
+
+    # YOLO 데이터셋 설정 파일 생성
+    write_dataset_yaml('../dataset/yaml/dataset.yaml', 'images/train_yolo', 'images/val_yolo', train_data['categories'])
+    cache.update('random_split', split_key)
+
+    print("Dataset configuration saved as dataset.yaml")
 
 # 테스트 데이터 처리
-with open('../dataset/json/test.json', 'r') as f:
-    test_data = json.load(f)
-test_categories = coco2yolo(test_data, '../dataset/labels/test')
-copy_images(test_data, '../dataset/test', '../dataset/images/test')
-
-print("All data processed and saved.")
\ No newline at end of file
+test_key = fingerprint(file_digest('../dataset/json/test.json'), link_mode)
+if not cache.is_fresh('test', test_key, ['../dataset/images/test', '../dataset/labels/test']):
+    test_data = load_coco('../dataset/json/test.json')
+    coco2yolo(test_data, '../dataset/labels/test', workers=num_workers)
+    link_images(test_data, '../dataset/test', '../dataset/images/test', mode=link_mode)
+    cache.update('test', test_key)
+
+print("All data processed and saved.")
@@ -1,65 +1,211 @@
 from ultralytics import YOLO
-import csv
+import numpy as np
 import os
+import sys
+import argparse
+from tqdm import tqdm
 
-def xywh_to_xyxy(x_center, y_center, width, height):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eda_and_ensemble'))
+from image_loader import load_image, prefetch_batches
+from prediction_store import PredictionStore, save_predictions
+from tiling import tiled_predict
+from tta import parse_view, group_by_scale, flip_image, unflip_boxes, merge_views
+
+def result_to_arrays(result):
+    """
+    Ultralytics Results 하나의 박스를 배열로 한 번에 추출
+
+    :param result: 이미지 하나의 Results
+    :return: (labels, scores, xyxy 박스) NumPy 배열
+    """
+    boxes = result.boxes
+    return (boxes.cls.cpu().numpy().astype(np.int64), boxes.conf.cpu().numpy().astype(np.float32),
+            boxes.xyxy.cpu().numpy().astype(np.float32).reshape(-1, 4))
+
+def run_inference(model, image_paths, image_ids, batch_size=16, workers=4, augment=True, progress=True):
+    """
+    이미지를 batch_size개씩 묶어 추론
+
+    다음 배치의 이미지는 workers개의 스레드에서 미리 디코딩하고, 배치를 리스트로 한 번에 넘겨
+    stream=True로 결과를 이미지별로 받는다.
+
+    :param model: YOLO 모델
+    :param image_paths: 이미지 파일 경로 리스트
+    :param image_ids: 결과에 기록할 이미지 ID 리스트
+    :param batch_size: 한 번에 추론할 이미지 수
+    :param workers: 이미지를 미리 디코딩할 스레드 수 (0이면 추론 직전에 순서대로 디코딩)
+    :param augment: 테스트 시 augmentation(TTA) 적용 여부
+    :param progress: 진행 상황 출력 여부
+    :return: 모든 이미지의 예측을 담은 PredictionStore
+    """
+    labels_list, scores_list, boxes_list = [], [], []
+    with tqdm(total=len(image_paths), desc="Processing images", disable=not progress) as pbar:
+        for _, images in prefetch_batches(image_paths, load_image, batch_size, workers):
+            # 경로를 넘길 때와 같은 BGR 배열이므로 결과는 동일
+            for result in model(images, augment=augment, stream=True, verbose=False):
+                labels, scores, boxes = result_to_arrays(result)
+                labels_list.append(labels)
+                scores_list.append(scores)
+                boxes_list.append(boxes)
+            pbar.update(len(images))
+    return PredictionStore.from_lists(image_ids, labels_list, scores_list, boxes_list)
+
+def view_imgsz(scale, base_imgsz=640, stride=32):
+    """TTA 배율에 맞는 입력 크기 (모델 stride의 배수로 반올림)"""
+    return max(stride, int(round(base_imgsz * scale / stride)) * stride)
+
+def model_imgsz(model):
+    """학습 시 사용한 입력 크기 (정보가 없으면 Ultralytics 기본값 640)"""
+    imgsz = model.overrides.get('imgsz', 640)
+    return imgsz if isinstance(imgsz, int) else max(imgsz)
+
+def predict_views(model, images, views, base_imgsz=640):
+    """
+    배치의 모든 이미지에 대해 TTA view별 예측을 수행하고 원본 이미지 좌표로 복원
+
+    같은 배율의 view(반전 조합)는 입력 크기가 같으므로 배치 이미지 전체와 함께 한 번의 forward pass로 처리한다.
+    Ultralytics는 리사이즈를 되돌린 원본 크기 좌표를 반환하므로 반전만 되돌리면 된다.
+
+    :param model: YOLO 모델
+    :param images: BGR 이미지 배열 리스트
+    :param views: View 리스트
+    :param base_imgsz: 배율 1.0의 입력 크기
+    :return: {view: [(labels, scores, xyxy 박스)] (이미지 순서)}
     """
-    중심 좌표와 너비, 높이를 xmin, ymin, xmax, ymax로 변환
-    
-    :param x_center: 바운딩 박스의 중심 x 좌표
-    :param y_center: 바운딩 박스의 중심 y 좌표
-    :param width: 바운딩 박스의 너비
-    :param height: 바운딩 박스의 높이
-    :return: xmin, ymin, xmax, ymax 좌표
+    outputs = {}
+    for scale, group in group_by_scale(views):
+        inputs = [flip_image(image, view) for view in group for image in images]
+        results = iter(model(inputs, imgsz=view_imgsz(scale, base_imgsz), augment=False, stream=True, verbose=False))
+        for view in group:
+            outputs[view] = []
+            for image in images:
+                labels, scores, boxes = result_to_arrays(next(results))
+                height, width = image.shape[:2]
+                outputs[view].append((labels, scores, unflip_boxes(boxes, view, width, height)))
+    return outputs
+
+def run_tta(model, image_paths, image_ids, views, batch_size=8, workers=4, method='wbf', iou_thr=0.55,
+            base_imgsz=None, progress=True):
+    """
+    설정한 view로 TTA 추론을 수행하고 이미지별로 병합 (Ultralytics의 고정된 augment=True 대신 사용)
+
+    :param views: View 리스트 (예: [parse_view('1'), parse_view('1:h')])
+    :param batch_size: 한 번에 읽을 이미지 수 (forward pass 크기는 batch_size x 같은 배율의 view 수)
+    :param method: view 병합 방식 ('nms', 'soft_nms', 'nmw', 'wbf')
+    :param iou_thr: 병합 IoU 임계값
+    :param base_imgsz: 배율 1.0의 입력 크기 (None이면 모델의 학습 입력 크기)
+    :return: 병합된 PredictionStore
+    """
+    base_imgsz = base_imgsz or model_imgsz(model)
+    stores = []
+    with tqdm(total=len(image_paths), desc="Processing images (TTA)", disable=not progress) as pbar:
+        for batch_items, images in prefetch_batches(list(zip(image_paths, image_ids)), lambda item: load_image(item[0]),
+                                                    batch_size, workers):
+            batch_ids = [image_id for _, image_id in batch_items]
+            outputs = predict_views(model, images, views, base_imgsz)
+            view_stores = [PredictionStore.from_lists(batch_ids, *zip(*outputs[view])) for view in views]
+            image_sizes = [(image.shape[1], image.shape[0]) for image in images]
+            stores.append(merge_views(view_stores, image_sizes, method, iou_thr))
+            pbar.update(len(images))
+    return PredictionStore.concat(stores)
+
+def run_tiled(model, image_paths, image_ids, tile_size=640, overlap=0.2, batch_size=16, workers=4, method='nms',
+              iou_thr=0.5, full_image=True, imgsz=None, progress=True):
+    """
+    이미지를 겹치는 타일로 나누어 추론하고 경계의 중복 박스를 병합 (sliced inference)
+
+    입력 크기를 키우는 대신 타일을 모델 입력 크기로 추론하므로, 작은 물체의 recall을 높이면서도
+    메모리 사용량은 batch_size개 타일의 forward pass로 제한된다.
+
+    :param tile_size: 타일 한 변의 크기 (원본 픽셀)
+    :param overlap: 이웃한 타일이 겹치는 비율
+    :param batch_size: 한 번에 추론할 타일 수 (이미지도 batch_size개씩 묶어 디코딩)
+    :param method: 타일 병합 방식 ('nms', 'soft_nms', 'nmw', 'wbf')
+    :param iou_thr: 병합 IoU 임계값
+    :param full_image: 전체 이미지 예측도 함께 병합할지 여부 (False이면 잘린 물체를 타일 조각으로만 복원)
+    :param imgsz: 타일의 모델 입력 크기 (None이면 모델의 학습 입력 크기)
+    :return: 병합된 PredictionStore
     """
-    xmin = x_center - width / 2
-    ymin = y_center - height / 2
-    xmax = x_center + width / 2
-    ymax = y_center + height / 2
-    return xmin, ymin, xmax, ymax
+    imgsz = imgsz or model_imgsz(model)
 
-def main():
+    def predict(crops):
+        results = model(crops, imgsz=imgsz, augment=False, stream=True, verbose=False)
+        return [result_to_arrays(result) for result in results]
+
+    labels_list, scores_list, boxes_list = [], [], []
+    with tqdm(total=len(image_paths), desc="Processing images (tiled)", disable=not progress) as pbar:
+        # batch_size개 이미지의 타일을 한꺼번에 넘겨 이미지 경계와 상관없이 타일을 batch_size개씩 채워서 추론
+        for _, images in prefetch_batches(image_paths, load_image, batch_size, workers):
+            for labels, scores, boxes in tiled_predict(images, predict, tile_size, overlap, batch_size, full_image,
+                                                       method, iou_thr):
+                labels_list.append(labels)
+                scores_list.append(scores)
+                boxes_list.append(boxes)
+            pbar.update(len(images))
+    return PredictionStore.from_lists(image_ids, labels_list, scores_list, boxes_list)
+
+def main(weights, test_dir='../dataset/test', output='submission.npz', batch_size=16, workers=4, save_csv=True,
+         precision=None, views=None, merge=None, merge_iou=None, imgsz=None, tile_size=None, tile_overlap=0.2,
+         full_image=True):
     # YOLO 모델 로드
-    model = YOLO('CV Object Detection/yolo11x_fold4/weights/best.pt')  # 학습된 모델 경로
-    
-    # 테스트 데이터 디렉토리 경로
-    test_dir = '../dataset/test'
-
-    # 결과를 저장할 리스트 초기화
-    results_list = []
-
-    # 테스트 이미지에 대해 추론 수행
-    for img_name in sorted(os.listdir(test_dir)):
-        img_path = os.path.join(test_dir, img_name)
-        # 모델을 사용하여 이미지에 대한 예측 수행 (augment=True로 설정하여 테스트 시 augmentation 적용)
-        results = model(img_path, augment=True)
-
-        # 결과 처리
-        predictions = []
-        for r in results:
-            boxes = r.boxes
-            for box in boxes:
-                # 바운딩 박스 좌표 추출 및 변환
-                x_center, y_center, width, height = box.xywh[0]  # xywh 포맷으로 변환
-                xmin, ymin, xmax, ymax = xywh_to_xyxy(x_center, y_center, width, height)
-                conf = box.conf[0]  # 신뢰도 점수
-                cls = int(box.cls[0])  # 예측된 클래스
-                # 예측 결과를 문자열로 포맷팅
-                predictions.append(f"{cls} {conf:.16f} {xmin:.16f} {ymin:.16f} {xmax:.16f} {ymax:.16f}")
-        
-        # 이미지 ID 생성 (test/0001.jpg 형식)
-        image_id = f"test/{img_name}"
-
-        # 결과 리스트에 추가
-        results_list.append([' '.join(predictions), image_id])
-
-    # 결과를 CSV 파일로 저장
-    with open('submission.csv', 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['PredictionString', 'image_id'])  # CSV 헤더 작성
-        writer.writerows(results_list)  # 예측 결과 작성
-
-    print("Inference complete. Results saved to submission.csv")
+    model = YOLO(weights)
+
+    # 테스트 이미지 목록과 이미지 ID (test/0001.jpg 형식)
+    img_names = sorted(os.listdir(test_dir))
+    image_paths = [os.path.join(test_dir, img_name) for img_name in img_names]
+    image_ids = [f"test/{img_name}" for img_name in img_names]
+
+    if tile_size:
+        # 겹치는 타일로 나누어 추론한 뒤 merge 방식(기본값 nms, IoU 0.5)으로 경계의 중복 박스 병합
+        store = run_tiled(model, image_paths, image_ids, tile_size, tile_overlap, batch_size, workers, merge or 'nms',
+                          0.5 if merge_iou is None else merge_iou, full_image, imgsz)
+    elif views:
+        # 지정한 배율/반전 view로 추론한 뒤 merge 방식(기본값 wbf, IoU 0.55)으로 병합
+        store = run_tta(model, image_paths, image_ids, [parse_view(spec) for spec in views], batch_size, workers,
+                        merge or 'wbf', 0.55 if merge_iou is None else merge_iou, imgsz)
+    else:
+        # 테스트 이미지에 대해 추론 수행 (augment=True로 설정하여 테스트 시 augmentation 적용)
+        store = run_inference(model, image_paths, image_ids, batch_size, workers, augment=True)
+
+    # 결과를 바이너리 예측 저장소와 제출용 CSV 파일로 저장
+    save_predictions(store, output, precision)
+    if save_csv and not output.endswith('.csv'):
+        save_predictions(store, os.path.splitext(output)[0] + '.csv', precision)
+
+    print(f"Inference complete. Results saved to {output}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Batched YOLO inference on the test images')
+    parser.add_argument('--weights', type=str, default='CV Object Detection/yolo11x_fold4/weights/best.pt',
+                        help='Trained model weights')
+    parser.add_argument('--test_dir', type=str, default='../dataset/test', help='Test image folder')
+    parser.add_argument('--output', type=str, default='submission.npz',
+                        help='Output path (.npz, .parquet, .npy directory or .csv)')
+    parser.add_argument('--batch_size', type=int, default=16, help='Images per forward pass (default: 16)')
+    parser.add_argument('--workers', type=int, default=4, help='Image decoding threads, 0 to decode synchronously (default: 4)')
+    parser.add_argument('--precision', type=int, default=None,
+                        help='Decimal places in the CSV (default: shortest lossless float32 representation)')
+    parser.add_argument('--no_csv', action='store_true', help='Do not write the submission CSV next to the output')
+    # 지정하지 않으면 Ultralytics의 기본 TTA(augment=True) 사용, 조합 선택은 tta_report.py 참고
+    parser.add_argument('--views', type=str, nargs='+', default=None,
+                        help='TTA views as scale[:flips] with flips h and/or v, e.g. 1 1:h 1.25 '
+                             '(default: Ultralytics built-in augment=True)')
+    parser.add_argument('--merge', type=str, default=None, choices=['nms', 'soft_nms', 'nmw', 'wbf'],
+                        help='How to merge the TTA views or tiles (default: wbf for views, nms for tiles)')
+    parser.add_argument('--merge_iou', type=float, default=None,
+                        help='TTA/tile merge IoU threshold (default: 0.55 for views, 0.5 for tiles)')
+    parser.add_argument('--imgsz', type=int, default=None,
+                        help='Input size at TTA scale 1 or per tile (default: training size)')
+    # 작은 물체(배터리 등)를 위해 입력 크기를 키우는 대신 겹치는 타일로 추론
+    parser.add_argument('--tile_size', type=int, default=None,
+                        help='Run sliced inference with square tiles of this many pixels (default: off)')
+    parser.add_argument('--tile_overlap', type=float, default=0.2, help='Overlap ratio between tiles (default: 0.2)')
+    parser.add_argument('--no_full_image', action='store_true',
+                        help='Do not add the whole-image prediction (objects cut by tile seams are rebuilt from their pieces)')
+    args = parser.parse_args()
+    if args.tile_size and args.views:
+        parser.error('--tile_size and --views cannot be combined')
+
+    main(args.weights, args.test_dir, args.output, args.batch_size, args.workers, save_csv=not args.no_csv,
+         precision=args.precision, views=args.views, merge=args.merge, merge_iou=args.merge_iou, imgsz=args.imgsz,
+         tile_size=args.tile_size, tile_overlap=args.tile_overlap, full_image=not args.no_full_image)
@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import argparse
+from ultralytics import YOLO
+from tqdm import tqdm
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eda_and_ensemble'))
+from coco_io import load_coco
+from evaluate import GroundTruth
+from image_loader import load_image, prefetch_batches
+from inference import model_imgsz, predict_views
+from prediction_store import PredictionStore
+from tta import parse_view, view_name, tta_report, best_within_budget
+
+# 첫 번째 view가 비교 기준 (TTA 없음)
+DEFAULT_VIEWS = ['1', '1:h', '0.83', '1.25', '1.25:h']
+
+
+def measure_views(model, image_paths, image_ids, views, batch_size=8, workers=4, base_imgsz=None, progress=True):
+    """
+    view마다 따로 추론하여 view별 예측과 이미지당 추론 시간(ms)을 측정
+
+    이미지 디코딩은 미리 수행되므로 측정 시간은 반전, 전처리, forward pass, 후처리 시간이다.
+
+    :return: ({view 이름: PredictionStore}, {view 이름: 이미지당 ms})
+    """
+    base_imgsz = base_imgsz or model_imgsz(model)
+    outputs = {view: [] for view in views}
+    elapsed = {view: 0.0 for view in views}
+    with tqdm(total=len(image_paths), desc="Measuring views", disable=not progress) as pbar:
+        for _, images in prefetch_batches(image_paths, load_image, batch_size, workers):
+            for view in views:
+                start = time.perf_counter()
+                outputs[view].extend(predict_views(model, images, [view], base_imgsz)[view])
+                elapsed[view] += time.perf_counter() - start
+            pbar.update(len(images))
+
+    view_stores = {view_name(view): PredictionStore.from_lists(image_ids, *zip(*outputs[view])) for view in views}
+    view_times = {view_name(view): elapsed[view] * 1000 / max(1, len(image_paths)) for view in views}
+    return view_stores, view_times
+
+def main(weights, ann_file='../dataset/json/splits/val_fold4.json', image_root='../dataset', views=None, method='wbf',
+         iou_thr=0.55, max_views=None, budget_ms=None, batch_size=8, workers=4, imgsz=None, output=None):
+    views = [parse_view(spec) for spec in (views or DEFAULT_VIEWS)]
+    model = YOLO(weights)
+
+    # 검증 fold 이미지 (이미지 ID는 정답의 file_name, 예: train/0001.jpg)
+    gt_data = load_coco(ann_file)
+    image_ids = [img['file_name'] for img in gt_data['images']]
+    image_paths = [os.path.join(image_root, image_id) for image_id in image_ids]
+    gt = GroundTruth(gt_data)
+
+    view_stores, view_times = measure_views(model, image_paths, image_ids, views, batch_size, workers, imgsz)
+    for name, ms in view_times.items():
+        print(f"{name:>8s}: {ms:.1f} ms/image")
+
+    image_sizes = [(img['width'], img['height']) for img in gt_data['images']]
+    table = tta_report(view_stores, view_times, gt, image_sizes, method, iou_thr, view_name(views[0]), max_views)
+    print(table.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+    if output:
+        table.to_csv(output, index=False)
+        print(f"Report saved to {output}")
+
+    if budget_ms is not None:
+        best = best_within_budget(table, budget_ms)
+        if best is None:
+            print(f"No view set fits within {budget_ms} ms/image")
+        else:
+            print(f"Best within {budget_ms} ms/image: --views {best['views']} "
+                  f"(mAP50 {best['mAP50']:.4f}, {best['ms_per_image']:.1f} ms/image)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure mAP gain per extra millisecond for YOLO TTA view sets')
+    parser.add_argument('--weights', type=str, default='CV Object Detection/yolo11x_fold4/weights/best.pt',
+                        help='Trained model weights')
+    parser.add_argument('--ann_file', type=str, default='../dataset/json/splits/val_fold4.json',
+                        help='Validation fold COCO JSON')
+    parser.add_argument('--image_root', type=str, default='../dataset', help='Root that file_name is relative to')
+    parser.add_argument('--views', type=str, nargs='+', default=DEFAULT_VIEWS,
+                        help='Views as scale[:flips], flips h and/or v; the first is the baseline '
+                             f'(default: {" ".join(DEFAULT_VIEWS)})')
+    parser.add_argument('--merge', type=str, default='wbf', choices=['nms', 'soft_nms', 'nmw', 'wbf'],
+                        help='How to merge the views (default: wbf)')
+    parser.add_argument('--merge_iou', type=float, default=0.55, help='Merge IoU threshold (default: 0.55)')
+    parser.add_argument('--max_views', type=int, default=None, help='Largest view set to evaluate (default: all)')
+    parser.add_argument('--budget_ms', type=float, default=None,
+                        help='Latency budget in ms/image; prints the best view set within it')
+    parser.add_argument('--batch_size', type=int, default=8, help='Images per forward pass (default: 8)')
+    parser.add_argument('--workers', type=int, default=4, help='Image decoding threads (default: 4)')
+    parser.add_argument('--imgsz', type=int, default=None, help='Input size at scale 1.0 (default: training size)')
+    parser.add_argument('--output', type=str, default=None, help='Optional CSV path for the report')
+    args = parser.parse_args()
+
+    main(args.weights, args.ann_file, args.image_root, args.views, args.merge, args.merge_iou, args.max_views,
+         args.budget_ms, args.batch_size, args.workers, args.imgsz, args.output)
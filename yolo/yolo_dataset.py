@@ -0,0 +1,301 @@
+import os
+import sys
+import errno
+import shutil
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from tqdm import tqdm
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eda_and_ensemble'))
+from build_cache import write_if_changed
+
+def convert_bboxes_coco2yolo(bboxes, image_sizes):
+    """
+    COCO 형식의 바운딩 박스 배열을 YOLO 형식으로 한 번에 변환
+    COCO bbox: [x_min, y_min, width, height]
+    YOLO bbox: [x_center, y_center, width, height] (모두 0~1로 정규화)
+
+    :param bboxes: (N, 4) COCO 박스 배열
+    :param image_sizes: (N, 2) 각 박스가 속한 이미지의 (width, height) 배열
+    :return: (N, 4) YOLO 박스 배열
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    image_sizes = np.asarray(image_sizes, dtype=np.float64).reshape(-1, 2)
+    centers = (bboxes[:, :2] + bboxes[:, 2:] / 2) / image_sizes
+    return np.concatenate([centers, bboxes[:, 2:] / image_sizes], axis=1)
+
+def group_annotations(coco_data):
+    """
+    annotation을 이미지 순서대로 묶은 인덱스를 한 번에 생성
+
+    :param coco_data: COCO 형식의 데이터 딕셔너리
+    :return: (order, offsets) i번째 이미지의 annotation은 annotations[order[offsets[i]:offsets[i + 1]]]
+             (이미지 안에서는 원래 순서 유지, 이미지가 없는 annotation은 제외)
+    """
+    row_of_id = {img['id']: i for i, img in enumerate(coco_data['images'])}
+    ann_rows = np.array([row_of_id.get(ann['image_id'], -1) for ann in coco_data.get('annotations', [])],
+                        dtype=np.int64)
+    order = np.flatnonzero(ann_rows >= 0)
+    order = order[np.argsort(ann_rows[order], kind='stable')]
+    offsets = np.zeros(len(coco_data['images']) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ann_rows[order], minlength=len(coco_data['images'])), out=offsets[1:])
+    return order, offsets
+
+def prune_dir(directory, keep):
+    """
+    디렉토리에서 keep에 없는 파일(링크 포함)을 삭제
+
+    split이 바뀌어 다른 split으로 옮겨간 이미지/라벨이 이전 디렉토리에 남아 train/val이 섞이지 않도록
+    다시 생성할 때 추가/변경뿐 아니라 삭제도 반영한다. 하위 디렉토리는 건드리지 않는다.
+
+    :param directory: 정리할 디렉토리
+    :param keep: 남길 파일 이름 iterable
+    :return: 삭제한 파일 수
+    """
+    keep = set(keep)
+    removed = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name not in keep and (entry.is_symlink() or entry.is_file()):
+                os.remove(entry.path)
+                removed += 1
+    return removed
+
+def _write_label_files(items):
+    # 내용이 바뀐 라벨 파일만 기록하고 기록한 파일 수를 반환
+    return sum(write_if_changed(label_path, text) for label_path, text in items)
+
+def coco2yolo(coco_data, output_path, workers=1, batch_size=500, progress=True):
+    """
+    COCO 데이터를 YOLO 형식 라벨 파일(이미지당 하나의 .txt)로 변환
+
+    annotation을 이미지별로 한 번만 묶고, 박스 변환과 문자열 변환은 전체 배열에 대해 한 번에 수행한다.
+    라벨 파일은 batch_size개씩 묶어 기록하며, workers > 1이면 스레드 풀에서 병렬로 기록한다.
+    기존 라벨 파일과 내용이 같으면 다시 쓰지 않고, coco_data에 없는 이미지의 라벨 파일은 삭제한다.
+
+    :param coco_data: COCO 형식의 데이터 딕셔너리
+    :param output_path: 라벨 파일을 저장할 디렉토리
+    :param workers: 라벨 파일을 기록할 스레드 수
+    :param batch_size: 한 작업에서 기록할 라벨 파일 수
+    :param progress: 진행 상황 출력 여부
+    :return: 카테고리 리스트
+    """
+    os.makedirs(output_path, exist_ok=True)
+
+    images = coco_data['images']
+    annotations = coco_data.get('annotations', [])
+    category_id_to_index = {cat['id']: idx for idx, cat in enumerate(coco_data['categories'])}
+    order, offsets = group_annotations(coco_data)
+
+    # 이미지 순서로 정렬된 annotation의 박스를 한 번에 변환
+    sorted_annotations = [annotations[i] for i in order.tolist()]
+    image_sizes = np.array([[img['width'], img['height']] for img in images], dtype=np.float64).reshape(-1, 2)
+    ann_image_rows = np.repeat(np.arange(len(images)), np.diff(offsets))
+    bboxes = convert_bboxes_coco2yolo([ann['bbox'] for ann in sorted_annotations], image_sizes[ann_image_rows])
+    category_indices = np.array([category_id_to_index[ann['category_id']] for ann in sorted_annotations],
+                                dtype=np.int64)
+
+    # "클래스 x_center y_center width height" 형식의 줄을 이미지 단위로 이어 붙임
+    table = np.concatenate([category_indices.astype(str)[:, None], bboxes.astype(str)], axis=1)
+    lines = [' '.join(row) + '\n' for row in table.tolist()]
+    items = []
+    for img, start, end in zip(images, offsets[:-1].tolist(), offsets[1:].tolist()):
+        label_name = os.path.splitext(os.path.basename(img['file_name']))[0] + '.txt'
+        items.append((os.path.join(output_path, label_name), ''.join(lines[start:end])))
+
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            written = sum(tqdm(executor.map(_write_label_files, batches), total=len(batches), desc="Writing labels",
+                               disable=not progress))
+    else:
+        written = sum(_write_label_files(batch) for batch in tqdm(batches, desc="Writing labels", disable=not progress))
+
+    removed = prune_dir(output_path, [os.path.basename(label_path) for label_path, _ in items])
+
+    if progress:
+        print(f"Conversion complete. YOLO format labels saved in {output_path} "
+              f"({written} / {len(items)} updated, {removed} removed)")
+    return coco_data['categories']
+
+# 이미지를 fold 디렉토리에 배치하는 방법
+LINK_MODES = ('hardlink', 'symlink', 'reflink', 'copy')
+
+def _reflink(src_path, dst_path):
+    # Linux의 FICLONE ioctl로 데이터 블록을 공유하는 복사본 생성 (btrfs, xfs 등에서 지원)
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, "reflink is only supported on Linux")
+    import fcntl
+    ficlone = 0x40049409
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), ficlone, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(dst_path)
+            raise
+    shutil.copystat(src_path, dst_path)
+
+def _is_same_file(src_path, dst_path, mode):
+    """대상 파일이 원본과 같은 파일인지 확인 (링크 실패로 복사된 파일도 내용이 같으면 그대로 사용)"""
+    if os.path.islink(dst_path):
+        return mode == 'symlink' and os.path.realpath(dst_path) == os.path.realpath(src_path)
+    if not os.path.exists(dst_path):
+        return False
+    if os.path.samefile(src_path, dst_path):
+        return True
+    # 복사본은 크기와 수정 시각(copy2로 보존)이 같으면 동일한 파일로 판단
+    src_stat, dst_stat = os.stat(src_path), os.stat(dst_path)
+    return src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+
+def place_file(src_path, dst_path, mode='hardlink'):
+    """
+    파일 하나를 지정한 방법으로 배치 (실패하면 복사로 대체)
+
+    :param src_path: 원본 파일 경로
+    :param dst_path: 대상 파일 경로
+    :param mode: 'hardlink', 'symlink', 'reflink', 'copy' 중 하나
+    :return: 실제로 사용한 방법 ('skip'은 이미 같은 파일이 있어 건너뜀)
+    """
+    if os.path.lexists(dst_path):
+        if _is_same_file(src_path, dst_path, mode):
+            return 'skip'
+        os.remove(dst_path)
+
+    try:
+        if mode == 'hardlink':
+            os.link(src_path, dst_path)
+        elif mode == 'symlink':
+            os.symlink(os.path.relpath(src_path, os.path.dirname(dst_path)), dst_path)
+        elif mode == 'reflink':
+            _reflink(src_path, dst_path)
+        else:
+            shutil.copy2(src_path, dst_path)
+            return 'copy'
+        return mode
+    except OSError:
+        # 다른 파일 시스템이거나 지원하지 않는 방법이면 복사
+        shutil.copy2(src_path, dst_path)
+        return 'copy'
+
+def link_images(coco_data, src_dir, dst_dir, mode='hardlink', workers=1, progress=True):
+    """
+    이미지를 소스 디렉토리에서 대상 디렉토리로 링크(또는 복사)
+
+    이미 같은 파일이 배치되어 있으면 건너뛰므로 fold를 다시 생성할 때는 바뀐 파일만 처리하고,
+    대상 디렉토리에 남아 있는 coco_data에 없는 이미지는 삭제한다.
+    첫 파일에서 링크가 실패하면 나머지 파일은 바로 복사한다.
+
+    :param coco_data: COCO 형식의 데이터 딕셔너리
+    :param src_dir: 원본 이미지 디렉토리
+    :param dst_dir: 대상 이미지 디렉토리
+    :param mode: 'hardlink', 'symlink', 'reflink', 'copy' 중 하나
+    :param workers: 파일을 배치할 스레드 수
+    :param progress: 진행 상황 출력 여부
+    :return: 방법별 처리한 파일 수 딕셔너리 ('removed'는 삭제한 파일 수)
+    """
+    if mode not in LINK_MODES:
+        raise ValueError(f"Invalid mode. Choose from {LINK_MODES}.")
+    os.makedirs(dst_dir, exist_ok=True)
+
+    pairs = []
+    for img in coco_data['images']:
+        file_name = img['file_name']
+        if file_name.startswith('train/') or file_name.startswith('test/'):
+            file_name = os.path.basename(file_name)
+        src_path = os.path.join(src_dir, file_name)
+        if not os.path.exists(src_path):
+            print(f"Warning: Source file not found: {src_path}")
+            continue
+        pairs.append((src_path, os.path.join(dst_dir, file_name)))
+
+    stats = {}
+    with tqdm(total=len(pairs), desc=f"Placing images in {dst_dir} ({mode})", disable=not progress) as pbar:
+        # 첫 파일로 링크 가능 여부를 확인하고, 실패했으면 나머지는 복사
+        for src_path, dst_path in pairs[:1]:
+            result = place_file(src_path, dst_path, mode)
+            if result == 'copy':
+                mode = 'copy'
+            stats[result] = 1
+            pbar.update(1)
+
+        def place(pair):
+            return place_file(pair[0], pair[1], mode)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for result in executor.map(place, pairs[1:]):
+                stats[result] = stats.get(result, 0) + 1
+                pbar.update(1)
+
+    # Ultralytics의 cache='disk'가 이미지 옆에 만드는 .npy 파일은 남아 있는 이미지의 것만 유지
+    names = [os.path.basename(dst_path) for _, dst_path in pairs]
+    removed = prune_dir(dst_dir, names + [os.path.splitext(name)[0] + '.npy' for name in names])
+    if removed:
+        stats['removed'] = removed
+
+    if progress:
+        print(f"Images placed in {dst_dir}: " + ', '.join(f"{k} {v}" for k, v in sorted(stats.items())))
+    return stats
+
+def link_split_dirs(root, shared, split):
+    """
+    공유 이미지/라벨 디렉토리를 가리키는 split별 디렉토리 심볼릭 링크 생성 (images/{split}, labels/{split})
+
+    Ultralytics는 라벨 캐시를 라벨 디렉토리 이름으로 만들므로(labels/{디렉토리}.cache) 모든 split의 목록 파일이
+    공유 디렉토리를 직접 가리키면 split과 fold마다 같은 캐시 파일을 다시 만들어 덮어쓴다.
+    디렉토리 링크를 거치면 이미지와 라벨 파일은 그대로 공유하면서 캐시는 split별 파일(labels/{split}.cache)로 생긴다.
+
+    :param root: 데이터셋 루트 디렉토리
+    :param shared: 공유 디렉토리 이름 (예: train_all)
+    :param split: 링크 이름 (예: list_train_fold1)
+    :return: 목록 파일에 기록할 루트 기준 이미지 디렉토리 (링크를 만들 수 없으면 공유 디렉토리)
+    """
+    try:
+        for kind in ('images', 'labels'):
+            # 공유 디렉토리 단계와 동시에 실행될 수 있으므로 상위 디렉토리는 여기서도 생성
+            os.makedirs(os.path.join(root, kind), exist_ok=True)
+            link = os.path.join(root, kind, split)
+            if os.path.islink(link):
+                if os.readlink(link) == shared:
+                    continue
+                os.remove(link)
+            os.symlink(shared, link, target_is_directory=True)
+    except OSError as e:
+        # 심볼릭 링크를 만들 수 없는 환경(권한이 없는 Windows 등)에서는 공유 디렉토리를 직접 사용
+        print(f"Warning: Could not link {split} to {shared} ({e}), "
+              f"the split shares labels/{shared}.cache and Ultralytics rebuilds it for every split")
+        return f'images/{shared}'
+    return f'images/{split}'
+
+def write_image_list(coco_data, list_file, image_dir):
+    """
+    Ultralytics 데이터셋 YAML의 train/val에 지정할 이미지 목록(.txt) 파일 생성
+
+    각 줄은 './{image_dir}/{파일명}' 형식이며, Ultralytics는 './'를 목록 파일이 있는 디렉토리로 바꾸고
+    경로의 'images'를 'labels'로 바꿔 라벨 파일을 찾는다.
+
+    :param coco_data: COCO 형식의 데이터 딕셔너리
+    :param list_file: 저장할 목록 파일 경로 (데이터셋 루트에 위치)
+    :param image_dir: 데이터셋 루트 기준 이미지 디렉토리 (예: link_split_dirs()가 반환한 images/list_train_fold1)
+    """
+    lines = [f"./{image_dir}/{os.path.basename(img['file_name'])}\n" for img in coco_data['images']]
+    write_if_changed(list_file, ''.join(lines))
+
+def write_dataset_yaml(yaml_file, train, val, categories, test='images/test', path='../../dataset'):
+    """
+    YOLO 데이터셋 설정 파일 생성
+
+    :param train: 학습 이미지 디렉토리 또는 목록 파일 (path 기준)
+    :param val: 검증 이미지 디렉토리 또는 목록 파일 (path 기준)
+    :param categories: COCO 카테고리 리스트
+    """
+    dataset_config = {
+        'path': path,
+        'train': train,
+        'val': val,
+        'test': test,
+        'nc': len(categories),  # 클래스 수
+        'names': [cat['name'] for cat in categories]
+    }
+    write_if_changed(yaml_file, yaml.dump(dataset_config))